@@ -1,24 +1,44 @@
-import asyncio, json, logging
+import asyncio, json, logging, os
+from collections import deque
 from typing import MutableMapping
 from abc import ABC, abstractmethod
 import uuid
-from aio_pika import IncomingMessage, Message, connect, Channel, RobustConnection
 
-from aio_pika import Message, connect
+from aio_pika import ExchangeType, Message, connect_robust
 from aio_pika.abc import (
     AbstractChannel,
-    AbstractConnection,
     AbstractIncomingMessage,
     AbstractQueue,
+    AbstractRobustConnection,
 )
+from aio_pika.exceptions import AMQPError, ChannelInvalidStateError
 
-from sqlmodel import Session
 from src.database import engine
+from src.job_status_writer import JobStatusWriter, WrittenStatuses
+from src.query_templates import PlanWarmer
+from src.worker_monitor import StalledJobs, WorkerMonitor
 from src.ws_connection_manager import socket_connections
-from common.models.jobs import Job, JobStatus
+from common.models.driller_config import (
+    CANCEL_EXCHANGE,
+    CancelMessage,
+    SingleDrillConfig,
+    SizeClass,
+)
+from common.models.workers import HEARTBEAT_QUEUE
 
 logger = logging.getLogger(__name__)
 
+# Channels that publishes are spread across. Each has publisher confirms enabled and carries many unconfirmed
+# publishes at once.
+RABBITMQ_CHANNEL_POOL_SIZE = int(os.environ.get("RABBITMQ_CHANNEL_POOL_SIZE", 4))
+# Seconds to wait for the broker to confirm a publish before it's spilled.
+RABBITMQ_PUBLISH_TIMEOUT = float(os.environ.get("RABBITMQ_PUBLISH_TIMEOUT", 10))
+# Seconds between attempts to publish the spilled messages.
+RABBITMQ_SPILL_RETRY_INTERVAL = float(os.environ.get("RABBITMQ_SPILL_RETRY_INTERVAL", 5))
+
+# Raised by a publish while the broker is unreachable or when it doesn't confirm the message.
+PUBLISH_ERRORS = (AMQPError, ChannelInvalidStateError, ConnectionError, asyncio.TimeoutError)
+
 
 class RabbitMessageQueueRPC(ABC):
     """This is an implementation of a remote procedure call based on
@@ -26,31 +46,175 @@ class RabbitMessageQueueRPC(ABC):
     Calls a function on a remote worker that executes a job.
     Waits for callback messages. And executes `process_response` on the message.
     `process_response` shoud be overridden with handling of message.
+
+    The connection reconnects by itself and restores the queues and consumers. Messages are published
+    round robin on a set of channels with publisher confirms, without waiting for the previous publish on
+    the channel to be confirmed. A message that can't be published, because the
+    broker is unreachable or doesn't confirm it, is kept in a local spill queue and published again once
+    the connection is back, so jobs accepted by the API aren't lost when the broker blips.
     """
 
-    connection: AbstractConnection
+    connection: AbstractRobustConnection
     channel: AbstractChannel
     call_queue = "driller_queue"
+    # Named rather than server named so workers can still reply to it after a reconnect.
+    response_queue = "driller_responses"
     callback_queue: AbstractQueue
 
-    def __init__(self, user, password, host, port):
+    def __init__(
+        self,
+        user,
+        password,
+        host,
+        port,
+        channel_pool_size: int = RABBITMQ_CHANNEL_POOL_SIZE,
+        publish_timeout: float = RABBITMQ_PUBLISH_TIMEOUT,
+        spill_retry_interval: float = RABBITMQ_SPILL_RETRY_INTERVAL,
+    ):
         self.user = user
         self.password = password
         self.host = host
         self.port = port
+        self.channel_pool_size = channel_pool_size
+        self.publish_timeout = publish_timeout
+        self.spill_retry_interval = spill_retry_interval
+
+        self.publish_channels: list[AbstractChannel] = []
+        self.next_channel = 0
+        # `(exchange name, routing key, message)` of the messages waiting to be published again.
+        self.spilled: deque[tuple[str, str, Message]] = deque()
+        self.spill_lock = asyncio.Lock()
+        self.spill_task: asyncio.Task | None = None
+        self.drain_task: asyncio.Task | None = None
 
     async def connect(self) -> "RabbitMessageQueueRPC":
         connection_string = (
             f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
         )
-        self.connection = await connect(connection_string)
+        self.connection = await connect_robust(connection_string)
+        self.connection.reconnect_callbacks.add(self.on_reconnect)
         self.channel = await self.connection.channel()
-        self.callback_queue = await self.channel.declare_queue(exclusive=True)
+        self.publish_channels = [
+            await self.create_channel() for _ in range(self.channel_pool_size)
+        ]
+        self.callback_queue = await self.channel.declare_queue(self.response_queue)
+
+        # Declare the call queues so that jobs aren't dropped if they're published before a worker has started.
+        for queue_name in self.call_queue_names():
+            await self.channel.declare_queue(queue_name)
+        await self.channel.declare_queue(self.dead_letter_queue_name(), durable=True)
+        await self.channel.declare_exchange(CANCEL_EXCHANGE, ExchangeType.FANOUT)
 
         await self.callback_queue.consume(self.on_response, no_ack=True)
 
+        self.spill_task = asyncio.create_task(self.retry_spilled())
         return self
 
+    async def create_channel(self) -> AbstractChannel:
+        """Opens a channel to publish on. Channels have publisher confirms enabled by default."""
+        return await self.connection.channel()
+
+    def call_queue_names(self) -> list[str]:
+        """Names of all of the queues that jobs can be published to."""
+        return [self.call_queue] + [
+            size_class.queue_name(self.call_queue) for size_class in SizeClass
+        ]
+
+    def dead_letter_queue_name(self) -> str:
+        """Queue that jobs are moved to when they keep failing. Nothing consumes it, it's kept for inspection."""
+        return f"{self.call_queue}.dead_letter"
+
+    async def _publish(self, exchange_name: str, routing_key: str, message: Message):
+        """Publishes on the next channel and waits for the broker to confirm it. Other publishes can use the
+        channel while this one waits, the confirms are matched to the publishes by delivery tag."""
+        channel = self.publish_channels[self.next_channel % len(self.publish_channels)]
+        self.next_channel += 1
+        if exchange_name:
+            exchange = await channel.get_exchange(exchange_name, ensure=False)
+        else:
+            exchange = channel.default_exchange
+        await exchange.publish(
+            message, routing_key=routing_key, timeout=self.publish_timeout
+        )
+
+    async def publish(self, message: Message, routing_key: str, exchange_name: str = ""):
+        """Publishes a message, spilling it if the broker doesn't confirm it.
+
+        Args:
+            message (Message): Message to publish.
+            routing_key (str): Routing key, the queue name for the default exchange.
+            exchange_name (str, optional): Exchange to publish to. The default exchange when empty.
+        """
+        if self.spilled:
+            # Keeps the messages in order while the spilled messages are waiting.
+            self.spill(exchange_name, routing_key, message)
+            return
+        try:
+            await self._publish(exchange_name, routing_key, message)
+        except PUBLISH_ERRORS as e:
+            logger.warning(f"Could not publish to `{exchange_name or routing_key}`: {e!r}")
+            self.spill(exchange_name, routing_key, message)
+
+    def spill(self, exchange_name: str, routing_key: str, message: Message):
+        self.spilled.append((exchange_name, routing_key, message))
+        logger.warning(f"{len(self.spilled)} messages waiting for the message queue.")
+
+    async def drain_spilled(self) -> int:
+        """Publishes the spilled messages in order until one fails.
+
+        Returns:
+            int: Number of messages published.
+        """
+        published = 0
+        async with self.spill_lock:
+            while self.spilled:
+                exchange_name, routing_key, message = self.spilled[0]
+                try:
+                    await self._publish(exchange_name, routing_key, message)
+                except PUBLISH_ERRORS as e:
+                    logger.debug(f"Spilled messages still can't be published: {e!r}")
+                    break
+                self.spilled.popleft()
+                published += 1
+        if published:
+            logger.info(
+                f"Published {published} spilled messages, {len(self.spilled)} remaining."
+            )
+        return published
+
+    def on_reconnect(self, *args):
+        logger.info("Reconnected to the message queue.")
+        self.drain_task = asyncio.create_task(self.drain_spilled())
+
+    async def retry_spilled(self):
+        """Drains the spill queue every `spill_retry_interval` seconds, in case it was spilled without the
+        connection dropping. Eg. the broker didn't confirm the message."""
+        while True:
+            await asyncio.sleep(self.spill_retry_interval)
+            if self.spilled:
+                try:
+                    await self.drain_spilled()
+                except Exception as e:
+                    logger.exception(f"Failed to publish the spilled messages: {e}")
+
+    async def dead_letter(self, body: str):
+        """Publishes a job to the dead letter queue."""
+        await self.publish(
+            Message(body.encode(), content_type="text/plain"),
+            routing_key=self.dead_letter_queue_name(),
+        )
+
+    async def cancel(self, job_ids: list[int]):
+        """Tells every worker to stop the jobs. Workers that aren't running them remember them in case they
+        take them from the queue later."""
+        if not job_ids:
+            return
+        await self.publish(
+            Message(CancelMessage(job_ids=job_ids).model_dump_json().encode()),
+            routing_key="",
+            exchange_name=CANCEL_EXCHANGE,
+        )
+
     @abstractmethod
     async def process_response(self, response: dict) -> None:
         pass
@@ -60,26 +224,84 @@ class RabbitMessageQueueRPC(ABC):
             logger.error(f"Bad message {message!r}")
             return
 
-        logger.warning(message.body)
+        logger.debug(message.body)
         response = json.loads(message.body)
 
         await self.process_response(response)
 
-    async def call(self, body: str):
+    def create_message(
+        self,
+        body: str,
+        message_type: str | None = None,
+        size_class: SizeClass | None = None,
+    ) -> tuple[Message, str]:
+        """Creates a job message and the routing key it should be published with.
+
+        Args:
+            body (str): Body of the job message.
+            message_type (str, optional): AMQP message type. Used by workers to tell apart different kinds of job.
+            size_class (SizeClass, optional): Routes the job to the queue for repositories of this size.
+        """
         correlation_id = str(uuid.uuid4())
         logger.debug(f"Sending message {correlation_id}: {body}")
 
-        await self.channel.default_exchange.publish(
-            Message(
-                body.encode(),
-                content_type="text/plain",
-                correlation_id=correlation_id,
-                reply_to=self.callback_queue.name,
-            ),
-            routing_key=self.call_queue,
+        message = Message(
+            body.encode(),
+            content_type="text/plain",
+            correlation_id=correlation_id,
+            reply_to=self.response_queue,
+            type=message_type,
         )
+        routing_key = (
+            size_class.queue_name(self.call_queue)
+            if size_class is not None
+            else self.call_queue
+        )
+        return message, routing_key
+
+    async def call(
+        self,
+        body: str,
+        message_type: str | None = None,
+        size_class: SizeClass | None = None,
+    ):
+        """Publishes a job onto the call queue. See `create_message` for arguments."""
+        message, routing_key = self.create_message(body, message_type, size_class)
+        await self.publish(message, routing_key)
+
+    async def call_many(
+        self,
+        messages: list[tuple[str, str | None, SizeClass | None]],
+        chunk_size: int = 1000,
+    ):
+        """Publishes many jobs at once. Rather than waiting for each job to be confirmed before publishing
+        the next, up to `chunk_size` publishes are in flight at once, spread across the publish channels,
+        and the broker confirms them in batches.
+
+        Args:
+            messages (list[tuple]): `(body, message_type, size_class)` of each job. See `create_message`.
+            chunk_size (int, optional): Maximum number of unconfirmed publishes.
+        """
+        for start in range(0, len(messages), chunk_size):
+            await asyncio.gather(
+                *(
+                    self.call(body, message_type, size_class)
+                    for body, message_type, size_class in messages[
+                        start : start + chunk_size
+                    ]
+                )
+            )
 
     async def close(self):
+        if self.spill_task is not None:
+            self.spill_task.cancel()
+        await self.drain_spilled()
+        if self.spilled:
+            logger.error(
+                f"Closing with {len(self.spilled)} messages that couldn't be published."
+            )
+        for channel in self.publish_channels:
+            await channel.close()
         await self.channel.close()
         await self.connection.close()
 
@@ -90,33 +312,71 @@ class RepositoryDrillerClient(RabbitMessageQueueRPC):
     docker container.
     Once when drill jobs are started and when they are finished they send responses. This client
     processes these reponses and creates the associates JobStatuses in the database.
+    Responses are written in batches by a `JobStatusWriter` so that the event loop isn't blocked by the database.
     """
 
     queue = "driller_queue"
-    connection: AbstractConnection
+    connection: AbstractRobustConnection
     channel: AbstractChannel
     callback_queue: AbstractQueue
 
+    def __init__(
+        self, user, password, host, port, plan_warmer: PlanWarmer | None = None, **kwargs
+    ):
+        super().__init__(user, password, host, port, **kwargs)
+        self.status_writer = JobStatusWriter(engine, on_written=self.on_statuses_written)
+        self.worker_monitor = WorkerMonitor(engine, on_stalled=self.on_jobs_stalled)
+        # Plans the saved queries again once drills have changed the graph.
+        self.plan_warmer = plan_warmer
+
+    async def connect(self) -> "RepositoryDrillerClient":
+        self.status_writer.start()
+        await super().connect()
+
+        heartbeat_queue = await self.channel.declare_queue(HEARTBEAT_QUEUE)
+        await heartbeat_queue.consume(self.on_heartbeat, no_ack=True)
+        self.worker_monitor.start()
+        return self
+
+    async def on_heartbeat(self, message: AbstractIncomingMessage) -> None:
+        await self.worker_monitor.on_heartbeat(message.body)
+
+    async def on_jobs_stalled(self, stalled: StalledJobs) -> None:
+        """Notifies the websockets that jobs of lost workers were requeued and sends them again."""
+        socket_connections.broadcast(stalled.notifications)
+
+        await self.call_many(
+            [(config.model_dump_json(), None, config.size_class) for config in stalled.requeue]
+        )
+        for config in stalled.dead_letter:
+            await self.dead_letter(config.model_dump_json())
+
     async def process_response(self, response: dict) -> None:
-        try:
-            job_id = response.get("job_id")
-            status = response.get("status")
-            message = response.get("message", "")
-        except KeyError as e:
-            logger.error(f"Queue Response is missing key {e}")
+        if "job_id" not in response or "status" not in response:
+            logger.error(f"Queue Response is missing a key: {response}")
             return
 
-        with Session(engine) as session:
-            job_status = JobStatus(job_id=job_id, status=status, message=message)
-            session.add(job_status)
-            session.commit()
-            session.refresh(job_status)
-
-            job = session.get(Job, job_id)
-        logger.debug("Sending socket message")
-        await socket_connections.send_message(
-            {
-                "job_status": job_status.model_dump(),
-                "job": job.model_dump(),
-            },
-        )
+        self.status_writer.add(response)
+
+    async def on_statuses_written(self, written: WrittenStatuses) -> None:
+        """Notifies the websockets of the new statuses and sends any jobs created for shards."""
+        logger.debug("Sending socket messages")
+        socket_connections.broadcast(written.notifications)
+
+        for follow_up_job in written.follow_up_jobs:
+            await self.call(
+                follow_up_job.model_dump_json(), size_class=follow_up_job.size_class
+            )
+
+        await self.cancel(written.cancel_job_ids)
+
+        if written.completed_job_ids and self.plan_warmer is not None:
+            self.plan_warmer.request()
+
+    async def close(self):
+        await self.worker_monitor.close()
+        if self.plan_warmer is not None:
+            await self.plan_warmer.close()
+        # Write the remaining statuses first since it may send follow up jobs.
+        await self.status_writer.close()
+        await super().close()
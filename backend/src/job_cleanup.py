@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from collections import Counter
+
+from sqlalchemy import delete, func, or_
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from src.job_stats import change_status_counts
+from common.models.jobs import Job, JobProgress, JobStatus, JobThroughput
+
+logger = logging.getLogger(__name__)
+
+# Statuses older than this many days are pruned, apart from the latest status of each job. Disabled when 0.
+JOB_STATUS_RETENTION_DAYS = int(os.environ.get("JOB_STATUS_RETENTION_DAYS", 0))
+JOB_STATUS_RETENTION_INTERVAL_SECONDS = int(
+    os.environ.get("JOB_STATUS_RETENTION_INTERVAL_SECONDS", 3600)
+)
+# Rows deleted per statement while pruning so that the database isn't locked for long.
+JOB_STATUS_PRUNE_BATCH_SIZE = 5000
+
+
+def delete_jobs(session: Session, filters: list) -> int:
+    """Deletes the jobs matching the filters with their statuses and shard jobs. Changes are not committed.
+
+    The rows are deleted with set based statements so nothing is loaded into memory. The statuses are deleted
+    explicitly as well as by the `ON DELETE CASCADE` so it doesn't matter if foreign keys are enforced.
+
+    Args:
+        session (Session): Database session.
+        filters (list): Where clauses on `Job`. Every job is deleted when empty.
+
+    Returns:
+        int: Number of jobs deleted.
+    """
+    # Evaluated by each statement before any rows are deleted.
+    job_ids = select(Job.id).where(*filters).scalar_subquery()
+    matching = or_(Job.id.in_(job_ids), Job.parent_id.in_(job_ids))
+    all_job_ids = select(Job.id).where(matching).scalar_subquery()
+
+    # The statement bypasses the session, so the deleted jobs are taken off the status counts here.
+    deleted_counts = session.exec(
+        select(Job.latest_status, func.count(Job.id))
+        .where(matching, Job.latest_status.is_not(None))
+        .group_by(Job.latest_status)
+    ).all()
+    change_status_counts(session, Counter({status: -count for status, count in deleted_counts}))
+
+    session.exec(delete(JobStatus).where(JobStatus.job_id.in_(all_job_ids)))
+    session.exec(delete(JobProgress).where(JobProgress.job_id.in_(all_job_ids)))
+    result = session.exec(delete(Job).where(matching))
+    return result.rowcount
+
+
+def prune_job_statuses(session: Session, older_than: datetime) -> int:
+    """Deletes the statuses from before `older_than`. The latest status of each job is always kept.
+    Commits after each batch.
+
+    Returns:
+        int: Number of statuses deleted.
+    """
+    latest_timestamp = (
+        select(Job.latest_timestamp)
+        .where(Job.id == JobStatus.job_id)
+        .scalar_subquery()
+    )
+    prunable = (
+        select(JobStatus.id)
+        .where(JobStatus.timestamp < older_than, JobStatus.timestamp < latest_timestamp)
+        .limit(JOB_STATUS_PRUNE_BATCH_SIZE)
+        .scalar_subquery()
+    )
+
+    deleted = 0
+    while True:
+        result = session.exec(delete(JobStatus).where(JobStatus.id.in_(prunable)))
+        session.commit()
+        deleted += result.rowcount
+        if result.rowcount < JOB_STATUS_PRUNE_BATCH_SIZE:
+            return deleted
+
+
+async def run_job_status_retention(
+    engine: Engine,
+    retention_days: int = JOB_STATUS_RETENTION_DAYS,
+    interval: int = JOB_STATUS_RETENTION_INTERVAL_SECONDS,
+):
+    """Periodically prunes old statuses until cancelled. Does nothing if `retention_days` is 0."""
+    if retention_days <= 0:
+        return
+
+    def prune():
+        with Session(engine) as session:
+            older_than = datetime.utcnow() - timedelta(days=retention_days)
+            session.exec(delete(JobThroughput).where(JobThroughput.minute < older_than))
+            return prune_job_statuses(session, older_than)
+
+    while True:
+        try:
+            deleted = await asyncio.to_thread(prune)
+            if deleted:
+                logger.info(f"Pruned {deleted} job statuses older than {retention_days} days.")
+        except Exception as e:
+            logger.exception(f"Failed to prune job statuses: {e}")
+        await asyncio.sleep(interval)
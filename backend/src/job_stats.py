@@ -0,0 +1,149 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, inspect
+from sqlmodel import Session, select
+
+from src.database import dialect_insert
+from common.models.jobs import (
+    Job,
+    JobStatusBase,
+    JobStatusCount,
+    JobStatusEnum,
+    JobThroughput,
+)
+
+
+def record_throughput(session: Session, job_statuses: list[JobStatusBase]):
+    """Increments the `JobThroughput` counts for the complete and failed statuses. Changes are not committed.
+
+    Args:
+        session (Session): Database session.
+        job_statuses (list[JobStatusBase]): Statuses that were added.
+    """
+    counts = Counter(
+        (job_status.timestamp.replace(second=0, microsecond=0), JobStatusEnum(job_status.status))
+        for job_status in job_statuses
+        if JobStatusEnum(job_status.status).is_finished
+    )
+    if not counts:
+        return
+
+    insert = dialect_insert(session)
+    for (minute, status), count in counts.items():
+        statement = insert(JobThroughput).values(minute=minute, status=status, count=count)
+        statement = statement.on_conflict_do_update(
+            index_elements=[JobThroughput.minute, JobThroughput.status],
+            set_={"count": JobThroughput.count + statement.excluded.count},
+        )
+        session.exec(statement)
+
+
+def change_status_counts(session: Session, changes: Counter):
+    """Adds the changes to the `JobStatusCount` of each status. Changes are not committed."""
+    changes = {status: change for status, change in changes.items() if change}
+    if not changes:
+        return
+
+    insert = dialect_insert(session)
+    for status, change in changes.items():
+        statement = insert(JobStatusCount).values(status=status, count=change)
+        statement = statement.on_conflict_do_update(
+            index_elements=[JobStatusCount.status],
+            set_={"count": JobStatusCount.count + statement.excluded.count},
+        )
+        # Run on the connection since the counts also change while the session is flushing.
+        session.connection().execute(statement)
+
+
+@event.listens_for(Session, "before_flush")
+def count_latest_statuses(session: Session, flush_context, instances):
+    """Moves the jobs that are flushed between the `JobStatusCount` of their old and new latest status, in
+    the same transaction as the jobs. Jobs inserted or deleted with `INSERT` or `DELETE` statements skip the
+    session, so `create_jobs` and `delete_jobs` update the counts themselves."""
+    changes = Counter()
+    for job in session.new:
+        if isinstance(job, Job) and job.latest_status is not None:
+            changes[JobStatusEnum(job.latest_status)] += 1
+    for job in session.dirty:
+        if not isinstance(job, Job):
+            continue
+        history = inspect(job).attrs.latest_status.history
+        if not history.has_changes():
+            continue
+        for status in history.deleted:
+            if status is not None:
+                changes[JobStatusEnum(status)] -= 1
+        for status in history.added:
+            if status is not None:
+                changes[JobStatusEnum(status)] += 1
+    for job in session.deleted:
+        if isinstance(job, Job):
+            # The status it had in the database if it was changed before being deleted.
+            history = inspect(job).attrs.latest_status.history
+            status = history.deleted[0] if history.deleted else job.latest_status
+            if status is not None:
+                changes[JobStatusEnum(status)] -= 1
+    change_status_counts(session, changes)
+
+
+def get_duration_percentile(session: Session, since: datetime, count: int, percentile: float) -> float | None:
+    """Finds the duration at `percentile` of the `count` jobs that finished after `since`."""
+    if count == 0:
+        return None
+    statement = (
+        select(Job.duration)
+        .where(Job.finished_at >= since, Job.duration.is_not(None))
+        .order_by(Job.duration)
+        .offset(min(int(count * percentile), count - 1))
+        .limit(1)
+    )
+    return session.exec(statement).first()
+
+
+def get_job_stats(session: Session, window_minutes: int) -> dict:
+    """Gathers the statistics for the jobs dashboard.
+
+    Counts are read from `JobStatusCount`, throughput from `JobThroughput` and the durations only read the
+    jobs that finished within the window using the index on `finished_at`.
+
+    Args:
+        session (Session): Database session.
+        window_minutes (int): How many minutes back the throughput and durations cover.
+
+    Returns:
+        dict: `counts` of jobs by latest status, `throughput` per minute and `durations` in seconds.
+    """
+    now = datetime.utcnow()
+    since = now.replace(second=0, microsecond=0) - timedelta(minutes=window_minutes - 1)
+
+    counts = {status.value: 0 for status in JobStatusEnum}
+    for row in session.exec(select(JobStatusCount)):
+        counts[JobStatusEnum(row.status).value] = row.count
+
+    throughput: dict[datetime, dict] = {}
+    for row in session.exec(
+        select(JobThroughput)
+        .where(JobThroughput.minute >= since)
+        .order_by(JobThroughput.minute)
+    ):
+        minute = throughput.setdefault(
+            row.minute, {"minute": row.minute, "complete": 0, "failed": 0}
+        )
+        minute[JobStatusEnum(row.status).value] = row.count
+
+    duration_count = session.exec(
+        select(func.count(Job.id)).where(
+            Job.finished_at >= since, Job.duration.is_not(None)
+        )
+    ).one()
+
+    return {
+        "counts": counts,
+        "throughput": list(throughput.values()),
+        "durations": {
+            "count": duration_count,
+            "p50": get_duration_percentile(session, since, duration_count, 0.5),
+            "p95": get_duration_percentile(session, since, duration_count, 0.95),
+        },
+    }
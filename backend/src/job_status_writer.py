@@ -0,0 +1,267 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from src.database import dialect_insert
+from src.job_stats import record_throughput
+from src.shard_jobs import create_shard_jobs, on_shard_finished
+from common.models.jobs import Job, JobProgress, JobStatus, JobStatusEnum
+from common.models.driller_config import PROGRESS_STATUS, SingleDrillConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WrittenStatuses:
+    """Result of writing a batch of worker responses to the database."""
+
+    # Websocket notifications for the statuses that were created. Contain `job_status` and `job`.
+    # Notifications for progress reports contain `job_progress` and `job` instead.
+    notifications: list[dict] = field(default_factory=list)
+    # Jobs created for shards or stitching that need to be sent to the workers.
+    follow_up_jobs: list[SingleDrillConfig] = field(default_factory=list)
+    # Cancelled jobs that a worker started anyway. The cancellation needs to be sent again.
+    cancel_job_ids: list[int] = field(default_factory=list)
+    # Jobs that were completed, including parents of sharded jobs completed by their last shard.
+    completed_job_ids: list[int] = field(default_factory=list)
+
+
+class JobStatusWriter:
+    """Persists the responses from the workers as `JobStatus` rows in batches.
+
+    Responses are queued without blocking the event loop. A single writer thread takes every response
+    that arrives within `flush_interval` and writes them in one transaction. Once a batch is committed
+    `on_written` is awaited on the event loop with the result. If a batch fails, its responses are written
+    again one at a time so that only the response that fails is dropped.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        on_written: Callable[[WrittenStatuses], Awaitable[None]],
+        flush_interval: float = 0.1,
+        max_batch_size: int = 500,
+    ):
+        """
+        Args:
+            engine (Engine): Database engine that statuses are written to.
+            on_written (Callable): Awaited with the `WrittenStatuses` of each batch.
+            flush_interval (float, optional): Seconds to wait for more responses before writing a batch.
+            max_batch_size (int, optional): Maximum number of responses written in one transaction.
+        """
+        self.engine = engine
+        self.on_written = on_written
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+
+        # `None` is queued by `close` to wake the writer up.
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue()
+        self.stopping = asyncio.Event()
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="job-status-writer"
+        )
+        self.task: asyncio.Task | None = None
+
+    def add(self, response: dict):
+        """Queues a worker response to be written."""
+        self.queue.put_nowait(response)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """Writes any queued responses and stops the writer. A batch that is being written is finished,
+        including `on_written`."""
+        if self.task is not None:
+            self.stopping.set()
+            self.queue.put_nowait(None)
+            await self.task
+            self.task = None
+
+        while not self.queue.empty():
+            await self.write(self.take_batch())
+
+        self.executor.shutdown(wait=True)
+
+    async def run(self):
+        while not self.stopping.is_set():
+            # Wait for the first response, then give others a chance to arrive before writing.
+            response = await self.queue.get()
+            if response is None:
+                continue
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.write([response] + self.take_batch(self.max_batch_size - 1))
+
+    def take_batch(self, limit: int | None = None) -> list[dict]:
+        """Takes up to `limit` of the queued responses without waiting."""
+        limit = self.max_batch_size if limit is None else limit
+        batch = []
+        while len(batch) < limit and not self.queue.empty():
+            response = self.queue.get_nowait()
+            if response is not None:
+                batch.append(response)
+        return batch
+
+    async def write(self, responses: list[dict]):
+        if not responses:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            written = await loop.run_in_executor(
+                self.executor, self.write_batch, responses
+            )
+        except Exception as e:
+            if len(responses) == 1:
+                logger.exception(f"Failed to write job status {responses[0]}: {e}")
+                return
+            # The responses are consumed without acknowledgement, so they can't be left for the queue
+            # to redeliver. Writing them separately finds the response that failed.
+            logger.warning(
+                f"Failed to write {len(responses)} job statuses, writing them one at a time: {e}"
+            )
+            for response in responses:
+                await self.write([response])
+            return
+        await self.on_written(written)
+
+    def write_batch(self, responses: list[dict]) -> WrittenStatuses:
+        """Writes the responses in a single transaction. Runs on the writer thread."""
+        written = WrittenStatuses()
+        job_statuses: list[JobStatus] = []
+
+        with Session(self.engine, expire_on_commit=False) as session:
+            job_ids = {r.get("job_id") for r in responses if r.get("job_id") is not None}
+            jobs = {
+                job.id: job
+                for job in session.exec(select(Job).where(Job.id.in_(job_ids)))
+            }
+
+            # Only the latest progress report of each job is kept.
+            progress_reports: dict[int, dict] = {}
+            for response in responses:
+                if response.get("status") == PROGRESS_STATUS:
+                    if response.get("job_id") in jobs:
+                        progress_reports[response["job_id"]] = response.get("progress") or {}
+                    continue
+                job_statuses += self.apply_response(session, jobs, response, written)
+
+            record_throughput(session, job_statuses)
+            job_progress = self.write_progress(session, progress_reports)
+            session.commit()
+
+            for progress in job_progress:
+                written.notifications.append(
+                    {
+                        "job_progress": progress.model_dump(),
+                        "job": jobs[progress.job_id].model_dump(),
+                    }
+                )
+
+            for job_status in job_statuses:
+                if job_status.status == JobStatusEnum.COMPLETE:
+                    written.completed_job_ids.append(job_status.job_id)
+                job = jobs.get(job_status.job_id) or session.get(Job, job_status.job_id)
+                written.notifications.append(
+                    {
+                        "job_status": job_status.model_dump(),
+                        "job": job.model_dump() if job is not None else None,
+                    }
+                )
+        return written
+
+    def write_progress(
+        self, session: Session, progress_reports: dict[int, dict]
+    ) -> list[JobProgress]:
+        """Upserts the `JobProgress` row of each job. Changes are not committed.
+
+        Returns:
+            list[JobProgress]: The progress that was written.
+        """
+        job_progress = []
+        insert = dialect_insert(session)
+        for job_id, report in progress_reports.items():
+            progress = JobProgress(
+                job_id=job_id,
+                commits=report.get("commits") or 0,
+                total=report.get("total"),
+                rate=report.get("rate"),
+                flush_seconds=report.get("flush_seconds"),
+            )
+            values = progress.model_dump()
+            statement = insert(JobProgress).values(**values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[JobProgress.job_id],
+                set_={key: value for key, value in values.items() if key != "job_id"},
+            )
+            session.exec(statement)
+            job_progress.append(progress)
+        return job_progress
+
+    def apply_response(
+        self,
+        session: Session,
+        jobs: dict[int, Job],
+        response: dict,
+        written: WrittenStatuses,
+    ) -> list[JobStatus]:
+        """Adds the changes for a single response to the session.
+
+        Returns:
+            list[JobStatus]: The statuses that were added.
+        """
+        job_id = response.get("job_id")
+        message = response.get("message", "")
+        commit_count = response.get("commit_count")
+        try:
+            status = JobStatusEnum.from_string(response.get("status"))
+        except ValueError as e:
+            logger.error(f"Invalid Queue Response: {e}")
+            return []
+
+        job = jobs.get(job_id)
+        if job is None:
+            # The job was deleted while it was running. The status can't reference it.
+            logger.warning(f"Received status for unknown job {job_id}.")
+            return []
+
+        if job.latest_status == JobStatusEnum.CANCELLED and status == JobStatusEnum.STARTED:
+            # The worker didn't know about the cancellation when it took the job.
+            written.cancel_job_ids.append(job_id)
+            return []
+
+        job_status = JobStatus(job_id=job_id, status=status, message=message)
+        session.add(job_status)
+        added = [job_status]
+
+        job.apply_status(job_status)
+        session.add(job)
+
+        if response.get("worker_id") is not None and status == JobStatusEnum.STARTED:
+            job.worker_id = response["worker_id"]
+
+        if commit_count is not None:
+            # Recorded so that the size of the repository can be estimated next time it's drilled.
+            job.commit_count = commit_count
+
+        if "shards" in response:
+            written.follow_up_jobs += create_shard_jobs(
+                session, job, response["shards"]
+            )
+
+        if job.parent_id is not None and status.is_finished:
+            session.flush()
+            parent_status, stitch_job = on_shard_finished(session, job)
+            if parent_status is not None:
+                added.append(parent_status)
+            if stitch_job is not None:
+                written.follow_up_jobs.append(stitch_job)
+
+        return added
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 import os
 
@@ -7,8 +8,12 @@ from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 
+from src.database import engine
+from src.job_cleanup import run_job_status_retention
 from src.drill_queue_rpc import RabbitMessageQueueRPC, RepositoryDrillerClient
-from src.routers import driller_router, files, job_statuses
+from src.query_runner import close_graph_driver, get_graph_driver
+from src.query_templates import PlanWarmer
+from src.routers import driller_router, files, job_statuses, queries, workers
 
 logger = logging.getLogger(__name__)
 
@@ -24,8 +29,13 @@ driller_client: RabbitMessageQueueRPC | None = None
 
 async def setup_jobs_queue():
     global driller_client
-    driller_client = RepositoryDrillerClient(user, passwd, host, port)
+    plan_warmer = PlanWarmer(get_graph_driver, files.QUERIES_PATH)
+    driller_client = RepositoryDrillerClient(
+        user, passwd, host, port, plan_warmer=plan_warmer
+    )
     await driller_client.connect()
+    # Plans the saved queries in case Neo4j was restarted and lost its plan cache.
+    plan_warmer.request()
 
 
 async def teardown_jobs_queue():
@@ -38,10 +48,12 @@ async def teardown_jobs_queue():
 async def get_client(request: Request = None) -> RabbitMessageQueueRPC:
     """Gets the RabbitMQ Driller RPC Client
     To be used with dependency ejection for endpoint to access the RPC client.
+    The client is returned even while it's reconnecting, jobs published meanwhile are spilled and sent
+    once the connection is back.
     """
     global driller_client
 
-    if driller_client is None or driller_client.connection.is_closed:
+    if driller_client is None:
         raise ConnectionError("Could not connect to RabbitMQ client.")
 
     if request is not None:
@@ -58,11 +70,14 @@ async def get_client(request: Request = None) -> RabbitMessageQueueRPC:
 async def lifespan(app: FastAPI):
     # Setup the RPC Queue on startup
     await setup_jobs_queue()
+    retention_task = asyncio.create_task(run_job_status_retention(engine))
 
     yield
 
+    retention_task.cancel()
     # Disconnect the queue on teardown.
     await teardown_jobs_queue()
+    await close_graph_driver()
 
 # Instantiate app with global dependency injection and the lifespan
 # `get_client` adds the Rabbit MQ RPC instance to the request object
@@ -72,6 +87,8 @@ app = FastAPI(dependencies=[Depends(get_client)], lifespan=lifespan)
 app.include_router(driller_router.router)
 app.include_router(files.router)
 app.include_router(job_statuses.router)
+app.include_router(queries.router)
+app.include_router(workers.router)
 
 # Allow the Vue JS frontend to access the backend. 
 # Default port is 5173 but can be set in environment file.
@@ -1,4 +1,5 @@
 from logging.config import fileConfig
+import os
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
@@ -6,6 +7,7 @@ from sqlalchemy import pool
 from sqlmodel import SQLModel
 from alembic import context
 from common.models.jobs import Job, JobStatus
+from common.models.workers import Worker
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -16,6 +18,10 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# The backend reads the same variable, so both use the same database.
+if os.environ.get("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -0,0 +1,45 @@
+"""Added Job delete cascades
+
+Revision ID: 2c8d4e7f1a95
+Revises: e5c73a18b4d9
+Create Date: 2026-10-19 15:02:11.519204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c8d4e7f1a95'
+down_revision: Union[str, None] = 'e5c73a18b4d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The foreign key of jobstatus was created without a name. The naming convention lets batch mode find it.
+naming_convention = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('jobstatus', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint('fk_jobstatus_job_id_job', type_='foreignkey')
+        batch_op.create_foreign_key('fk_jobstatus_job_id_job', 'job', ['job_id'], ['id'], ondelete='CASCADE')
+
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_constraint('fk_job_parent_id_job', type_='foreignkey')
+        batch_op.create_foreign_key('fk_job_parent_id_job', 'job', ['parent_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_constraint('fk_job_parent_id_job', type_='foreignkey')
+        batch_op.create_foreign_key('fk_job_parent_id_job', 'job', ['parent_id'], ['id'])
+
+    with op.batch_alter_table('jobstatus') as batch_op:
+        batch_op.drop_constraint('fk_jobstatus_job_id_job', type_='foreignkey')
+        batch_op.create_foreign_key('fk_jobstatus_job_id_job', 'job', ['job_id'], ['id'])
@@ -0,0 +1,30 @@
+"""Added Job commit count
+
+Revision ID: 3b8e51c4d7a2
+Revises: c60111c8977d
+Create Date: 2026-10-19 10:12:41.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e51c4d7a2'
+down_revision: Union[str, None] = 'c60111c8977d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('job', sa.Column('commit_count', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_job_name'), 'job', ['name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_job_name'), table_name='job')
+    op.drop_column('job', 'commit_count')
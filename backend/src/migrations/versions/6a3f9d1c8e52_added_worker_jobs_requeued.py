@@ -0,0 +1,30 @@
+"""Added Worker jobs requeued
+
+Revision ID: 6a3f9d1c8e52
+Revises: b7e2d9c4a1f8
+Create Date: 2026-10-19 23:02:41.137254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3f9d1c8e52'
+down_revision: Union[str, None] = 'b7e2d9c4a1f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Workers that stopped or were lost before this revision have already been handled.
+    op.add_column('worker', sa.Column('jobs_requeued', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.execute("UPDATE worker SET jobs_requeued = true WHERE state <> 'RUNNING'")
+
+
+def downgrade() -> None:
+    op.drop_column('worker', 'jobs_requeued')
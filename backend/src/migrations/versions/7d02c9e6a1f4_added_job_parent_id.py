@@ -0,0 +1,35 @@
+"""Added Job parent id
+
+Revision ID: 7d02c9e6a1f4
+Revises: 3b8e51c4d7a2
+Create Date: 2026-10-19 11:40:03.271958
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d02c9e6a1f4'
+down_revision: Union[str, None] = '3b8e51c4d7a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Batch mode because SQLite can't add a foreign key to an existing table.
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_job_parent_id'), ['parent_id'], unique=False)
+        batch_op.create_foreign_key('fk_job_parent_id_job', 'job', ['parent_id'], ['id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_constraint('fk_job_parent_id_job', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_job_parent_id'))
+        batch_op.drop_column('parent_id')
@@ -0,0 +1,87 @@
+"""Added Job statistics
+
+Revision ID: 8b1f3c6d2e47
+Revises: 2c8d4e7f1a95
+Create Date: 2026-10-19 16:10:45.118372
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+from common.models.jobs import JobStatusEnum
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1f3c6d2e47'
+down_revision: Union[str, None] = '2c8d4e7f1a95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('job', sa.Column('started_at', sa.DateTime(), nullable=True))
+    op.add_column('job', sa.Column('finished_at', sa.DateTime(), nullable=True))
+    op.add_column('job', sa.Column('duration', sa.Float(), nullable=True))
+    op.create_index(op.f('ix_job_finished_at'), 'job', ['finished_at'], unique=False)
+    op.create_table('jobthroughput',
+    sa.Column('minute', sa.DateTime(), nullable=False),
+    sa.Column('status', sqlalchemy_utils.types.choice.ChoiceType(JobStatusEnum), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('minute', 'status')
+    )
+
+    # Fill in the statistics of existing jobs.
+    op.execute(
+        """
+        UPDATE job SET
+            started_at = (
+                SELECT min(jobstatus.timestamp) FROM jobstatus
+                WHERE jobstatus.job_id = job.id AND jobstatus.status = 'started'
+            ),
+            finished_at = CASE WHEN latest_status IN ('complete', 'failed') THEN latest_timestamp END
+        """
+    )
+
+    job = sa.table(
+        'job',
+        sa.column('id', sa.Integer),
+        sa.column('latest_status', sa.String),
+        sa.column('started_at', sa.DateTime),
+        sa.column('finished_at', sa.DateTime),
+        sa.column('duration', sa.Float),
+    )
+    connection = op.get_bind()
+    throughput = {}
+    durations = []
+    rows = connection.execute(
+        sa.select(job.c.id, job.c.latest_status, job.c.started_at, job.c.finished_at)
+        .where(job.c.finished_at.is_not(None))
+    )
+    for job_id, status, started_at, finished_at in rows:
+        minute = finished_at.replace(second=0, microsecond=0)
+        throughput[(minute, status)] = throughput.get((minute, status), 0) + 1
+        if started_at is not None:
+            durations.append({'job_id': job_id, 'duration': (finished_at - started_at).total_seconds()})
+
+    if durations:
+        connection.execute(
+            job.update().where(job.c.id == sa.bindparam('job_id')).values(duration=sa.bindparam('duration')),
+            durations,
+        )
+    if throughput:
+        connection.execute(
+            sa.table('jobthroughput', sa.column('minute', sa.DateTime), sa.column('status'), sa.column('count')).insert(),
+            [{'minute': minute, 'status': status, 'count': count} for (minute, status), count in throughput.items()],
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('jobthroughput')
+    op.drop_index(op.f('ix_job_finished_at'), table_name='job')
+    op.drop_column('job', 'duration')
+    op.drop_column('job', 'finished_at')
+    op.drop_column('job', 'started_at')
@@ -0,0 +1,49 @@
+"""Added Job latest status
+
+Revision ID: a41f6b2e9c30
+Revises: 7d02c9e6a1f4
+Create Date: 2026-10-19 13:05:52.640117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+from common.models.jobs import JobStatusEnum
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41f6b2e9c30'
+down_revision: Union[str, None] = '7d02c9e6a1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('job', sa.Column('latest_status', sqlalchemy_utils.types.choice.ChoiceType(JobStatusEnum), nullable=True))
+    op.add_column('job', sa.Column('latest_timestamp', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_job_latest_status'), 'job', ['latest_status'], unique=False)
+    op.create_index('ix_jobstatus_job_id_timestamp', 'jobstatus', ['job_id', 'timestamp'], unique=False)
+
+    # Fill in the latest status of existing jobs.
+    op.execute(
+        """
+        UPDATE job SET
+            latest_timestamp = (
+                SELECT max(jobstatus.timestamp) FROM jobstatus WHERE jobstatus.job_id = job.id
+            ),
+            latest_status = (
+                SELECT jobstatus.status FROM jobstatus WHERE jobstatus.job_id = job.id
+                ORDER BY jobstatus.timestamp DESC, jobstatus.id DESC LIMIT 1
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobstatus_job_id_timestamp', table_name='jobstatus')
+    op.drop_index(op.f('ix_job_latest_status'), table_name='job')
+    op.drop_column('job', 'latest_timestamp')
+    op.drop_column('job', 'latest_status')
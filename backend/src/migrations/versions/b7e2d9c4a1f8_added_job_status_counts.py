@@ -0,0 +1,44 @@
+"""Added Job status counts
+
+Revision ID: b7e2d9c4a1f8
+Revises: f1e6b8a3d520
+Create Date: 2026-10-19 21:14:08.502913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+from common.models.jobs import JobStatusEnum
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d9c4a1f8'
+down_revision: Union[str, None] = 'f1e6b8a3d520'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('jobstatuscount',
+    sa.Column('status', sqlalchemy_utils.types.choice.ChoiceType(JobStatusEnum), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('status')
+    )
+
+    # Count the existing jobs once. The counts are kept up to date from then on.
+    op.execute(
+        """
+        INSERT INTO jobstatuscount (status, count)
+        SELECT latest_status, count(*) FROM job
+        WHERE latest_status IS NOT NULL
+        GROUP BY latest_status
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('jobstatuscount')
@@ -0,0 +1,37 @@
+"""Added Job progress
+
+Revision ID: d4a9e2b7c135
+Revises: 8b1f3c6d2e47
+Create Date: 2026-10-19 17:02:54.730261
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9e2b7c135'
+down_revision: Union[str, None] = '8b1f3c6d2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('jobprogress',
+    sa.Column('commits', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('rate', sa.Float(), nullable=True),
+    sa.Column('flush_seconds', sa.Float(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['job_id'], ['job.id'], name='fk_jobprogress_job_id_job', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('jobprogress')
@@ -0,0 +1,43 @@
+"""Added Job latest status rank
+
+Revision ID: e5c73a18b4d9
+Revises: a41f6b2e9c30
+Create Date: 2026-10-19 14:21:37.904466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c73a18b4d9'
+down_revision: Union[str, None] = 'a41f6b2e9c30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('job', sa.Column('latest_status_rank', sa.Integer(), nullable=False, server_default='5'))
+    op.create_index('ix_job_latest_status_rank_id', 'job', ['latest_status_rank', 'id'], unique=False)
+
+    # Matches `JobStatusEnum.rank`
+    op.execute(
+        """
+        UPDATE job SET latest_status_rank = CASE latest_status
+            WHEN 'started' THEN 1
+            WHEN 'pending' THEN 2
+            WHEN 'failed' THEN 3
+            WHEN 'complete' THEN 4
+            ELSE 5
+        END
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_latest_status_rank_id', table_name='job')
+    op.drop_column('job', 'latest_status_rank')
@@ -0,0 +1,44 @@
+"""Added workers
+
+Revision ID: f1e6b8a3d520
+Revises: d4a9e2b7c135
+Create Date: 2026-10-19 18:21:09.402617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1e6b8a3d520'
+down_revision: Union[str, None] = 'd4a9e2b7c135'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('worker',
+    sa.Column('id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('state', sa.Enum('RUNNING', 'STOPPED', 'LOST', name='workerstate'), nullable=False),
+    sa.Column('queues', sa.JSON(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('last_heartbeat', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_worker_last_heartbeat'), 'worker', ['last_heartbeat'], unique=False)
+    op.add_column('job', sa.Column('worker_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('job', sa.Column('attempts', sa.Integer(), nullable=False, server_default='1'))
+    op.create_index(op.f('ix_job_worker_id'), 'job', ['worker_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_job_worker_id'), table_name='job')
+    op.drop_column('job', 'attempts')
+    op.drop_column('job', 'worker_id')
+    op.drop_index(op.f('ix_worker_last_heartbeat'), table_name='worker')
+    op.drop_table('worker')
+    sa.Enum(name='workerstate').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,306 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Iterable
+
+from neo4j import AsyncDriver, AsyncGraphDatabase
+from neo4j.graph import Node, Path, Relationship
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from common.models.jobs import Job
+from common.util import DateTimeEncoder
+
+logger = logging.getLogger(__name__)
+
+# Runs the saved Cypher queries against Neo4j and caches their results.
+# Results are streamed from the driver's lazy result cursor in chunks, so large results don't have to fit in
+# memory. Each result is cached by the hash of the query and its parameters together with a watermark of the
+# graph version. The watermark changes whenever a drill finishes, the number of nodes or relationships changes
+# or the `GraphVersion` node is bumped, which the driller scripts that change existing properties do, so a
+# cached result is never served for a graph that has changed since.
+
+NEO4J_HOST = os.environ.get("NEO4J_HOST", "127.0.0.1")
+NEO4J_PORT = os.environ.get("NEO4J_PORT", 7687)
+NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "")
+# Records fetched from Neo4j at a time.
+QUERY_FETCH_SIZE = int(os.environ.get("QUERY_FETCH_SIZE", 1000))
+# Rows encoded into each chunk of the response.
+QUERY_CHUNK_ROWS = int(os.environ.get("QUERY_CHUNK_ROWS", 500))
+# Total size of the cached results. The least recently used results are evicted first.
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Results larger than this are streamed but not cached.
+QUERY_CACHE_MAX_RESULT_BYTES = int(
+    os.environ.get("QUERY_CACHE_MAX_RESULT_BYTES", 16 * 1024 * 1024)
+)
+
+GRAPH_COUNTS_QUERY = (
+    "CALL { MATCH (n) RETURN count(n) AS nodes } "
+    "CALL { MATCH ()-[r]->() RETURN count(r) AS relationships } "
+    "CALL { OPTIONAL MATCH (v:GraphVersion) RETURN max(v.version) AS version } "
+    "RETURN nodes, relationships, version"
+)
+
+graph_driver: AsyncDriver | None = None
+
+
+def get_graph_driver() -> AsyncDriver:
+    """Dependency that is injected into endpoints for Neo4j access. The driver is created on first use."""
+    global graph_driver
+    if graph_driver is None:
+        graph_driver = AsyncGraphDatabase.driver(
+            f"bolt://{NEO4J_HOST}:{NEO4J_PORT}", auth=(NEO4J_USER, NEO4J_PASSWORD)
+        )
+    return graph_driver
+
+
+async def close_graph_driver():
+    global graph_driver
+    if graph_driver is not None:
+        await graph_driver.close()
+    graph_driver = None
+
+
+def to_json_value(value):
+    """Converts a value returned by Neo4j to a value that can be serialised to JSON."""
+    if isinstance(value, Node):
+        return {
+            "id": value.element_id,
+            "labels": sorted(value.labels),
+            "properties": to_json_value(dict(value)),
+        }
+    if isinstance(value, Relationship):
+        return {
+            "id": value.element_id,
+            "type": value.type,
+            "start": value.start_node.element_id,
+            "end": value.end_node.element_id,
+            "properties": to_json_value(dict(value)),
+        }
+    if isinstance(value, Path):
+        return {
+            "nodes": [to_json_value(node) for node in value.nodes],
+            "relationships": [to_json_value(rel) for rel in value.relationships],
+        }
+    if isinstance(value, dict):
+        return {key: to_json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "iso_format"):
+        # Neo4j temporal types.
+        return value.iso_format()
+    return str(value)
+
+
+@dataclass
+class QueryResult:
+    """Rows of a query result held in the cache."""
+
+    keys: list[str]
+    rows: list[list] = field(default_factory=list)
+    size: int = 0
+
+
+class ResultCache:
+    """LRU cache of query results limited by the total size of the results."""
+
+    def __init__(
+        self,
+        max_bytes: int = QUERY_CACHE_MAX_BYTES,
+        max_result_bytes: int = QUERY_CACHE_MAX_RESULT_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_result_bytes = min(max_result_bytes, max_bytes)
+        self.results: OrderedDict[str, QueryResult] = OrderedDict()
+        self.size = 0
+
+    def get(self, key: str) -> QueryResult | None:
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: QueryResult):
+        if result.size > self.max_result_bytes:
+            return
+        self.pop(key)
+        self.results[key] = result
+        self.size += result.size
+        while self.size > self.max_bytes:
+            _, evicted = self.results.popitem(last=False)
+            self.size -= evicted.size
+
+    def pop(self, key: str):
+        result = self.results.pop(key, None)
+        if result is not None:
+            self.size -= result.size
+
+    def clear(self):
+        self.results.clear()
+        self.size = 0
+
+
+# Global query result cache
+query_cache = ResultCache()
+
+
+def get_cache_key(query: str, parameters: dict, graph_version: str) -> str:
+    query_hash = hashlib.sha256(
+        json.dumps([query, parameters], sort_keys=True, cls=DateTimeEncoder).encode()
+    ).hexdigest()
+    return f"{query_hash}:{graph_version}"
+
+
+async def get_graph_version(driver: AsyncDriver, session: Session) -> str:
+    """Gets the watermark of the graph's version from the time the last drill finished, the number of
+    nodes and relationships, which Neo4j reads from its count store, and the version on the `GraphVersion`
+    node, which is bumped when existing properties are changed outside of a drill."""
+    last_finished: datetime | None = session.exec(select(func.max(Job.finished_at))).one()
+    records, _, _ = await driver.execute_query(GRAPH_COUNTS_QUERY)
+    counts = records[0] if records else {"nodes": 0, "relationships": 0, "version": None}
+    finished = last_finished.isoformat() if last_finished else ""
+    version = counts["version"] if counts["version"] is not None else 0
+    return f"{counts['nodes']}:{counts['relationships']}:{version}:{finished}"
+
+
+async def run_query(
+    driver: AsyncDriver, query: str, parameters: dict
+) -> AsyncIterator[list | list[str]]:
+    """Runs a query and yields its keys followed by each row as JSON values.
+
+    The query runs in a transaction that is rolled back, so saved queries can't change the graph.
+    """
+    async with driver.session(fetch_size=QUERY_FETCH_SIZE) as session:
+        tx = await session.begin_transaction()
+        try:
+            result = await tx.run(query, parameters)
+            yield list(await result.keys())
+            async for record in result:
+                yield [to_json_value(value) for value in record.values()]
+        finally:
+            await tx.rollback()
+
+
+def chunk_rows(rows: Iterable[list], size: int = QUERY_CHUNK_ROWS) -> Iterable[list[list]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class NdjsonEncoder:
+    """Encodes the rows as one JSON object per line."""
+
+    media_type = "application/x-ndjson"
+
+    def encode(self, keys: list[str], rows: list[list]) -> bytes:
+        return "".join(json.dumps(dict(zip(keys, row))) + "\n" for row in rows).encode()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class CsvEncoder:
+    """Encodes the rows as CSV with a header. Lists and maps are written as JSON."""
+
+    media_type = "text/csv"
+
+    def __init__(self):
+        self.header_written = False
+
+    def encode(self, keys: list[str], rows: list[list]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not self.header_written:
+            writer.writerow(keys)
+            self.header_written = True
+        for row in rows:
+            writer.writerow(
+                json.dumps(value) if isinstance(value, (dict, list)) else value
+                for value in row
+            )
+        return buffer.getvalue().encode()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    """Encodes the rows as an Arrow IPC stream with the schema inferred from all the rows of the first chunk.
+    Lists and maps are written as JSON since their types can vary between rows. Columns that are empty in the
+    first chunk are written as text so that values in later chunks still fit the schema.
+
+    Requires `pyarrow`, which isn't installed by default.
+    """
+
+    media_type = "application/vnd.apache.arrow.stream"
+
+    def __init__(self):
+        import pyarrow
+        import pyarrow.ipc
+
+        self.pa = pyarrow
+        self.buffer = io.BytesIO()
+        self.writer = None
+        self.schema = None
+        # Columns that had no values in the first chunk, so their type couldn't be inferred.
+        self.text_columns: set[str] = set()
+
+    def take(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def column(self, key: str, values: list) -> list:
+        if key in self.text_columns:
+            return [
+                value if value is None or isinstance(value, str) else json.dumps(value, cls=DateTimeEncoder)
+                for value in values
+            ]
+        return [json.dumps(value) if isinstance(value, (dict, list)) else value for value in values]
+
+    def infer_schema(self, columns: dict[str, list]):
+        schema = self.pa.RecordBatch.from_pydict(columns).schema
+        for i, schema_field in enumerate(schema):
+            if self.pa.types.is_null(schema_field.type):
+                self.text_columns.add(schema_field.name)
+                schema = schema.set(i, schema_field.with_type(self.pa.string()))
+        return schema
+
+    def encode(self, keys: list[str], rows: list[list]) -> bytes:
+        columns = {key: self.column(key, [row[i] for row in rows]) for i, key in enumerate(keys)}
+        try:
+            if self.schema is None:
+                self.schema = self.infer_schema(columns)
+            batch = self.pa.RecordBatch.from_pydict(columns, schema=self.schema)
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError) as e:
+            # The stream can't continue once the rows don't fit the schema. It isn't closed, so the client
+            # sees an incomplete stream rather than a result that is silently missing rows.
+            raise ValueError(f"Rows don't match the Arrow schema of the first chunk: {e}") from e
+        if self.writer is None:
+            self.writer = self.pa.ipc.new_stream(self.buffer, self.schema)
+        self.writer.write_batch(batch)
+        return self.take()
+
+    def finish(self) -> bytes:
+        if self.writer is None:
+            return b""
+        self.writer.close()
+        return self.take()
+
+
+ENCODERS = {"ndjson": NdjsonEncoder, "csv": CsvEncoder, "arrow": ArrowEncoder}
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Callable
+
+from neo4j import AsyncDriver
+from neo4j.exceptions import Neo4jError
+from pydantic import TypeAdapter, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Saved queries can declare their parameters in comments at the top of the file, which makes them templates:
+#
+# ```
+# // @param repository: string
+# // @param since: datetime = "2020-01-01T00:00:00"
+# MATCH (:Repository {name: $repository})<-[:PART_OF]-(:Branch)<-[:IN_BRANCH]-(c:Commit)
+# WHERE c.committer_date >= $since
+# RETURN DISTINCT c
+# ```
+#
+# Parameters are always sent to Neo4j as parameters rather than written into the query, so every run of a
+# template has the same query text and Neo4j reuses its cached plan. `warm_up_plans` plans each template with
+# `EXPLAIN` so the first run after a drill doesn't pay for planning either.
+
+# Seconds to wait after a drill completes before planning the templates, so drills that complete together
+# only cause one warm-up.
+QUERY_WARMUP_DELAY = float(os.environ.get("QUERY_WARMUP_DELAY", 30))
+
+QUERY_FILE_EXTENSION = ".cypher"
+
+PARAM_PATTERN = re.compile(
+    r"^\s*//\s*@param\s+(?P<name>\w+)\s*:\s*(?P<type>\w+(\[\])?)\s*(=\s*(?P<default>.+?))?\s*$"
+)
+
+PARAMETER_TYPES: dict[str, type] = {
+    "string": str,
+    "integer": int,
+    "float": float,
+    "boolean": bool,
+    "date": date,
+    "datetime": datetime,
+}
+
+# Values used to plan a template when a parameter has no default. Neo4j caches plans by parameter type, so
+# they need the same type as the values the template is run with.
+PLACEHOLDER_VALUES: dict[str, Any] = {
+    "string": "",
+    "integer": 0,
+    "float": 0.0,
+    "boolean": False,
+    "date": date(1970, 1, 1),
+    "datetime": datetime(1970, 1, 1, tzinfo=timezone.utc),
+}
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def with_timezone(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class TemplateParameter:
+    name: str
+    type: str
+    default: Any = None
+    required: bool = True
+
+    @property
+    def adapter(self) -> TypeAdapter:
+        if self.type.endswith("[]"):
+            return TypeAdapter(list[PARAMETER_TYPES[self.type[:-2]]])
+        return TypeAdapter(PARAMETER_TYPES[self.type])
+
+    def convert(self, value: Any) -> Any:
+        """Converts a value to the declared type.
+
+        Raises:
+            ValidationError: If the value isn't of the declared type.
+        """
+        value = self.adapter.validate_python(value)
+        if self.type.startswith("datetime"):
+            # Commit dates are stored with their offset. A value without one would be a `LocalDateTime` in
+            # Neo4j, which never compares equal to them, so UTC is assumed.
+            if isinstance(value, list):
+                return [with_timezone(item) for item in value]
+            return with_timezone(value)
+        return value
+
+    def placeholder(self) -> Any:
+        if not self.required:
+            return self.default
+        if self.type.endswith("[]"):
+            return [PLACEHOLDER_VALUES[self.type[:-2]]]
+        return PLACEHOLDER_VALUES[self.type]
+
+
+@dataclass
+class QueryTemplate:
+    query: str
+    parameters: dict[str, TemplateParameter] = field(default_factory=dict)
+
+    def bind(self, values: dict) -> dict:
+        """Validates the values of the parameters and converts them to their declared types.
+        Templates without declared parameters accept any parameters.
+
+        Raises:
+            TemplateError: If a parameter is missing, unknown or of the wrong type.
+        """
+        if not self.parameters:
+            return dict(values)
+
+        unknown = set(values) - set(self.parameters)
+        if unknown:
+            raise TemplateError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+        bound = {}
+        for name, parameter in self.parameters.items():
+            if name not in values:
+                if parameter.required:
+                    raise TemplateError(f"Missing parameter: {name}")
+                bound[name] = parameter.default
+                continue
+            try:
+                bound[name] = parameter.convert(values[name])
+            except ValidationError:
+                raise TemplateError(f"Parameter {name} must be of type {parameter.type}")
+        return bound
+
+    def placeholders(self) -> dict:
+        return {name: parameter.placeholder() for name, parameter in self.parameters.items()}
+
+
+def parse_template(text: str) -> QueryTemplate:
+    """Parses the parameter declarations at the top of a saved query. The declarations are removed from
+    the query.
+
+    Raises:
+        TemplateError: If a declaration has an unknown type or an invalid default.
+    """
+    lines = text.splitlines()
+    parameters = {}
+    while lines and (match := PARAM_PATTERN.match(lines[0])):
+        name, type_name, default = match["name"], match["type"], match["default"]
+        if type_name.removesuffix("[]") not in PARAMETER_TYPES:
+            raise TemplateError(f"Unknown type {type_name} of parameter {name}")
+
+        parameter = TemplateParameter(name, type_name)
+        if default is not None:
+            try:
+                parameter.default = parameter.convert(json.loads(default))
+            except (json.JSONDecodeError, ValidationError):
+                raise TemplateError(f"Invalid default of parameter {name}: {default}")
+            parameter.required = False
+        parameters[name] = parameter
+        lines.pop(0)
+
+    return QueryTemplate("\n".join(lines).strip(), parameters)
+
+
+def list_templates(queries_path: str) -> dict[str, QueryTemplate]:
+    """Parses every saved query. Queries that can't be read or parsed are skipped.
+
+    Returns:
+        dict[str, QueryTemplate]: Templates by their path relative to `queries_path`.
+    """
+    templates = {}
+    for root, _, files in os.walk(queries_path):
+        for file_name in files:
+            if not file_name.endswith(QUERY_FILE_EXTENSION):
+                continue
+            file_path = os.path.join(root, file_name)
+            try:
+                with open(file_path, "r") as file:
+                    template = parse_template(file.read())
+            except (OSError, TemplateError) as e:
+                logger.warning(f"Skipping saved query {file_path}: {e}")
+                continue
+            if template.query:
+                templates[os.path.relpath(file_path, queries_path)] = template
+    return templates
+
+
+async def warm_up_plans(driver: AsyncDriver, queries_path: str) -> int:
+    """Plans each saved query with `EXPLAIN` so that Neo4j has the plans cached when they are run.
+    Queries that fail to plan are logged and skipped.
+
+    Returns:
+        int: Number of queries planned.
+    """
+    planned = 0
+    for path, template in list_templates(queries_path).items():
+        try:
+            await driver.execute_query(f"EXPLAIN {template.query}", template.placeholders())
+            planned += 1
+        except Neo4jError as e:
+            logger.warning(f"Could not plan saved query {path}: {e}")
+    logger.info(f"Planned {planned} saved queries.")
+    return planned
+
+
+class PlanWarmer:
+    """Plans the saved queries in the background once drills complete. Requests made while waiting or
+    planning are combined into one more warm-up."""
+
+    def __init__(
+        self,
+        get_driver: Callable[[], AsyncDriver],
+        queries_path: str,
+        delay: float = QUERY_WARMUP_DELAY,
+    ):
+        self.get_driver = get_driver
+        self.queries_path = queries_path
+        self.delay = delay
+        self.pending = False
+        self.task: asyncio.Task | None = None
+
+    def request(self):
+        self.pending = True
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while self.pending:
+            await asyncio.sleep(self.delay)
+            self.pending = False
+            try:
+                await warm_up_plans(self.get_driver(), self.queries_path)
+            except Exception as e:
+                logger.warning(f"Could not warm up the query plans: {e}")
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
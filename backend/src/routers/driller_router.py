@@ -1,4 +1,8 @@
+import base64
+import binascii
+from collections import Counter
 from contextlib import asynccontextmanager
+from datetime import datetime
 from enum import Enum
 import json
 from typing import List
@@ -15,27 +19,106 @@ from fastapi import (
 
 import logging
 
-from fastapi.responses import JSONResponse
-from sqlalchemy import case, func
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import and_, func, insert, or_
 from sqlmodel import Session, select
 from sqlalchemy.orm import selectinload
 
 from src.database import get_session
+from src.job_cleanup import delete_jobs
+from src.job_stats import change_status_counts, get_job_stats, record_throughput
+from src.ws_connection_manager import socket_connections
+from src.size_estimator import estimate_size_classes
 from common.models.jobs import (
     Job,
     JobCreate,
     JobDetails,
+    JobExport,
     JobList,
     JobStatus,
     JobStatusOverview,
     JobStatusEnum,
 )
-from common.models.driller_config import DrillConfig, SingleDrillConfig
+from common.models.driller_config import (
+    BATCH_DRILL_MESSAGE_TYPE,
+    BatchDrillConfig,
+    DrillConfig,
+    SingleDrillConfig,
+    SizeClass,
+)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 router = APIRouter()
 
+# Number of jobs read from the database at a time when exporting.
+EXPORT_PAGE_SIZE = 1000
+
+
+def encode_cursor(job: Job) -> str:
+    """Encodes the position of a job in the job list as an opaque cursor."""
+    position = json.dumps([job.latest_status_rank, job.id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    """Decodes a cursor created with `encode_cursor`.
+
+    Raises:
+        HTTPException: If the cursor is not valid.
+    """
+    try:
+        rank, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(rank), int(job_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+
+def get_status_filters(statuses: List[str]) -> list:
+    if not statuses:
+        return []
+    try:
+        status_enum_list = [JobStatusEnum(status) for status in statuses]
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"One or more statuses are not valid: {statuses}",
+        )
+    return [Job.latest_status.in_(status_enum_list)]
+
+
+def select_jobs_page(filters: list, after: tuple[int, int] | None, limit: int):
+    """Selects the jobs that come after the `after` position in order of (latest_status_rank, id).
+
+    Seeking with the position uses the `ix_job_latest_status_rank_id` index, so the cost of fetching a
+    page doesn't depend on how deep into the list it is.
+    """
+    statement = select(Job).where(*filters)
+    if after is not None:
+        rank, job_id = after
+        statement = statement.where(
+            or_(
+                Job.latest_status_rank > rank,
+                and_(Job.latest_status_rank == rank, Job.id > job_id),
+            )
+        )
+    return statement.order_by(Job.latest_status_rank, Job.id).limit(limit)
+
+
+class TotalMode(str, Enum):
+    exact = "exact"
+    approximate = "approximate"
+    none = "none"
+
+
+def count_jobs(session: Session, filters: list, mode: TotalMode) -> int | None:
+    if mode == TotalMode.none:
+        return None
+    if mode == TotalMode.approximate and not filters:
+        # Ids are never reused, so the largest id is an upper bound that only needs one index lookup.
+        return session.exec(select(func.max(Job.id))).one() or 0
+    return session.exec(select(func.count(Job.id)).where(*filters)).one()
+
 
 @router.get("/jobs/")
 def list_jobs(
@@ -44,91 +127,127 @@ def list_jobs(
     offset: int = 0,
     limit: int = Query(default=100, le=100),
     statuses: List[str] = Query(default=[], description="Statuses of the job"),
+    cursor: str | None = Query(
+        default=None,
+        description="`next_cursor` of the previous page. When given `offset` is ignored.",
+    ),
+    total: TotalMode = Query(
+        default=TotalMode.exact,
+        description="How the total is counted. `approximate` avoids counting every job when "
+        "no statuses are given. `none` skips counting.",
+    ),
 ):
-    subquery = (
-        select(JobStatus.job_id, func.max(JobStatus.timestamp).label("max_timestamp"))
-        .group_by(JobStatus.job_id)
-        .subquery()
-    )
+    filters = get_status_filters(statuses)
 
-    latest_statuses = (
-        select(JobStatus)
-        .join(
-            subquery,
-            (JobStatus.job_id == subquery.c.job_id)
-            & (JobStatus.timestamp == subquery.c.max_timestamp),
+    if cursor is not None:
+        statement = select_jobs_page(filters, decode_cursor(cursor), limit)
+    else:
+        statement = select_jobs_page(filters, None, limit).offset(offset)
+
+    result = session.exec(statement.options(selectinload(Job.job_statuses))).all()
+
+    items = [
+        JobList(
+            id=job.id,
+            name=job.name,
+            data=job.data,
+            parent_id=job.parent_id,
+            statuses=job.job_statuses,
         )
-        .subquery()
-    )
+        for job in result
+    ]
+    next_cursor = encode_cursor(result[-1]) if len(result) == limit else None
 
-    status_order = case(
-        (latest_statuses.c.status == JobStatusEnum.STARTED, 1),
-        (latest_statuses.c.status == JobStatusEnum.PENDING, 2),
-        (latest_statuses.c.status == JobStatusEnum.FAILED, 3),
-        (latest_statuses.c.status == JobStatusEnum.COMPLETE, 4),
-        else_=5,
-    )
+    return {
+        "items": items,
+        "total": count_jobs(session, filters, total),
+        "next_cursor": next_cursor,
+    }
 
-    base_statement = select(Job).join(
-        latest_statuses, Job.id == latest_statuses.c.job_id
-    )
 
-    if statuses:
-        try:
-            status_enum_list = [JobStatusEnum(status) for status in statuses]
-        except ValueError as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"One or more statuses are not valid: {statuses}",
-            )
-        base_statement = base_statement.where(
-            latest_statuses.c.status.in_(status_enum_list)
-        )
+@router.get("/jobs/export")
+def export_jobs(
+    *,
+    session: Session = Depends(get_session),
+    statuses: List[str] = Query(default=[], description="Statuses of the job"),
+):
+    """Streams every job matching the statuses as newline delimited JSON.
 
-    # Query to get the total count of jobs matching the criteria
-    count_statement = select(func.count()).select_from(base_statement.subquery())
-    total = session.exec(count_statement).one()
+    Jobs are read in pages so memory use stays flat however many jobs there are.
+    """
+    filters = get_status_filters(statuses)
+    engine = session.get_bind()
 
-    # Apply pagination
-    statement = (
-        base_statement.order_by(status_order)
-        .offset(offset)
-        .limit(limit)
-        .options(selectinload(Job.job_statuses))
-    )
+    def generate_lines():
+        after = None
+        while True:
+            # A short lived session per page so no transaction is held open while the client reads.
+            with Session(engine) as page_session:
+                jobs = page_session.exec(
+                    select_jobs_page(filters, after, EXPORT_PAGE_SIZE)
+                ).all()
+                lines = "".join(
+                    JobExport.model_validate(job, from_attributes=True).model_dump_json()
+                    + "\n"
+                    for job in jobs
+                )
+            if lines:
+                yield lines
+            if len(jobs) < EXPORT_PAGE_SIZE:
+                return
+            after = (jobs[-1].latest_status_rank, jobs[-1].id)
 
-    result = session.exec(statement).all()
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
 
-    # logger.warning(result)
-    items = []
-    for item in result:
-        job = item if item else item
-        if job is None:
-            return JSONResponse(status_code=404, content={"error": "Job not found"})
-        items.append(
-            JobList(id=job.id, name=job.name, data=job.data, statuses=job.job_statuses)
-        )
 
-    return {"items": items, "total": total}
+@router.get("/jobs/stats")
+def job_stats(
+    *,
+    session: Session = Depends(get_session),
+    window_minutes: int = Query(
+        default=60,
+        ge=1,
+        le=24 * 60,
+        description="Minutes covered by the throughput and durations.",
+    ),
+):
+    """Counts of jobs by latest status, jobs finished per minute and p50/p95 job durations in seconds.
+    Cheap enough to be polled by dashboards."""
+    return get_job_stats(session, window_minutes)
 
 
 @router.delete("/jobs/{job_id}")
 def delete_job(*, session: Session = Depends(get_session), job_id: int):
-    job = session.get(Job, job_id)
-    if not job:
+    deleted = delete_jobs(session, [Job.id == job_id])
+    if not deleted:
         raise HTTPException(status_code=404, detail="Job not found")
-    session.delete(job)
     session.commit()
     return Response(status_code=200)
 
 
 @router.delete("/jobs/")
-def delete_all_jobs(*, session: Session = Depends(get_session)):
-    results = session.exec(select(Job))
-    for job in results:
-        session.delete(job)
+def delete_all_jobs(
+    *,
+    session: Session = Depends(get_session),
+    statuses: List[str] = Query(default=[], description="Statuses of the job"),
+    older_than: datetime | None = Query(
+        default=None, description="Only jobs whose latest status is from before this time."
+    ),
+    name: str | None = Query(
+        default=None,
+        description="Only jobs whose name matches this SQL LIKE pattern, e.g. `apache-%`.",
+    ),
+):
+    """Deletes the jobs matching all of the filters in one transaction. Deletes every job without filters."""
+    filters = get_status_filters(statuses)
+    if older_than is not None:
+        filters.append(Job.latest_timestamp < older_than)
+    if name is not None:
+        filters.append(Job.name.like(name))
+
+    deleted = delete_jobs(session, filters)
     session.commit()
-    return Response(status_code=200)
+    return {"deleted": deleted}
 
 
 @router.get("/jobs/{job_id}", response_model=JobDetails)
@@ -139,6 +258,55 @@ def detail_job(*, session: Session = Depends(get_session), job_id: int):
     return job
 
 
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(*, session: Session = Depends(get_session), job_id: int, request: Request):
+    """Cancels a job and the unfinished shards of it.
+
+    Jobs that haven't started are cancelled straight away. Running jobs are stopped by their worker between
+    commits, which then reports the `cancelled` status.
+    """
+    job = session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.latest_status is not None and JobStatusEnum(job.latest_status).is_finished:
+        raise HTTPException(
+            status_code=409, detail=f"Job is already {JobStatusEnum(job.latest_status).value}."
+        )
+
+    shards = session.exec(select(Job).where(Job.parent_id == job.id)).all()
+    jobs = [job] + [
+        s for s in shards if s.latest_status is None or not JobStatusEnum(s.latest_status).is_finished
+    ]
+
+    job_statuses = []
+    for cancelled_job in jobs:
+        # A sharded parent isn't run by a worker while its shards are, so nothing else would report it.
+        if cancelled_job.latest_status == JobStatusEnum.PENDING or (
+            cancelled_job is job and shards
+        ):
+            job_status = JobStatus(
+                job_id=cancelled_job.id,
+                status=JobStatusEnum.CANCELLED,
+                message="Cancelled.",
+            )
+            session.add(job_status)
+            cancelled_job.apply_status(job_status)
+            session.add(cancelled_job)
+            job_statuses.append(job_status)
+    record_throughput(session, job_statuses)
+    session.commit()
+
+    socket_connections.broadcast(
+        [
+            {"job_status": job_status.model_dump(), "job": session.get(Job, job_status.job_id).model_dump()}
+            for job_status in job_statuses
+        ]
+    )
+    job_ids = [j.id for j in jobs]
+    await request.state.driller_client.cancel(job_ids)
+    return {"job_ids": job_ids}
+
+
 @router.post("/jobs/", response_model=list[JobList])
 async def create_jobs(
     *,
@@ -146,46 +314,98 @@ async def create_jobs(
     drill_config: DrillConfig,
     background_tasks: BackgroundTasks,
     request: Request,
+    batch_size: int = Query(
+        default=1,
+        ge=1,
+        le=500,
+        description="Number of repositories sent to a worker in a single message. "
+        "Batching many small repositories avoids the per job overhead on the workers.",
+    ),
+    shards: int = Query(
+        default=1,
+        ge=1,
+        le=64,
+        description="Number of shards each repository is split into. Shards are drilled in parallel "
+        "by different workers. Sharded jobs are never batched.",
+    ),
 ):
-    job_list = []
-    for repository in drill_config.repositories:
-        single_job = SingleDrillConfig(
-            defaults=drill_config.defaults, repository=repository
+    size_classes = estimate_size_classes(session, drill_config.repositories)
+    single_jobs = [
+        SingleDrillConfig(
+            defaults=drill_config.defaults,
+            repository=repository,
+            size_class=size_classes[repository.name],
+            shards=shards if shards > 1 else None,
         )
+        for repository in drill_config.repositories
+    ]
 
-        db_job = Job.model_validate(
-            JobCreate(name=repository.name, data=single_job.model_dump())
-        )
+    jobs_data = [single_job.model_dump() for single_job in single_jobs]
+    timestamp = datetime.utcnow()
 
-        session.add(db_job)
-        session.commit()
-        session.refresh(db_job)
+    # All of the jobs and their statuses are inserted in a single transaction. The bulk inserts don't go through
+    # the session, so the ORM flush hooks don't run for them. Bookkeeping that is kept up to date by those
+    # hooks, like the job status counts, has to be done here next to the inserts.
+    job_ids = session.scalars(
+        insert(Job).returning(Job.id, sort_by_parameter_order=True),
+        [
+            {
+                "name": single_job.repository.name,
+                "data": data,
+                "latest_status": JobStatusEnum.PENDING,
+                "latest_status_rank": JobStatusEnum.PENDING.rank,
+                "latest_timestamp": timestamp,
+            }
+            for single_job, data in zip(single_jobs, jobs_data)
+        ],
+    ).all()
 
-        single_job.job_id = db_job.id
+    if job_ids:
+        session.execute(
+            insert(JobStatus),
+            [
+                {
+                    "job_id": job_id,
+                    "status": JobStatusEnum.PENDING,
+                    "timestamp": timestamp,
+                    "message": "",
+                }
+                for job_id in job_ids
+            ],
+        )
+        # `count_latest_statuses` only sees jobs added to the session.
+        change_status_counts(session, Counter({JobStatusEnum.PENDING: len(job_ids)}))
+    session.commit()
 
-        db_job_status = JobStatus(job_id=db_job.id)
-        session.add(db_job_status)
-        session.commit()
-        session.refresh(db_job_status)
+    messages: list[tuple[str, str | None, SizeClass | None]] = []
+    # Jobs are only batched with others of the same size class so they go to the same queue.
+    batches: dict[SizeClass, list[SingleDrillConfig]] = {}
+    for job_id, single_job in zip(job_ids, single_jobs):
+        single_job.job_id = job_id
 
-        background_tasks.add_task(
-            request.state.driller_client.call,
-            single_job.model_dump_json(),
-        )
+        if batch_size > 1 and shards == 1:
+            batches.setdefault(single_job.size_class, []).append(single_job)
+        else:
+            messages.append((single_job.model_dump_json(), None, single_job.size_class))
 
-        job_list.append(
-            JobList(
-                id=db_job.id,
-                name=db_job.name,
-                data=db_job.data,
-                statuses=[
-                    JobStatusOverview(
-                        status=db_job_status.status, timestamp=db_job_status.timestamp
-                    )
-                ],
+    for size_class, jobs in batches.items():
+        for start in range(0, len(jobs), batch_size):
+            batch = BatchDrillConfig(jobs=jobs[start : start + batch_size])
+            messages.append(
+                (batch.model_dump_json(), BATCH_DRILL_MESSAGE_TYPE, size_class)
             )
-        )
 
-    # result = await driller_client.call(body)
-    return job_list
-    # return Response(jobs_list, status_code=201)
+    # Publish all of the jobs from a single background task so the publishes are pipelined.
+    background_tasks.add_task(request.state.driller_client.call_many, messages)
+
+    return [
+        JobList(
+            id=job_id,
+            name=single_job.repository.name,
+            data=data,
+            statuses=[
+                JobStatusOverview(status=JobStatusEnum.PENDING, timestamp=timestamp)
+            ],
+        )
+        for job_id, single_job, data in zip(job_ids, single_jobs, jobs_data)
+    ]
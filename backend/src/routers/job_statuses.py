@@ -1,3 +1,4 @@
+import json
 import logging
 import time
 
@@ -12,11 +13,13 @@ from fastapi import (
 from sqlmodel import Session
 
 from common.models.jobs import (
+    Job,
     JobStatus,
     JobStatusDetails,
 )
 
 from src.database import get_session
+from src.job_stats import record_throughput
 from src.ws_connection_manager import socket_connections
 
 logger = logging.getLogger(__name__)
@@ -30,13 +33,19 @@ async def websocket_endpoint(
     *,
     websocket: WebSocket,
 ):
+    """Sends status notifications in frames containing a JSON list. The client can limit the notifications
+    it receives by sending `{"subscribe": {"job_ids": [1, 2], "statuses": ["complete"]}}`."""
     await socket_connections.connect(websocket)
-    logger.warning("WS COnnect")
     try:
         while True:
-            logger.info(socket_connections)
-            text = await websocket.receive_text()  # not really necessary
-            logger.info(f"Received text: {text}")
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except json.JSONDecodeError:
+                logger.warning(f"Received invalid websocket message: {text}")
+                continue
+            if isinstance(message, dict) and "subscribe" in message:
+                socket_connections.subscribe(websocket, message)
 
     except WebSocketDisconnect:
         socket_connections.disconnect(websocket)
@@ -49,6 +58,13 @@ def create_job_status(
     """Creates a Job Status in the database. Mostly for testing as the
     job statuses should be created based on reponses from the workers"""
     session.add(job_status)
+
+    job = session.get(Job, job_status.job_id)
+    if job is not None:
+        job.apply_status(job_status)
+        session.add(job)
+    record_throughput(session, [job_status])
+
     session.commit()
     session.refresh(job_status)
     return job_status
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+from enum import Enum
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from neo4j import AsyncDriver
+from neo4j.exceptions import ClientError
+from pydantic import BaseModel
+from sqlmodel import Session
+
+from src.database import get_session
+from src.query_runner import (
+    ENCODERS,
+    QUERY_CHUNK_ROWS,
+    QueryResult,
+    chunk_rows,
+    get_cache_key,
+    get_graph_driver,
+    get_graph_version,
+    query_cache,
+    run_query,
+)
+from src.query_templates import TemplateError, parse_template
+from src.routers.files import QUERIES_PATH
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Endpoints for running the saved queries against Neo4j and streaming the results.
+router = APIRouter()
+
+
+class ResultFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"
+
+
+class RunQueryBody(BaseModel):
+    parameters: dict = {}
+
+
+def read_saved_query(path: str) -> str:
+    """Reads a saved query. Paths outside of the queries directory aren't allowed."""
+    base_path = os.path.realpath(QUERIES_PATH)
+    file_path = os.path.realpath(os.path.join(base_path, path))
+    if not file_path.startswith(base_path + os.sep) or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Query not found")
+    with open(file_path, "r") as file:
+        return file.read()
+
+
+async def stream_cached(encoder, result: QueryResult) -> AsyncIterator[bytes]:
+    # An empty chunk still writes the CSV header or Arrow schema of an empty result.
+    for chunk in chunk_rows(result.rows) if result.rows else [[]]:
+        yield encoder.encode(result.keys, chunk)
+    yield encoder.finish()
+
+
+async def stream_and_cache(
+    encoder, keys: list[str], rows: AsyncIterator[list], cache_key: str | None
+) -> AsyncIterator[bytes]:
+    """Streams the rows in chunks. When `cache_key` is given the rows are kept and cached once the result
+    is complete, unless the result grows larger than the cache allows."""
+    result = QueryResult(keys) if cache_key is not None else None
+    chunk = []
+    encoded = False
+    try:
+        async for row in rows:
+            chunk.append(row)
+            if result is not None:
+                result.rows.append(row)
+                result.size += len(json.dumps(row))
+                if result.size > query_cache.max_result_bytes:
+                    result = None
+            if len(chunk) >= QUERY_CHUNK_ROWS:
+                yield encoder.encode(keys, chunk)
+                chunk = []
+                encoded = True
+        if chunk or not encoded:
+            yield encoder.encode(keys, chunk)
+        yield encoder.finish()
+    finally:
+        await rows.aclose()
+
+    if result is not None:
+        query_cache.put(cache_key, result)
+
+
+@router.post("/queries/run/{path:path}")
+async def run_saved_query(
+    path: str,
+    body: RunQueryBody = RunQueryBody(),
+    format: ResultFormat = ResultFormat.NDJSON,
+    cache: bool = True,
+    driver: AsyncDriver = Depends(get_graph_driver),
+    session: Session = Depends(get_session),
+):
+    """Runs a saved query and streams the result as NDJSON, CSV or an Arrow IPC stream.
+    The parameters are checked against the ones the query declares and sent to Neo4j as query parameters.
+
+    Results are served from the cache when the same query and parameters were run since the graph last
+    changed. `X-Cache` says whether the result came from the cache.
+    """
+    try:
+        template = parse_template(read_saved_query(path))
+        parameters = template.bind(body.parameters)
+    except TemplateError as e:
+        raise HTTPException(400, str(e))
+    try:
+        encoder = ENCODERS[format.value]()
+    except ImportError:
+        raise HTTPException(400, "Arrow output requires `pyarrow` to be installed.")
+
+    graph_version = await get_graph_version(driver, session)
+    cache_key = get_cache_key(template.query, parameters, graph_version)
+    headers = {"X-Graph-Version": graph_version}
+
+    cached = query_cache.get(cache_key) if cache else None
+    if cached is not None:
+        headers["X-Cache"] = "HIT"
+        return StreamingResponse(
+            stream_cached(encoder, cached), media_type=encoder.media_type, headers=headers
+        )
+
+    rows = run_query(driver, template.query, parameters)
+    try:
+        # Runs the query before the response starts so that errors in the query are returned as errors.
+        keys = await anext(rows)
+    except ClientError as e:
+        await rows.aclose()
+        raise HTTPException(400, e.message)
+
+    headers["X-Cache"] = "MISS"
+    return StreamingResponse(
+        stream_and_cache(encoder, keys, rows, cache_key if cache else None),
+        media_type=encoder.media_type,
+        headers=headers,
+    )
+
+
+@router.get("/queries/templates/{path:path}", response_model=dict)
+async def get_query_template(path: str):
+    """Gets the parameters a saved query declares, with their type and default."""
+    try:
+        template = parse_template(read_saved_query(path))
+    except TemplateError as e:
+        raise HTTPException(400, str(e))
+    return {
+        "parameters": [
+            {
+                "name": parameter.name,
+                "type": parameter.type,
+                "required": parameter.required,
+                "default": parameter.default,
+            }
+            for parameter in template.parameters.values()
+        ]
+    }
+
+
+@router.delete("/queries/cache")
+async def clear_query_cache():
+    """Clears the cached query results, e.g. after the graph was changed outside of a drill."""
+    query_cache.clear()
+    return Response(status_code=204)
@@ -0,0 +1,18 @@
+import logging
+
+from fastapi import APIRouter, Depends
+from sqlmodel import Session, select
+
+from common.models.workers import Worker
+
+from src.database import get_session
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/workers/", response_model=list[Worker])
+def list_workers(*, session: Session = Depends(get_session)):
+    """Lists the workers that have sent heartbeats, most recently seen first."""
+    return session.exec(select(Worker).order_by(Worker.last_heartbeat.desc())).all()
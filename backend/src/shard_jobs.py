@@ -0,0 +1,111 @@
+import logging
+
+from sqlmodel import Session, select
+
+from common.models.jobs import Job, JobStatus, JobStatusEnum
+from common.models.driller_config import SingleDrillConfig
+
+logger = logging.getLogger(__name__)
+
+# A repository can be drilled in shards by several workers at once. The worker that receives the job for
+# the whole repository (the parent job) splits it into shards and responds with a drill config for each.
+# A child job is created for each shard. Once all of the shards are complete a stitch job is sent for the
+# parent, which creates the relationships between shards. The parent fails if any of its shards fail.
+
+
+def create_shard_jobs(
+    session: Session, parent: Job, shard_configs: list[dict]
+) -> list[SingleDrillConfig]:
+    """Creates a child job with a pending status for each shard of the parent job.
+    Changes are not committed.
+
+    Args:
+        session (Session): Database session.
+        parent (Job): Job for the whole repository.
+        shard_configs (list[dict]): Drill configs for the shards sent by the worker.
+
+    Returns:
+        list[SingleDrillConfig]: Drill configs with the `job_id` of the child jobs set.
+    """
+    configs = []
+    for index, data in enumerate(shard_configs):
+        config = SingleDrillConfig.model_validate(data)
+
+        job = Job(
+            name=f"{parent.name} (shard {index + 1}/{len(shard_configs)})",
+            data=config.model_dump(),
+            parent_id=parent.id,
+        )
+        session.add(job)
+        session.flush()
+
+        job_status = JobStatus(job_id=job.id)
+        session.add(job_status)
+        job.apply_status(job_status)
+
+        config.job_id = job.id
+        configs.append(config)
+
+    # The worker that planned the shards is done with the parent. It waits for the shards instead.
+    parent.worker_id = None
+    return configs
+
+
+def create_stitch_config(parent: Job) -> SingleDrillConfig:
+    """Creates the drill config of the stitch job for a sharded parent job."""
+    stitch_config = SingleDrillConfig.model_validate(parent.data)
+    stitch_config.job_id = parent.id
+    stitch_config.shards = None
+    stitch_config.stitch = True
+    return stitch_config
+
+
+def on_shard_finished(
+    session: Session, shard: Job
+) -> tuple[JobStatus | None, SingleDrillConfig | None]:
+    """Updates the parent job after one of its shards completed, failed or was cancelled.
+    Changes are not committed.
+
+    Returns:
+        tuple: The status added to the parent (if any) and the stitch job to send (if all shards are complete).
+    """
+    parent = session.get(Job, shard.parent_id)
+    if parent is None:
+        logger.error(f"Parent of shard job {shard.id} not found.")
+        return None, None
+
+    if parent.latest_status in (JobStatusEnum.FAILED, JobStatusEnum.CANCELLED):
+        # Parent already failed because of an earlier shard or was cancelled.
+        return None, None
+
+    shards = session.exec(select(Job).where(Job.parent_id == parent.id)).all()
+    shard_statuses = [s.latest_status for s in shards]
+
+    if JobStatusEnum.CANCELLED in shard_statuses:
+        job_status = JobStatus(
+            job_id=parent.id,
+            status=JobStatusEnum.CANCELLED,
+            message=f"Shard `{shard.name}` was cancelled.",
+        )
+        session.add(job_status)
+        parent.apply_status(job_status)
+        return job_status, None
+
+    if JobStatusEnum.FAILED in shard_statuses:
+        job_status = JobStatus(
+            job_id=parent.id,
+            status=JobStatusEnum.FAILED,
+            message=f"Shard `{shard.name}` failed.",
+        )
+        session.add(job_status)
+        parent.apply_status(job_status)
+        return job_status, None
+
+    if all(status == JobStatusEnum.COMPLETE for status in shard_statuses):
+        if all(s.commit_count is not None for s in shards):
+            parent.commit_count = sum(s.commit_count for s in shards)
+            session.add(parent)
+
+        return None, create_stitch_config(parent)
+
+    return None, None
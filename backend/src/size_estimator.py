@@ -0,0 +1,77 @@
+import logging
+import os
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from common.models.jobs import Job
+from common.models.driller_config import RepositoryConfig, SizeClass
+
+logger = logging.getLogger(__name__)
+
+# Estimates the size of repositories before they are drilled so that jobs can be routed to a queue per
+# size class. Sizes come from the number of commits traversed the last time the repository was drilled.
+# Repositories that have never been drilled are treated as medium unless their config sets `size_class`.
+
+SMALL_REPOSITORY_MAX_COMMITS = int(os.environ.get("SMALL_REPOSITORY_MAX_COMMITS", 1000))
+LARGE_REPOSITORY_MIN_COMMITS = int(os.environ.get("LARGE_REPOSITORY_MIN_COMMITS", 50000))
+
+
+def get_size_class(commit_count: int | None) -> SizeClass:
+    """Classifies a repository by its number of commits. Unknown sizes are classed as medium."""
+    if commit_count is None:
+        return SizeClass.medium
+    if commit_count <= SMALL_REPOSITORY_MAX_COMMITS:
+        return SizeClass.small
+    if commit_count >= LARGE_REPOSITORY_MIN_COMMITS:
+        return SizeClass.large
+    return SizeClass.medium
+
+
+def get_commit_counts(session: Session, names: list[str]) -> dict[str, int]:
+    """Gets the commit count from the most recent drill of each repository that has been drilled before.
+
+    Args:
+        session (Session): Database session.
+        names (list[str]): Names of the repositories.
+
+    Returns:
+        dict[str, int]: Commit count for each repository name that has a previous drill.
+    """
+    if not names:
+        return {}
+
+    latest_jobs = (
+        select(func.max(Job.id))
+        .where(
+            Job.name.in_(names),
+            Job.commit_count.is_not(None),
+            # Shards only drill part of the repository.
+            Job.parent_id.is_(None),
+        )
+        .group_by(Job.name)
+    )
+    statement = select(Job.name, Job.commit_count).where(Job.id.in_(latest_jobs))
+
+    return {name: commit_count for name, commit_count in session.exec(statement)}
+
+
+def estimate_size_classes(
+    session: Session, repositories: list[RepositoryConfig]
+) -> dict[str, SizeClass]:
+    """Estimates the size class of each repository. A `size_class` in the repository config takes precedence.
+
+    Returns:
+        dict[str, SizeClass]: Size class for each repository name.
+    """
+    commit_counts = get_commit_counts(
+        session, [r.name for r in repositories if r.size_class is None]
+    )
+    return {
+        r.name: (
+            r.size_class
+            if r.size_class is not None
+            else get_size_class(commit_counts.get(r.name))
+        )
+        for r in repositories
+    }
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from pydantic import ValidationError
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from src.database import dialect_insert
+from src.job_stats import record_throughput
+from src.shard_jobs import create_stitch_config
+from common.models.driller_config import SingleDrillConfig
+from common.models.jobs import Job, JobStatus, JobStatusEnum
+from common.models.workers import Worker, WorkerHeartbeat, WorkerState
+
+logger = logging.getLogger(__name__)
+
+# Seconds without a heartbeat after which a worker is considered lost and its jobs are requeued.
+WORKER_HEARTBEAT_TIMEOUT = int(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", 120))
+# Seconds between checks for lost workers.
+WORKER_CHECK_INTERVAL = int(os.environ.get("WORKER_CHECK_INTERVAL", 30))
+# Times a job is sent to the workers before it's moved to the dead letter queue.
+MAX_JOB_ATTEMPTS = int(os.environ.get("MAX_JOB_ATTEMPTS", 3))
+
+
+@dataclass
+class StalledJobs:
+    """Result of requeuing the jobs of lost workers."""
+
+    notifications: list[dict] = field(default_factory=list)
+    # Jobs to send to the workers again.
+    requeue: list[SingleDrillConfig] = field(default_factory=list)
+    # Jobs that ran out of attempts.
+    dead_letter: list[SingleDrillConfig] = field(default_factory=list)
+
+
+def record_heartbeat(session: Session, heartbeat: WorkerHeartbeat):
+    """Registers or updates the worker and assigns it the jobs it reports. Changes are not committed."""
+    now = datetime.utcnow()
+    insert = dialect_insert(session)
+    statement = insert(Worker).values(
+        id=heartbeat.worker_id,
+        state=heartbeat.state,
+        queues=heartbeat.queues,
+        started_at=now,
+        last_heartbeat=now,
+        jobs_requeued=False,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[Worker.id],
+        set_={
+            "state": heartbeat.state,
+            "queues": heartbeat.queues,
+            "last_heartbeat": now,
+            "jobs_requeued": False,
+        },
+    )
+    session.exec(statement)
+
+    if heartbeat.job_ids:
+        session.exec(
+            update(Job)
+            .where(
+                Job.id.in_(heartbeat.job_ids),
+                Job.latest_status.in_([JobStatusEnum.PENDING, JobStatusEnum.STARTED]),
+            )
+            .values(worker_id=heartbeat.worker_id)
+        )
+
+
+def get_drill_config(session: Session, job: Job) -> SingleDrillConfig:
+    """Recreates the drill config that was sent for the job."""
+    has_shards = session.exec(select(Job.id).where(Job.parent_id == job.id)).first()
+    if has_shards is not None:
+        # The shards were planned, so the parent was waiting on the stitch job.
+        return create_stitch_config(job)
+
+    config = SingleDrillConfig.model_validate(job.data)
+    config.job_id = job.id
+    return config
+
+
+def requeue_stalled_jobs(
+    session: Session, timeout: int, max_attempts: int
+) -> StalledJobs:
+    """Finds the unfinished jobs of workers that haven't sent a heartbeat within `timeout` seconds or that
+    stopped before finishing them. Each job is set back to pending to be sent again, or failed once it has
+    been sent `max_attempts` times. Each worker is only handled once. Commits the changes.
+    """
+    stalled = StalledJobs()
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+
+    lost_workers = session.exec(
+        select(Worker).where(
+            Worker.state == WorkerState.RUNNING, Worker.last_heartbeat < cutoff
+        )
+    ).all()
+    for worker in lost_workers:
+        logger.warning(f"Worker {worker.id} stopped sending heartbeats.")
+        worker.state = WorkerState.LOST
+
+    stopped_workers = session.exec(
+        select(Worker).where(
+            Worker.state == WorkerState.STOPPED, Worker.jobs_requeued.is_(False)
+        )
+    ).all()
+    workers = list(lost_workers) + list(stopped_workers)
+    if not workers:
+        return stalled
+    for worker in workers:
+        worker.jobs_requeued = True
+        session.add(worker)
+    worker_ids = [worker.id for worker in workers]
+
+    jobs = session.exec(
+        select(Job).where(
+            Job.worker_id.in_(worker_ids),
+            Job.latest_status.in_([JobStatusEnum.PENDING, JobStatusEnum.STARTED]),
+        )
+    ).all()
+
+    job_statuses = []
+    for job in jobs:
+        config = get_drill_config(session, job)
+        if job.attempts >= max_attempts:
+            job_status = JobStatus(
+                job_id=job.id,
+                status=JobStatusEnum.FAILED,
+                message=f"Worker {job.worker_id} stopped before finishing the job. "
+                f"Moved to the dead letter queue after {job.attempts} attempts.",
+            )
+            stalled.dead_letter.append(config)
+        else:
+            job_status = JobStatus(
+                job_id=job.id,
+                status=JobStatusEnum.PENDING,
+                message=f"Worker {job.worker_id} stopped before finishing the job. "
+                f"Requeued for attempt {job.attempts + 1} of {max_attempts}.",
+            )
+            job.attempts += 1
+            stalled.requeue.append(config)
+
+        job.worker_id = None
+        session.add(job_status)
+        job.apply_status(job_status)
+        session.add(job)
+        job_statuses.append((job_status, job))
+
+    record_throughput(session, [job_status for job_status, _ in job_statuses])
+    session.commit()
+
+    for job_status, job in job_statuses:
+        stalled.notifications.append(
+            {"job_status": job_status.model_dump(), "job": job.model_dump()}
+        )
+    return stalled
+
+
+class WorkerMonitor:
+    """Keeps track of the workers from their heartbeats and requeues the jobs of workers that go silent.
+
+    Heartbeats are written as they arrive. Every `check_interval` seconds the workers that haven't sent a
+    heartbeat within `timeout` seconds are marked as lost and `on_stalled` is awaited with their jobs.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        on_stalled: Callable[[StalledJobs], Awaitable[None]],
+        timeout: int = WORKER_HEARTBEAT_TIMEOUT,
+        check_interval: int = WORKER_CHECK_INTERVAL,
+        max_attempts: int = MAX_JOB_ATTEMPTS,
+    ):
+        self.engine = engine
+        self.on_stalled = on_stalled
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.max_attempts = max_attempts
+        self.task: asyncio.Task | None = None
+
+    async def on_heartbeat(self, body: bytes):
+        try:
+            heartbeat = WorkerHeartbeat.model_validate_json(body)
+        except ValidationError as e:
+            logger.error(f"Invalid heartbeat: {e}")
+            return
+
+        def write():
+            with Session(self.engine) as session:
+                record_heartbeat(session, heartbeat)
+                session.commit()
+
+        try:
+            await asyncio.to_thread(write)
+        except Exception as e:
+            logger.exception(f"Failed to record heartbeat of {heartbeat.worker_id}: {e}")
+
+    async def check(self):
+        def requeue():
+            with Session(self.engine, expire_on_commit=False) as session:
+                return requeue_stalled_jobs(session, self.timeout, self.max_attempts)
+
+        stalled = await asyncio.to_thread(requeue)
+        if stalled.notifications:
+            await self.on_stalled(stalled)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.exception(f"Failed to check for stalled jobs: {e}")
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -1,41 +1,154 @@
+import asyncio
 import logging
 import json
+from collections import deque
 
 from fastapi import WebSocketDisconnect, WebSocket
 
+from common.models.driller_config import PROGRESS_STATUS
 from common.util import DateTimeEncoder
 
 logger = logging.getLogger(__name__)
 
 
+class Subscriber:
+    """A connected websocket with the notifications waiting to be sent to it.
+
+    Notifications are held already serialised. A sender task takes everything that has arrived within the
+    batching window and sends it as a single frame containing a JSON list.
+    """
+
+    def __init__(self, websocket: WebSocket, max_pending: int):
+        self.websocket = websocket
+        self.max_pending = max_pending
+        # Only notifications for these job ids / statuses are sent. `None` means all of them.
+        self.job_ids: set[int] | None = None
+        self.statuses: set[str] | None = None
+
+        # Each notification is held with the job id and kind (`job_status` or `job_progress`) it is about.
+        self.pending: deque[tuple[tuple[int | None, str], str]] = deque()
+        self.has_pending = asyncio.Event()
+        self.dropped = 0
+        self.task: asyncio.Task | None = None
+
+    def subscribe(self, job_ids: list[int] | None = None, statuses: list[str] | None = None):
+        self.job_ids = set(job_ids) if job_ids is not None else None
+        self.statuses = set(statuses) if statuses is not None else None
+
+    def wants(self, job_id: int | None, status: str | None) -> bool:
+        if self.job_ids is not None and job_id not in self.job_ids:
+            return False
+        if self.statuses is not None and status not in self.statuses:
+            return False
+        return True
+
+    def add(self, job_id: int | None, kind: str, message: str):
+        self.pending.append(((job_id, kind), message))
+        if len(self.pending) > self.max_pending:
+            self.coalesce()
+        self.has_pending.set()
+
+    def coalesce(self):
+        """Called when the client is lagging. Keeps only the latest notification of each kind for each job and
+        drops the oldest notifications if there are still too many. A progress update never replaces a status
+        change."""
+        latest: dict[tuple[int | None, str], str] = {}
+        for key, message in self.pending:
+            latest.pop(key, None)
+            latest[key] = message
+        coalesced = deque(latest.items())
+
+        while len(coalesced) > self.max_pending:
+            coalesced.popleft()
+        self.dropped += len(self.pending) - len(coalesced)
+        self.pending = coalesced
+
+    def take_frame(self) -> str:
+        frame = "[" + ",".join(message for _, message in self.pending) + "]"
+        self.pending.clear()
+        self.has_pending.clear()
+        return frame
+
+
 class ConnectionManager:
-    """Stores connected notification websockets so that on message queue responses a notification can be sent"""
+    """Stores connected notification websockets so that on message queue responses a notification can be sent.
+
+    Each notification is serialised once and then queued for every subscriber that wants it. Each subscriber
+    has its own sender task so a slow client doesn't hold up the others.
+    """
 
-    def __init__(self):
-        self.active_connections = []
+    def __init__(self, batch_window: float = 0.05, max_pending: int = 1000):
+        """
+        Args:
+            batch_window (float, optional): Seconds to wait for more notifications before sending a frame.
+            max_pending (int, optional): Notifications held for a client before they are coalesced.
+        """
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self.active_connections: dict[WebSocket, Subscriber] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        subscriber = Subscriber(websocket, self.max_pending)
+        subscriber.task = asyncio.create_task(self.send_frames(subscriber))
+        self.active_connections[websocket] = subscriber
         logger.info("WebSocket connected")
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections = [
-            ws for ws in self.active_connections if ws != websocket
-        ]
+        subscriber = self.active_connections.pop(websocket, None)
+        if subscriber is not None and subscriber.task is not None:
+            subscriber.task.cancel()
         logger.info("WebSocket disconnected")
 
+    def subscribe(self, websocket: WebSocket, message: dict):
+        """Sets the filters of a connection from a `{"subscribe": {"job_ids": [...], "statuses": [...]}}`
+        message sent by the client. Missing filters match everything."""
+        subscriber = self.active_connections.get(websocket)
+        if subscriber is None:
+            return
+        filters = message.get("subscribe") or {}
+        subscriber.subscribe(filters.get("job_ids"), filters.get("statuses"))
+
     async def send_message(self, data: dict):
-        logger.warning("WS Sending message")
-        logger.warning(self.active_connections)
-        for socket in self.active_connections:
-            msg = json.dumps(data, cls=DateTimeEncoder)
-            try:
-                await socket.send_text(msg)
-            except WebSocketDisconnect:
-                self.disconnect(socket)
-            except RuntimeError:
-                self.disconnect(socket)
+        self.broadcast([data])
+
+    def broadcast(self, notifications: list[dict]):
+        """Queues the notifications for every subscriber that wants them. Doesn't wait for them to be sent.
+
+        Args:
+            notifications (list[dict]): Notifications containing `job` and either `job_status` or `job_progress`.
+        """
+        if not self.active_connections:
+            return
+
+        for data in notifications:
+            if "job_progress" in data:
+                kind = "job_progress"
+                job_id = data["job_progress"].get("job_id")
+                status = PROGRESS_STATUS
+            else:
+                kind = "job_status"
+                job_status = data.get("job_status") or {}
+                job_id = job_status.get("job_id")
+                status = job_status.get("status")
+            message = None
+
+            for subscriber in self.active_connections.values():
+                if not subscriber.wants(job_id, status):
+                    continue
+                if message is None:
+                    message = json.dumps(data, cls=DateTimeEncoder)
+                subscriber.add(job_id, kind, message)
+
+    async def send_frames(self, subscriber: Subscriber):
+        try:
+            while True:
+                await subscriber.has_pending.wait()
+                # Let other notifications arrive so they are sent in the same frame.
+                await asyncio.sleep(self.batch_window)
+                await subscriber.websocket.send_text(subscriber.take_frame())
+        except (WebSocketDisconnect, RuntimeError):
+            self.disconnect(subscriber.websocket)
 
 
 # Global socket connection manager
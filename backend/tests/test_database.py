@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, select
+
+from common.models.jobs import Job, JobStatus
+from src.database import create_database_engine
+
+
+def test_sqlite_uses_wal(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'test.sqlite'}")
+
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+
+def test_sqlite_concurrent_writes(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'test.sqlite'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Job(name="a"))
+        session.commit()
+
+    def write_statuses(count):
+        for _ in range(count):
+            with Session(engine) as session:
+                session.add(JobStatus(job_id=1))
+                session.commit()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(write_statuses, [25] * 4))
+
+    with Session(engine) as session:
+        assert len(session.exec(select(JobStatus)).all()) == 100
+
+
+def test_foreign_keys_cascade(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'test.sqlite'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Job(name="a"))
+        session.commit()
+        session.add(JobStatus(job_id=1))
+        session.commit()
+
+        session.exec(text("DELETE FROM job"))
+        session.commit()
+
+        assert session.exec(select(JobStatus)).all() == []
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+from aio_pika.exceptions import AMQPConnectionError
+
+from common.models.driller_config import CANCEL_EXCHANGE
+from src.drill_queue_rpc import RabbitMessageQueueRPC
+
+
+class FakeBroker:
+    """In-process stand-in for RabbitMQ that records what is published and can be taken offline."""
+
+    def __init__(self):
+        self.online = True
+        self.published = []
+        self.unconfirmed = 0
+        self.most_unconfirmed = 0
+
+
+class FakeExchange:
+    def __init__(self, broker, name):
+        self.broker = broker
+        self.name = name
+
+    async def publish(self, message, routing_key, timeout=None):
+        if not self.broker.online:
+            raise AMQPConnectionError("Broker offline")
+        self.broker.unconfirmed += 1
+        self.broker.most_unconfirmed = max(self.broker.most_unconfirmed, self.broker.unconfirmed)
+        # Waits for the confirm.
+        await asyncio.sleep(0.01)
+        self.broker.unconfirmed -= 1
+        self.broker.published.append((self.name, routing_key, message.body.decode()))
+
+
+class FakeChannel:
+    is_closed = False
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.default_exchange = FakeExchange(broker, "")
+
+    async def get_exchange(self, name, ensure=True):
+        return FakeExchange(self.broker, name)
+
+    async def close(self):
+        self.is_closed = True
+
+
+class RecordingRPC(RabbitMessageQueueRPC):
+    async def process_response(self, response):
+        pass
+
+
+def create_client(broker):
+    client = RecordingRPC("user", "password", "host", 5672)
+    client.publish_channels = [FakeChannel(broker), FakeChannel(broker)]
+    return client
+
+
+def test_messages_spilled_while_broker_offline():
+    async def run():
+        broker = FakeBroker()
+        client = create_client(broker)
+
+        broker.online = False
+        await client.call("job-1")
+        await client.call("job-2")
+        assert len(client.spilled) == 2
+
+        broker.online = True
+        # Queued behind the spilled messages to keep the order.
+        await client.call("job-3")
+        assert broker.published == []
+
+        assert await client.drain_spilled() == 3
+        return broker, client
+
+    broker, client = asyncio.run(run())
+
+    assert [body for _, _, body in broker.published] == ["job-1", "job-2", "job-3"]
+    assert not client.spilled
+
+
+def test_drain_stops_when_broker_goes_offline():
+    async def run():
+        broker = FakeBroker()
+        client = create_client(broker)
+        broker.online = False
+        await client.call_many([(f"job-{i}", None, None) for i in range(3)])
+
+        assert await client.drain_spilled() == 0
+        return client
+
+    client = asyncio.run(run())
+
+    assert len(client.spilled) == 3
+
+
+def test_cancel_published_to_cancel_exchange():
+    async def run():
+        broker = FakeBroker()
+        await create_client(broker).cancel([1, 2])
+        return broker
+
+    broker = asyncio.run(run())
+
+    ((exchange, routing_key, body),) = broker.published
+    assert exchange == CANCEL_EXCHANGE
+    assert json.loads(body) == {"job_ids": [1, 2]}
+
+
+def test_call_many_publishes_without_waiting_for_confirms():
+    async def run():
+        broker = FakeBroker()
+        await create_client(broker).call_many(
+            [(f"job-{i}", None, None) for i in range(20)], chunk_size=10
+        )
+        return broker
+
+    broker = asyncio.run(run())
+
+    assert len(broker.published) == 20
+    # More publishes than channels wait for their confirms at once.
+    assert broker.most_unconfirmed == 10
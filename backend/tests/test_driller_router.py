@@ -0,0 +1,204 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+import src.main
+from common.models.jobs import Job, JobStatus, JobStatusEnum
+from src.database import get_session
+from src.main import app
+
+
+class FakeConnection:
+    is_closed = False
+
+
+class FakeDrillerClient:
+    """Records the jobs that would be published to RabbitMQ."""
+
+    def __init__(self):
+        self.connection = FakeConnection()
+        self.messages = []
+        self.cancelled = []
+
+    async def call(self, body, message_type=None, size_class=None):
+        self.messages.append((body, message_type, size_class))
+
+    async def call_many(self, messages):
+        self.messages += messages
+
+    async def cancel(self, job_ids):
+        self.cancelled += job_ids
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def driller_client(monkeypatch):
+    client = FakeDrillerClient()
+    monkeypatch.setattr(src.main, "driller_client", client)
+    return client
+
+
+@pytest.fixture
+def client(engine, driller_client):
+    def get_test_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_test_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def drill_config(count):
+    return {
+        "defaults": {},
+        "repositories": [{"name": f"repo-{i}"} for i in range(count)],
+    }
+
+
+def test_create_jobs(client, engine, driller_client):
+    response = client.post("/jobs/", json=drill_config(3))
+
+    assert response.status_code == 200
+    assert [job["name"] for job in response.json()] == ["repo-0", "repo-1", "repo-2"]
+
+    with Session(engine) as session:
+        jobs = session.exec(select(Job)).all()
+        statuses = session.exec(select(JobStatus)).all()
+    assert len(jobs) == 3
+    assert {s.job_id for s in statuses} == {job.id for job in jobs}
+    assert all(s.status == JobStatusEnum.PENDING for s in statuses)
+
+    assert len(driller_client.messages) == 3
+    job_ids = [json.loads(body)["job_id"] for body, _, _ in driller_client.messages]
+    assert job_ids == [job.id for job in jobs]
+
+
+def test_create_jobs_in_batches(client, driller_client):
+    response = client.post("/jobs/?batch_size=2", json=drill_config(5))
+
+    assert response.status_code == 200
+    batches = [json.loads(body)["jobs"] for body, _, _ in driller_client.messages]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert all(message_type == "batch_drill" for _, message_type, _ in driller_client.messages)
+
+
+def test_job_stats_count_jobs_created_in_bulk(client):
+    def counts():
+        return client.get("/jobs/stats").json()["counts"]
+
+    client.post("/jobs/", json=drill_config(3))
+    assert counts()["pending"] == 3
+
+    client.post("/jobs/status/", json={"job_id": 1, "status": "started", "message": ""})
+    assert (counts()["pending"], counts()["started"]) == (2, 1)
+
+    client.delete("/jobs/")
+    assert (counts()["pending"], counts()["started"]) == (0, 0)
+
+
+def test_list_jobs_filters_by_latest_status(client, engine):
+    client.post("/jobs/", json=drill_config(3))
+    client.post(
+        "/jobs/status/", json={"job_id": 2, "status": "complete", "message": ""}
+    )
+
+    response = client.get("/jobs/", params={"statuses": ["complete"]})
+
+    assert response.json()["total"] == 1
+    assert [job["id"] for job in response.json()["items"]] == [2]
+
+    response = client.get("/jobs/")
+
+    # Pending jobs are listed before complete jobs.
+    assert [job["id"] for job in response.json()["items"]] == [1, 3, 2]
+
+
+def test_list_jobs_with_cursor(client):
+    client.post("/jobs/", json=drill_config(5))
+    client.post(
+        "/jobs/status/", json={"job_id": 2, "status": "started", "message": ""}
+    )
+
+    ids = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor is not None:
+            params["cursor"] = cursor
+        page = client.get("/jobs/", params=params).json()
+        ids += [job["id"] for job in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # Started jobs are listed before pending jobs.
+    assert ids == [2, 1, 3, 4, 5]
+
+
+def test_list_jobs_invalid_cursor(client):
+    response = client.get("/jobs/", params={"cursor": "not a cursor"})
+
+    assert response.status_code == 400
+
+
+def test_export_jobs(client, monkeypatch):
+    monkeypatch.setattr("src.routers.driller_router.EXPORT_PAGE_SIZE", 2)
+    client.post("/jobs/", json=drill_config(5))
+
+    response = client.get("/jobs/export")
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    jobs = [json.loads(line) for line in response.text.splitlines()]
+    assert [job["id"] for job in jobs] == [1, 2, 3, 4, 5]
+    assert all(job["latest_status"] == "pending" for job in jobs)
+
+
+def test_delete_jobs_by_filter(client, engine):
+    client.post("/jobs/", json=drill_config(3))
+    client.post(
+        "/jobs/status/", json={"job_id": 2, "status": "complete", "message": ""}
+    )
+
+    response = client.delete("/jobs/", params={"statuses": ["complete"]})
+
+    assert response.json() == {"deleted": 1}
+    with Session(engine) as session:
+        assert [job.id for job in session.exec(select(Job))] == [1, 3]
+        assert {s.job_id for s in session.exec(select(JobStatus))} == {1, 3}
+
+    response = client.delete("/jobs/", params={"name": "repo-%"})
+
+    assert response.json() == {"deleted": 2}
+
+
+def test_cancel_job(client, engine, driller_client):
+    client.post("/jobs/", json=drill_config(2))
+    client.post(
+        "/jobs/status/", json={"job_id": 2, "status": "started", "message": ""}
+    )
+
+    assert client.post("/jobs/1/cancel").json() == {"job_ids": [1]}
+    assert client.post("/jobs/2/cancel").json() == {"job_ids": [2]}
+
+    # Pending jobs are cancelled straight away, started jobs once their worker stops them.
+    with Session(engine) as session:
+        assert session.get(Job, 1).latest_status == JobStatusEnum.CANCELLED
+        assert session.get(Job, 2).latest_status == JobStatusEnum.STARTED
+    assert driller_client.cancelled == [1, 2]
+
+    assert client.post("/jobs/1/cancel").status_code == 409
+    assert client.post("/jobs/3/cancel").status_code == 404
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from common.models.jobs import Job, JobStatus, JobStatusEnum
+from src.job_cleanup import delete_jobs, prune_job_statuses
+
+
+def create_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def add_job(session, name, timestamps, parent_id=None):
+    job = Job(name=name, parent_id=parent_id)
+    session.add(job)
+    session.flush()
+    for timestamp in timestamps:
+        job_status = JobStatus(
+            job_id=job.id, status=JobStatusEnum.STARTED, timestamp=timestamp
+        )
+        session.add(job_status)
+        job.apply_status(job_status)
+    return job
+
+
+def test_delete_jobs_includes_shards():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        parent = add_job(session, "a", [datetime(2024, 1, 1)])
+        add_job(session, "a (shard 1/1)", [datetime(2024, 1, 1)], parent_id=parent.id)
+        add_job(session, "b", [datetime(2024, 1, 1)])
+        session.commit()
+
+        deleted = delete_jobs(session, [Job.name == "a"])
+        session.commit()
+
+        assert deleted == 2
+        assert [job.name for job in session.exec(select(Job))] == ["b"]
+        assert len(session.exec(select(JobStatus)).all()) == 1
+
+
+def test_prune_keeps_latest_status():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        add_job(
+            session,
+            "a",
+            [datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 3)],
+        )
+        add_job(session, "b", [datetime(2024, 1, 1)])
+        session.commit()
+
+        deleted = prune_job_statuses(session, datetime(2025, 1, 1))
+
+        assert deleted == 2
+        remaining = session.exec(select(JobStatus.timestamp)).all()
+        assert sorted(remaining) == [datetime(2024, 1, 1), datetime(2024, 1, 3)]
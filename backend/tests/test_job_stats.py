@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from common.models.jobs import Job, JobStatus, JobStatusEnum
+from src.job_cleanup import delete_jobs
+from src.job_stats import get_job_stats, record_throughput
+
+
+def create_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_job_stats():
+    engine = create_test_engine()
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        for duration in range(1, 11):
+            job = Job(name=f"job-{duration}")
+            session.add(job)
+            session.flush()
+            statuses = [
+                JobStatus(job_id=job.id, status=JobStatusEnum.STARTED, timestamp=now),
+                JobStatus(
+                    job_id=job.id,
+                    status=JobStatusEnum.COMPLETE,
+                    timestamp=now + timedelta(seconds=duration),
+                ),
+            ]
+            for job_status in statuses:
+                session.add(job_status)
+                job.apply_status(job_status)
+            record_throughput(session, statuses)
+        pending = Job(name="pending")
+        session.add(pending)
+        session.flush()
+        pending.apply_status(JobStatus(job_id=pending.id))
+        session.commit()
+
+        stats = get_job_stats(session, window_minutes=5)
+
+    assert stats["counts"]["complete"] == 10
+    assert stats["counts"]["pending"] == 1
+    assert sum(minute["complete"] for minute in stats["throughput"]) == 10
+    assert stats["durations"] == {"count": 10, "p50": 6.0, "p95": 10.0}
+
+
+def test_status_counts_follow_jobs():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        jobs = [Job(name=f"job-{i}") for i in range(3)]
+        for job in jobs:
+            session.add(job)
+        session.flush()
+        for job in jobs:
+            job.apply_status(JobStatus(job_id=job.id))
+        session.commit()
+
+        jobs[0].apply_status(JobStatus(job_id=jobs[0].id, status=JobStatusEnum.STARTED))
+        session.add(jobs[0])
+        session.delete(jobs[1])
+        session.commit()
+        delete_jobs(session, [Job.id == jobs[2].id])
+        session.commit()
+
+        counts = get_job_stats(session, window_minutes=5)["counts"]
+
+    assert counts["started"] == 1
+    assert counts["pending"] == 0
@@ -0,0 +1,173 @@
+import asyncio
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from common.models.jobs import Job, JobProgress, JobStatus, JobStatusEnum
+from src.job_status_writer import JobStatusWriter, WrittenStatuses
+
+
+def create_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_responses_written_in_one_batch():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        session.add(Job(name="a"))
+        session.add(Job(name="b"))
+        session.commit()
+
+    batches: list[WrittenStatuses] = []
+
+    async def on_written(written):
+        batches.append(written)
+
+    async def run():
+        writer = JobStatusWriter(engine, on_written, flush_interval=0.05)
+        writer.start()
+        writer.add({"job_id": 1, "status": "started", "message": ""})
+        writer.add({"job_id": 2, "status": "started", "message": ""})
+        writer.add(
+            {"job_id": 1, "status": "complete", "message": "", "commit_count": 10}
+        )
+        await asyncio.sleep(0.2)
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert len(batches) == 1
+    assert len(batches[0].notifications) == 3
+    assert batches[0].notifications[2]["job"]["commit_count"] == 10
+
+    with Session(engine) as session:
+        statuses = session.exec(select(JobStatus)).all()
+        assert [s.status for s in statuses] == [
+            JobStatusEnum.STARTED,
+            JobStatusEnum.STARTED,
+            JobStatusEnum.COMPLETE,
+        ]
+
+
+def test_queued_responses_written_on_close():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        session.add(Job(name="a"))
+        session.commit()
+
+    batches: list[WrittenStatuses] = []
+
+    async def on_written(written):
+        batches.append(written)
+
+    async def run():
+        writer = JobStatusWriter(engine, on_written, flush_interval=10)
+        writer.add({"job_id": 1, "status": "failed", "message": "Boom"})
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert len(batches) == 1
+    with Session(engine) as session:
+        assert session.exec(select(JobStatus)).one().message == "Boom"
+
+
+def test_progress_upserted_without_status():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        session.add(Job(name="a"))
+        session.commit()
+
+    batches: list[WrittenStatuses] = []
+
+    async def on_written(written):
+        batches.append(written)
+
+    async def run():
+        writer = JobStatusWriter(engine, on_written, flush_interval=10)
+        for commits in (10, 20):
+            writer.add(
+                {
+                    "job_id": 1,
+                    "status": "progress",
+                    "message": "",
+                    "progress": {"commits": commits, "total": 100, "rate": 2.5},
+                }
+            )
+        await writer.close()
+        writer = JobStatusWriter(engine, on_written, flush_interval=10)
+        writer.add(
+            {"job_id": 1, "status": "progress", "message": "", "progress": {"commits": 30}}
+        )
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert [n["job_progress"]["commits"] for b in batches for n in b.notifications] == [20, 30]
+    with Session(engine) as session:
+        assert session.exec(select(JobStatus)).all() == []
+        progress = session.exec(select(JobProgress)).one()
+        assert progress.commits == 30
+        assert progress.total is None
+
+
+def test_failed_response_skipped_on_its_own():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        session.add(Job(name="a"))
+        session.add(Job(name="b"))
+        session.commit()
+
+    batches: list[WrittenStatuses] = []
+
+    async def on_written(written):
+        batches.append(written)
+
+    async def run():
+        writer = JobStatusWriter(engine, on_written, flush_interval=10)
+        writer.add({"job_id": 1, "status": "started", "message": ""})
+        # Shard configs that aren't valid drill configs fail the whole transaction.
+        writer.add({"job_id": 2, "status": "started", "message": "", "shards": [{}]})
+        writer.add({"job_id": 1, "status": "complete", "message": ""})
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert [b.completed_job_ids for b in batches] == [[], [1]]
+    with Session(engine) as session:
+        statuses = session.exec(select(JobStatus)).all()
+        assert [(s.job_id, s.status) for s in statuses] == [
+            (1, JobStatusEnum.STARTED),
+            (1, JobStatusEnum.COMPLETE),
+        ]
+
+
+def test_close_finishes_batch_being_written():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        session.add(Job(name="a"))
+        session.commit()
+
+    batches: list[WrittenStatuses] = []
+
+    async def on_written(written):
+        batches.append(written)
+
+    async def run():
+        writer = JobStatusWriter(engine, on_written, flush_interval=10)
+        writer.start()
+        writer.add({"job_id": 1, "status": "complete", "message": ""})
+        # The writer takes the response and waits for more to arrive.
+        await asyncio.sleep(0.05)
+        assert writer.queue.empty()
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert [b.completed_job_ids for b in batches] == [[1]]
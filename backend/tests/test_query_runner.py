@@ -0,0 +1,219 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import src.main
+import src.routers.queries
+from src.query_runner import (
+    CsvEncoder,
+    NdjsonEncoder,
+    QueryResult,
+    ResultCache,
+    get_graph_driver,
+    get_graph_version,
+    query_cache,
+)
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from src.main import app
+from src.routers.queries import read_saved_query
+
+
+class FakeResult:
+    def __init__(self, keys, rows):
+        self._keys = keys
+        self.rows = rows
+
+    async def keys(self):
+        return self._keys
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield FakeRecord(row)
+
+
+class FakeRecord:
+    def __init__(self, values):
+        self._values = values
+
+    def values(self):
+        return self._values
+
+
+class FakeTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def run(self, query, parameters):
+        self.driver.runs.append((query, parameters))
+        return FakeResult(self.driver.keys, self.driver.rows)
+
+    async def rollback(self):
+        self.driver.rollbacks += 1
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def begin_transaction(self):
+        return FakeTransaction(self.driver)
+
+
+class FakeDriver:
+    """Returns the same rows for every query and records the queries run."""
+
+    def __init__(self, keys, rows):
+        self.keys = keys
+        self.rows = rows
+        self.runs = []
+        self.rollbacks = 0
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+
+@pytest.fixture
+def driver(monkeypatch, tmp_path):
+    driver = FakeDriver(["name", "commits"], [["repo-a", 3], ["repo-b", {"x": 1}]])
+
+    async def get_graph_version(driver, session):
+        return "10:20:"
+
+    monkeypatch.setattr(src.routers.queries, "get_graph_version", get_graph_version)
+    monkeypatch.setattr(src.routers.queries, "QUERIES_PATH", str(tmp_path))
+    monkeypatch.setattr(src.main, "driller_client", object())
+    (tmp_path / "repos.cypher").write_text("MATCH (r:Repository) RETURN r.name AS name")
+
+    query_cache.clear()
+    app.dependency_overrides[get_graph_driver] = lambda: driver
+    yield driver
+    app.dependency_overrides.clear()
+    query_cache.clear()
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=10, max_result_bytes=6)
+    cache.put("a", QueryResult(["k"], size=4))
+    cache.put("b", QueryResult(["k"], size=4))
+    cache.get("a")
+    cache.put("c", QueryResult(["k"], size=4))
+    # Larger than a single result may be.
+    cache.put("d", QueryResult(["k"], size=7))
+
+    assert list(cache.results) == ["a", "c"]
+    assert cache.size == 8
+
+
+def test_encoders():
+    keys = ["name", "files"]
+    rows = [["a", ["x", "y"]], ["b,c", []]]
+
+    ndjson = NdjsonEncoder().encode(keys, rows).decode().splitlines()
+    csv_encoder = CsvEncoder()
+    csv = (csv_encoder.encode(keys, rows[:1]) + csv_encoder.encode(keys, rows[1:])).decode()
+
+    assert [json.loads(line) for line in ndjson] == [
+        {"name": "a", "files": ["x", "y"]},
+        {"name": "b,c", "files": []},
+    ]
+    assert csv.splitlines() == ["name,files", 'a,"[""x"", ""y""]"', '"b,c",[]']
+
+
+def test_arrow_encoder_keeps_schema_across_chunks():
+    pyarrow = pytest.importorskip("pyarrow")
+    from src.query_runner import ArrowEncoder
+
+    keys = ["id", "name"]
+    encoder = ArrowEncoder()
+    stream = (
+        encoder.encode(keys, [[1, None], [2, None]])
+        + encoder.encode(keys, [[3, "c"], [4, ["d"]]])
+        + encoder.finish()
+    )
+
+    assert pyarrow.ipc.open_stream(stream).read_all().to_pydict() == {
+        "id": [1, 2, 3, 4],
+        "name": [None, None, "c", '["d"]'],
+    }
+
+    encoder = ArrowEncoder()
+    encoder.encode(keys, [[1, "a"]])
+    with pytest.raises(ValueError):
+        encoder.encode(keys, [["2", "b"]])
+
+
+def test_run_query_cached(driver):
+    client = TestClient(app)
+
+    first = client.post("/queries/run/repos.cypher", json={"parameters": {"limit": 2}})
+    second = client.post("/queries/run/repos.cypher", json={"parameters": {"limit": 2}})
+    other = client.post("/queries/run/repos.cypher?format=csv", json={"parameters": {"limit": 1}})
+
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    assert [json.loads(line) for line in first.text.splitlines()] == [
+        {"name": "repo-a", "commits": 3},
+        {"name": "repo-b", "commits": {"x": 1}},
+    ]
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.text == first.text
+    assert other.headers["X-Cache"] == "MISS"
+    assert other.text.splitlines()[0] == "name,commits"
+    assert len(driver.runs) == 2
+    assert driver.rollbacks == 2
+
+
+def test_query_outside_queries_not_found(driver, tmp_path):
+    (tmp_path.parent / "secret.cypher").write_text("MATCH (n) DETACH DELETE n")
+
+    with pytest.raises(HTTPException) as e:
+        read_saved_query("../secret.cypher")
+
+    assert e.value.status_code == 404
+
+
+def test_run_query_with_invalid_parameters(driver, tmp_path):
+    (tmp_path / "repository.cypher").write_text(
+        "// @param repository: string\nMATCH (r:Repository {name: $repository}) RETURN r"
+    )
+
+    response = TestClient(app).post("/queries/run/repository.cypher", json={"parameters": {}})
+
+    assert response.status_code == 400
+    assert driver.runs == []
+
+
+def test_graph_version_changes_with_version_node():
+    class CountingDriver:
+        version = None
+
+        async def execute_query(self, query):
+            return [{"nodes": 10, "relationships": 20, "version": self.version}], None, None
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    driver = CountingDriver()
+
+    with Session(engine) as session:
+        before = asyncio.run(get_graph_version(driver, session))
+        # Bumped by a migration that only changed properties.
+        driver.version = 1
+        after = asyncio.run(get_graph_version(driver, session))
+
+    assert before != after
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from neo4j.exceptions import CypherSyntaxError
+
+from src.query_templates import PlanWarmer, TemplateError, parse_template, warm_up_plans
+
+TEMPLATE = """// @param repository: string
+// @param since: datetime = "2020-01-01T00:00:00"
+// @param authors: string[] = []
+MATCH (r:Repository {name: $repository}) RETURN r
+"""
+
+
+class PlanningDriver:
+    """Records the queries planned. Queries containing `INVALID` fail."""
+
+    def __init__(self):
+        self.planned = []
+
+    async def execute_query(self, query, parameters):
+        if "INVALID" in query:
+            raise CypherSyntaxError("Invalid input")
+        self.planned.append((query, parameters))
+        return [], None, []
+
+
+def test_parse_template():
+    template = parse_template(TEMPLATE)
+
+    assert template.query == "MATCH (r:Repository {name: $repository}) RETURN r"
+    assert list(template.parameters) == ["repository", "since", "authors"]
+    assert template.parameters["repository"].required
+    assert template.parameters["since"].default == datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def test_bind_converts_and_defaults():
+    template = parse_template(TEMPLATE)
+
+    assert template.bind({"repository": "repo-a", "authors": ["a@b.c"]}) == {
+        "repository": "repo-a",
+        "since": datetime(2020, 1, 1, tzinfo=timezone.utc),
+        "authors": ["a@b.c"],
+    }
+    # Dates are compared with the commit dates, which have a timezone.
+    assert template.bind({"repository": "repo-a", "since": "2024-02-03T04:05:06"})[
+        "since"
+    ] == datetime(2024, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "parameters",
+    [{}, {"repository": "repo-a", "other": 1}, {"repository": "repo-a", "since": "yesterday"}],
+)
+def test_bind_rejects_invalid_parameters(parameters):
+    with pytest.raises(TemplateError):
+        parse_template(TEMPLATE).bind(parameters)
+
+
+def test_queries_without_declarations_accept_any_parameters():
+    template = parse_template("MATCH (n) RETURN n LIMIT $limit")
+
+    assert template.bind({"limit": 5}) == {"limit": 5}
+
+
+def test_warm_up_plans(tmp_path):
+    (tmp_path / "examples").mkdir()
+    (tmp_path / "examples" / "repository.cypher").write_text(TEMPLATE)
+    (tmp_path / "broken.cypher").write_text("INVALID")
+    (tmp_path / "notes.txt").write_text("MATCH (n) RETURN n")
+    driver = PlanningDriver()
+
+    planned = asyncio.run(warm_up_plans(driver, str(tmp_path)))
+
+    assert planned == 1
+    ((query, parameters),) = driver.planned
+    assert query == "EXPLAIN MATCH (r:Repository {name: $repository}) RETURN r"
+    # Same types as the values the query is run with so that the cached plan is used.
+    assert parameters == {
+        "repository": "",
+        "since": datetime(2020, 1, 1, tzinfo=timezone.utc),
+        "authors": [],
+    }
+
+
+def test_warm_up_requests_combined(tmp_path):
+    (tmp_path / "all.cypher").write_text("MATCH (n) RETURN n")
+    driver = PlanningDriver()
+
+    async def run():
+        warmer = PlanWarmer(lambda: driver, str(tmp_path), delay=0.01)
+        for _ in range(3):
+            warmer.request()
+        await warmer.task
+
+    asyncio.run(run())
+
+    assert len(driver.planned) == 1
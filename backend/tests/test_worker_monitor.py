@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from common.models.jobs import Job, JobStatus, JobStatusEnum
+from common.models.workers import Worker, WorkerHeartbeat, WorkerState
+from src.worker_monitor import record_heartbeat, requeue_stalled_jobs
+
+
+def create_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def add_started_job(session, name):
+    job = Job(name=name, data={"repository": {"name": name}})
+    session.add(job)
+    session.flush()
+    job_status = JobStatus(job_id=job.id, status=JobStatusEnum.STARTED)
+    session.add(job_status)
+    job.apply_status(job_status)
+    return job
+
+
+def silence_worker(session, worker_id):
+    worker = session.get(Worker, worker_id)
+    worker.last_heartbeat = datetime.utcnow() - timedelta(minutes=10)
+    session.add(worker)
+    session.commit()
+
+
+def test_heartbeat_registers_worker_and_assigns_jobs():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        add_started_job(session, "a")
+        add_started_job(session, "b")
+        session.commit()
+
+        record_heartbeat(session, WorkerHeartbeat(worker_id="w1", job_ids=[1]))
+        record_heartbeat(session, WorkerHeartbeat(worker_id="w1", job_ids=[1]))
+        session.commit()
+
+        assert session.get(Worker, "w1").state == WorkerState.RUNNING
+        assert [job.worker_id for job in session.exec(select(Job))] == ["w1", None]
+
+
+def test_jobs_of_silent_worker_requeued_then_dead_lettered():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        add_started_job(session, "a")
+        session.commit()
+        record_heartbeat(session, WorkerHeartbeat(worker_id="w1", job_ids=[1]))
+        session.commit()
+
+        assert requeue_stalled_jobs(session, timeout=60, max_attempts=2).requeue == []
+
+        silence_worker(session, "w1")
+        stalled = requeue_stalled_jobs(session, timeout=60, max_attempts=2)
+
+        assert [config.job_id for config in stalled.requeue] == [1]
+        job = session.get(Job, 1)
+        assert job.latest_status == JobStatusEnum.PENDING
+        assert job.attempts == 2
+        assert job.worker_id is None
+        assert session.get(Worker, "w1").state == WorkerState.LOST
+
+        # Picked up by another worker which also goes silent.
+        record_heartbeat(session, WorkerHeartbeat(worker_id="w2", job_ids=[1]))
+        session.commit()
+        silence_worker(session, "w2")
+        stalled = requeue_stalled_jobs(session, timeout=60, max_attempts=2)
+
+        assert stalled.requeue == []
+        assert [config.job_id for config in stalled.dead_letter] == [1]
+        assert session.get(Job, 1).latest_status == JobStatusEnum.FAILED
+
+
+def test_stopped_worker_handled_once():
+    engine = create_test_engine()
+    with Session(engine) as session:
+        add_started_job(session, "a")
+        session.commit()
+        record_heartbeat(session, WorkerHeartbeat(worker_id="w1", job_ids=[1]))
+        record_heartbeat(
+            session, WorkerHeartbeat(worker_id="w1", state=WorkerState.STOPPED, job_ids=[1])
+        )
+        session.commit()
+
+        stalled = requeue_stalled_jobs(session, timeout=60, max_attempts=3)
+
+        assert [config.job_id for config in stalled.requeue] == [1]
+        assert session.get(Worker, "w1").jobs_requeued
+
+        # The job is left assigned to the worker to show it isn't scanned again.
+        job = session.get(Job, 1)
+        job.worker_id = "w1"
+        session.add(job)
+        session.commit()
+
+        assert requeue_stalled_jobs(session, timeout=60, max_attempts=3).requeue == []
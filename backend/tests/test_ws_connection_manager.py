@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from src.ws_connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.frames.append(json.loads(text))
+
+
+def notification(job_id, status):
+    return {"job_status": {"job_id": job_id, "status": status}, "job": {"id": job_id}}
+
+
+def test_notifications_batched_and_filtered():
+    async def run():
+        manager = ConnectionManager(batch_window=0.05)
+        everything = FakeWebSocket()
+        complete_only = FakeWebSocket()
+        await manager.connect(everything)
+        await manager.connect(complete_only)
+        manager.subscribe(complete_only, {"subscribe": {"statuses": ["complete"]}})
+
+        manager.broadcast([notification(1, "started"), notification(2, "started")])
+        manager.broadcast([notification(1, "complete")])
+        await asyncio.sleep(0.15)
+
+        manager.disconnect(everything)
+        manager.disconnect(complete_only)
+        return everything.frames, complete_only.frames
+
+    everything, complete_only = asyncio.run(run())
+
+    assert len(everything) == 1
+    assert [n["job_status"]["status"] for n in everything[0]] == [
+        "started",
+        "started",
+        "complete",
+    ]
+    assert complete_only == [[notification(1, "complete")]]
+
+
+def test_lagging_client_coalesced():
+    async def run():
+        manager = ConnectionManager(batch_window=0.05, max_pending=2)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+
+        manager.broadcast(
+            [
+                notification(1, "started"),
+                notification(2, "started"),
+                notification(1, "complete"),
+            ]
+        )
+        await asyncio.sleep(0.15)
+        manager.disconnect(websocket)
+        return websocket.frames
+
+    frames = asyncio.run(run())
+
+    assert frames == [[notification(2, "started"), notification(1, "complete")]]
+
+
+def test_progress_does_not_replace_status_when_coalesced():
+    def progress(job_id, commits):
+        return {"job_progress": {"job_id": job_id, "commits": commits}}
+
+    async def run():
+        manager = ConnectionManager(batch_window=0.05, max_pending=2)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+
+        manager.broadcast(
+            [
+                notification(1, "started"),
+                progress(1, 10),
+                progress(1, 20),
+            ]
+        )
+        await asyncio.sleep(0.15)
+        manager.disconnect(websocket)
+        return websocket.frames
+
+    frames = asyncio.run(run())
+
+    assert frames == [[notification(1, "started"), progress(1, 20)]]
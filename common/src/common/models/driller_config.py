@@ -7,7 +7,7 @@ from pydantic import (
     ConfigDict,
 )
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, time
 
 
 class PydrillerConfig(BaseModel):
@@ -39,10 +39,13 @@ class PydrillerConfig(BaseModel):
 
     @field_serializer("since", "to")
     def serialize_dt(self, dt: datetime, _info):
-        """Converts the datetime object to a string in the format of YYYY-MM-DD. Is applied to `since` and `to` variables."""
+        """Converts the datetime object to a string in the format of YYYY-MM-DD. Is applied to `since` and `to` variables.
+        Datetimes with a time or timezone, like the windows of shards, are kept in ISO format."""
         if dt is None:
             return None
-        return dt.strftime("%Y-%m-%d")
+        if dt.tzinfo is None and dt.time() == time():
+            return dt.strftime("%Y-%m-%d")
+        return dt.isoformat()
 
     def apply_defaults(self, defaults):
         for attr in vars(defaults):
@@ -75,6 +78,19 @@ class FiltersConfig(BaseModel):
             self.commit = defaults.commit
 
 
+class SizeClass(str, Enum):
+    """Size of a repository. Jobs are routed to a separate queue for each size class so that
+    workers can be dedicated to small or large repositories."""
+
+    small = "small"
+    medium = "medium"
+    large = "large"
+
+    def queue_name(self, base_queue: str) -> str:
+        """Name of the queue that jobs of this size class are sent to."""
+        return f"{base_queue}.{self.value}"
+
+
 class DefaultsConfig(BaseModel):
     delete_clone: bool = False
     index_file_modifications: bool = False
@@ -86,6 +102,8 @@ class DefaultsConfig(BaseModel):
 class RepositoryConfig(DefaultsConfig):
     name: str
     url: Optional[str] = None
+    # Overrides the size class estimated by the backend.
+    size_class: Optional[SizeClass] = None
 
     # Have to set to None because to make it optional
     delete_clone: Optional[bool] = None
@@ -126,6 +144,14 @@ class SingleDrillConfig(BaseModel):
     repository: RepositoryConfig
 
     job_id: Optional[int] = None
+    size_class: Optional[SizeClass] = None
+    # When greater than 1 the worker splits the job into this many shards instead of drilling it.
+    shards: Optional[int] = None
+    # When True the worker stitches together the shards of the repository instead of drilling it.
+    stitch: bool = False
+    # When False the drilled commits aren't added to the aggregates of the repository. Shards are
+    # aggregated together by the stitch job instead.
+    aggregate: bool = True
 
     def apply_defaults(self):
         """Applies the defaults to the repository config.
@@ -136,3 +162,24 @@ class SingleDrillConfig(BaseModel):
         if self.defaults is None:
             self.repository.apply_defaults(self.defaults)
         return self.repository
+
+
+# AMQP message `type` that marks a message body as a `BatchDrillConfig` instead of a `SingleDrillConfig`.
+BATCH_DRILL_MESSAGE_TYPE = "batch_drill"
+# Status of the responses that report the progress of a drill. Not stored as a `JobStatus`.
+PROGRESS_STATUS = "progress"
+
+# Fanout exchange that cancellations are published to. Every worker receives every cancellation.
+CANCEL_EXCHANGE = "drill_cancellations"
+
+
+class CancelMessage(BaseModel):
+    job_ids: list[int]
+
+
+class BatchDrillConfig(BaseModel):
+    """A group of drill jobs sent to a worker in a single message. The worker schedules the jobs
+    together so that per job setup (connecting to storage, cloning) can overlap with drilling.
+    """
+
+    jobs: list[SingleDrillConfig]
@@ -10,43 +10,130 @@ from sqlalchemy_utils import ChoiceType
 logger = logging.getLogger(__name__)
 
 
+class JobStatusEnum(str, Enum):
+    STARTED = "started"
+    PENDING = "pending"
+    COMPLETE = "complete"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    @property
+    def rank(self) -> int:
+        """Position of the status when listing jobs. Running jobs are listed first."""
+        return JOB_STATUS_RANKS[self]
+
+    @property
+    def is_finished(self) -> bool:
+        return self in (
+            JobStatusEnum.COMPLETE,
+            JobStatusEnum.FAILED,
+            JobStatusEnum.CANCELLED,
+        )
+
+    @classmethod
+    def from_string(cls, status_str):
+        try:
+            return cls(status_str)
+        except ValueError:
+            raise ValueError(f"'{status_str}' is not a valid {cls.__name__}")
+
+
+JOB_STATUS_RANKS = {
+    JobStatusEnum.STARTED: 1,
+    JobStatusEnum.PENDING: 2,
+    JobStatusEnum.FAILED: 3,
+    JobStatusEnum.COMPLETE: 4,
+    JobStatusEnum.CANCELLED: 4,
+}
+# Rank of jobs without a status.
+NO_STATUS_RANK = 5
+
+
 class JobBase(SQLModel):
-    name: str
+    name: str = Field(index=True)
     data: dict = Field(sa_column=sa.Column(sa.JSON), default={})
 
 
 class Job(JobBase, table=True):
+    __table_args__ = (
+        # Used for keyset pagination of the job list.
+        sa.Index("ix_job_latest_status_rank_id", "latest_status_rank", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    job_statuses: list["JobStatus"] = Relationship(back_populates="job")
+    # Copy of the most recent JobStatus so that jobs can be listed and filtered without joining the statuses.
+    # Must be kept up to date with `apply_status` whenever a status is added.
+    latest_status: JobStatusEnum | None = Field(
+        sa_column=sa.Column(ChoiceType(JobStatusEnum), nullable=True, index=True),
+        default=None,
+    )
+    latest_timestamp: datetime | None = Field(default=None)
+    # `rank` of the latest status. Jobs are listed in order of (latest_status_rank, id).
+    latest_status_rank: int = Field(default=NO_STATUS_RANK)
+    # Time of the first started status and of the complete/failed status. Used for the job statistics.
+    started_at: datetime | None = Field(default=None)
+    finished_at: datetime | None = Field(default=None, index=True)
+    # Seconds between `started_at` and `finished_at`.
+    duration: float | None = Field(default=None)
+    # Worker that is drilling the job. Used to requeue the job if the worker stops sending heartbeats.
+    worker_id: str | None = Field(default=None, index=True)
+    # Number of times the job has been sent to the workers.
+    attempts: int = Field(default=1)
+    # Number of commits traversed by the last completed drill. Used to estimate repository size.
+    commit_count: int | None = Field(default=None)
+    # Set on the jobs that drill a shard of a repository. Points to the job for the whole repository.
+    parent_id: int | None = Field(
+        default=None,
+        sa_column=sa.Column(
+            sa.Integer, sa.ForeignKey("job.id", ondelete="CASCADE"), index=True
+        ),
+    )
+    # Statuses are removed by the database when a job is deleted, without loading them.
+    job_statuses: list["JobStatus"] = Relationship(
+        back_populates="job", sa_relationship_kwargs={"passive_deletes": True}
+    )
+    progress: Optional["JobProgress"] = Relationship(
+        sa_relationship_kwargs={"uselist": False, "passive_deletes": True}
+    )
+
+    def apply_status(self, job_status: "JobStatusBase"):
+        """Updates the latest status of the job if `job_status` is the most recent status."""
+        if self.latest_timestamp is None or job_status.timestamp >= self.latest_timestamp:
+            self.latest_status = job_status.status
+            self.latest_timestamp = job_status.timestamp
+            self.latest_status_rank = JobStatusEnum(job_status.status).rank
+
+        status = JobStatusEnum(job_status.status)
+        if status == JobStatusEnum.STARTED and self.started_at is None:
+            self.started_at = job_status.timestamp
+        elif status.is_finished:
+            self.finished_at = job_status.timestamp
+            if self.started_at is not None:
+                self.duration = (self.finished_at - self.started_at).total_seconds()
+
+
+class JobExport(JobBase):
+    id: int
+    parent_id: int | None = None
+    latest_status: JobStatusEnum | None = None
+    latest_timestamp: datetime | None = None
 
 
 class JobList(JobBase):
     id: int
+    parent_id: int | None = None
     statuses: list["JobStatusOverview"]
 
 
 class JobDetails(JobList):
     job_statuses: list["JobStatusDetails"] = []
+    progress: Optional["JobProgressBase"] = None
 
 
 class JobCreate(JobBase):
     pass
 
 
-class JobStatusEnum(str, Enum):
-    STARTED = "started"
-    PENDING = "pending"
-    COMPLETE = "complete"
-    FAILED = "failed"
-
-    @classmethod
-    def from_string(cls, status_str):
-        try:
-            return cls(status_str)
-        except ValueError:
-            raise ValueError(f"'{status_str}' is not a valid {cls.__name__}")
-
-
 class JobStatusBase(SQLModel):
     # status: Enum[JobStatusEnum]  = Field(sa_column=Column(Enum(JobStatusEnum)))
     status: JobStatusEnum = Field(
@@ -54,15 +141,66 @@ class JobStatusBase(SQLModel):
         default=JobStatusEnum.PENDING,
     )
     timestamp: datetime = Field(default_factory=datetime.utcnow)
-    job_id: int | None = Field(default=None, foreign_key="job.id")
+    job_id: int | None = Field(
+        default=None,
+        sa_column=sa.Column(sa.Integer, sa.ForeignKey("job.id", ondelete="CASCADE")),
+    )
     message : str = Field(default="")
 
 
 class JobStatus(JobStatusBase, table=True):
+    __table_args__ = (
+        # Used to find the latest statuses of a job.
+        sa.Index("ix_jobstatus_job_id_timestamp", "job_id", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     job: Job | None = Relationship(back_populates="job_statuses")
 
 
+class JobProgressBase(SQLModel):
+    # Commits traversed so far and the estimated total.
+    commits: int = Field(default=0)
+    total: int | None = Field(default=None)
+    # Commits traversed per second.
+    rate: float | None = Field(default=None)
+    # Seconds the worker's storage took to write its last batch.
+    flush_seconds: float | None = Field(default=None)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class JobProgress(JobProgressBase, table=True):
+    """Latest progress reported by the worker drilling a job. There is a single row per job which is
+    overwritten by each report, unlike `JobStatus`."""
+
+    job_id: int = Field(
+        sa_column=sa.Column(
+            sa.Integer, sa.ForeignKey("job.id", ondelete="CASCADE"), primary_key=True
+        ),
+    )
+
+
+class JobThroughput(SQLModel, table=True):
+    """Number of jobs that finished with `status` in each minute. Incremented as statuses are written so
+    throughput can be read without scanning the statuses."""
+
+    minute: datetime = Field(primary_key=True)
+    status: JobStatusEnum = Field(
+        sa_column=sa.Column(ChoiceType(JobStatusEnum), primary_key=True),
+    )
+    count: int = Field(default=0)
+
+
+class JobStatusCount(SQLModel, table=True):
+    """Number of jobs whose latest status is `status`. Kept up to date as jobs are added, change status or
+    are deleted so the counts can be read without scanning the jobs."""
+
+    status: JobStatusEnum = Field(
+        sa_column=sa.Column(ChoiceType(JobStatusEnum), primary_key=True),
+    )
+    count: int = Field(default=0)
+
+
 class JobStatusOverview(JobStatusBase):
     pass
 
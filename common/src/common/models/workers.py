@@ -0,0 +1,39 @@
+from datetime import datetime
+from enum import Enum
+
+import sqlalchemy as sa
+from pydantic import BaseModel
+from sqlmodel import Field, SQLModel
+
+# Queue that the workers publish their heartbeats to and the backend consumes.
+HEARTBEAT_QUEUE = "worker_heartbeats"
+
+
+class WorkerState(str, Enum):
+    RUNNING = "running"
+    STOPPED = "stopped"
+    # Set by the backend when the worker stops sending heartbeats without stopping.
+    LOST = "lost"
+
+
+class WorkerHeartbeat(BaseModel):
+    """Message a worker sends every heartbeat interval. The first heartbeat registers the worker."""
+
+    worker_id: str
+    state: WorkerState = WorkerState.RUNNING
+    # Queues the worker consumes jobs from.
+    queues: list[str] = []
+    # Jobs the worker is currently responsible for, including the waiting jobs of a batch.
+    job_ids: list[int] = []
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Worker(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    state: WorkerState = Field(default=WorkerState.RUNNING)
+    queues: list[str] = Field(sa_column=sa.Column(sa.JSON), default=[])
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    # Time the backend received the last heartbeat. The backend's clock is used so workers can't skew it.
+    last_heartbeat: datetime = Field(default_factory=datetime.utcnow, index=True)
+    # Set once the backend has requeued the jobs the worker left behind, so a stopped worker is only handled once.
+    jobs_requeued: bool = Field(default=False)
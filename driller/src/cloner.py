@@ -50,3 +50,24 @@ def remove_repository_clone(repository_location):
     except Exception as e:
         logger.exception(e)
         raise e
+
+
+def estimate_repository_size(repository_location):
+    """Estimates the size of a cloned repository from the size of its git object store.
+
+    Args:
+        repository_location (str): location of the repository clone.
+
+    Returns:
+        int: Size in bytes of the files in `.git/objects`. 0 if the repository hasn't been cloned.
+    """
+    objects_path = os.path.join(repository_location, ".git", "objects")
+    size = 0
+    for root, _, files in os.walk(objects_path):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                # File removed by a concurrent `git gc`, ignore it.
+                continue
+    return size
@@ -1,4 +1,6 @@
 import logging
+from typing import Callable
+
 from pydriller import Repository, Commit
 
 from common.models.driller_config import (
@@ -7,11 +9,16 @@ from common.models.driller_config import (
     FiltersConfig,
 )
 from pydriller.domain.commit import ModifiedFile
+from src.drillers.progress import DrillProgress
 from src.drillers.pydriller_repository_storage import RepositoryDataStorage
 
 logger = logging.getLogger(__name__)
 
 
+class DrillCancelled(Exception):
+    """Raised when a drill is stopped because its job was cancelled."""
+
+
 class RepositoryDriller:
     """Drills a repository with PyDriller and inserts the data into the given repository storage.
     Uses dependency injection to separate storage of repository data from the storage of the data.
@@ -64,16 +71,31 @@ class RepositoryDriller:
         self,
         filters: FiltersConfig | None = None,
         pydriller_filters: PydrillerConfig | None = None,
+        progress: DrillProgress | None = None,
+        should_stop: Callable[[], bool] | None = None,
     ):
         """Drills all the commits based on the filters and pydriller configs.
         Inserts all the data into the storage.
         Args:
             filters (dict, optional): Filters to apply to the commits. Defaults to {}.
             pydriller_filters (dict, optional): Pydriller configurations. Defaults to {}.
-            index_file_modifications (bool, optional): Whether to index file modifications. Defaults to True.
+            progress (DrillProgress, optional): Updated with the number of commits traversed after each commit.
+            should_stop (Callable, optional): Checked before each commit. The drill stops when it returns True.
+
+        Returns:
+            int: Number of commits traversed, including those removed by the filters.
+
+        Raises:
+            DrillCancelled: If `should_stop` returned True.
         """
         counter = 0
+        commit_count = 0
         for commit in self.get_commits(pydriller_filters):
+            if should_stop is not None and should_stop():
+                raise DrillCancelled(
+                    f"Drill of {self.repository_name} stopped after {commit_count} commits."
+                )
+            commit_count += 1
             if self.commit_filter(commit, filters):
                 self._handle_branches(list(commit.branches))
                 self._handle_committer(commit.author)
@@ -84,6 +106,9 @@ class RepositoryDriller:
                     self._handle_modified_files(commit, commit.modified_files)
             if counter % 100 == 0 and counter > 0:
                 logger.info(f"Processed {counter} commits")
+            if progress is not None:
+                progress.update(commit_count)
+        return commit_count
 
     def commit_filter(
         self, commit, filter_configs: FiltersConfig | None = None
@@ -4,12 +4,19 @@ import logging
 from pydriller import Commit
 from pydriller.domain.commit import Developer, ModifiedFile
 
+from src.drillers.neo4j_schema import Neo4jSchemaManager
 from src.drillers.neo4j_storage import Neo4jStorage
 from src.drillers.pydriller_repository_storage import RepositoryDataStorage
+from src.settings.default import NEO4J_SCHEMA_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
 
+def hash_file(path: str, repository_name: str) -> str:
+    """Identifies a file by its path and the repository it's in."""
+    return hashlib.sha224(f"{path}:{repository_name}".encode("utf-8")).hexdigest()
+
+
 class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
     """
     Neo4j storage implemetation that stores data for a PyDriller repository.
@@ -28,20 +35,9 @@ class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
         self._create_indexes_and_constraints()
 
     def _create_indexes_and_constraints(self):
-        """Creates the uniqueness constraints for the repository database."""
-        with self.driver.session() as session:
-            session.run(
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (r:Repository) REQUIRE r.name IS UNIQUE"
-            )
-            # session.run(
-            #     "CREATE CONSTRAINT IF NOT EXISTS FOR (b:Branch) REQUIRE b.hash IS UNIQUE"
-            # )
-            session.run(
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (d:Developer) REQUIRE d.email IS UNIQUE"
-            )
-            session.run(
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (c:Commit) REQUIRE c.hash IS UNIQUE"
-            )
+        """Checks that the constraints and indexes of the repository schema are online before drilling,
+        creating any that are missing."""
+        Neo4jSchemaManager(self.driver).ensure(timeout=NEO4J_SCHEMA_TIMEOUT)
 
     def store_repository(self, repo_name):
         """Creates a `Repository` node
@@ -51,6 +47,27 @@ class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
         """
         self._add_to_batch("MERGE (r:Repository {name: $name})", {"name": repo_name})
 
+    def get_fingerprint(self, repo_name):
+        """Reads the fingerprint from the `Repository` node."""
+        with self.driver.session() as session:
+            record = session.run(
+                "MATCH (r:Repository {name: $name}) "
+                "RETURN r.fingerprint AS fingerprint, r.fingerprint_commit_count AS commit_count",
+                {"name": repo_name},
+            ).single()
+        if record is None or record["fingerprint"] is None:
+            return None
+        return record["fingerprint"], record["commit_count"]
+
+    def store_fingerprint(self, repo_name, fingerprint, commit_count):
+        """Sets the fingerprint on the `Repository` node. Added to the batch so it's only written together
+        with the last of the drilled data."""
+        self._add_to_batch(
+            "MERGE (r:Repository {name: $name}) "
+            "SET r.fingerprint = $fingerprint, r.fingerprint_commit_count = $commit_count",
+            {"name": repo_name, "fingerprint": fingerprint, "commit_count": commit_count},
+        )
+
     def hash_branch(self, branch_name, repository_name):
         """Hashes the branch name and repository name together to produce a unique identifier for the branch."""
 
@@ -96,7 +113,8 @@ class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
             "MATCH (d:Developer {email: $email}) "
             "MERGE (c:Commit {hash: $hash}) "
             "MERGE (c)-[:AUTHOR]->(d) "
-            "SET c.message = $message, c.author = $author, c.date = $date,"
+            "SET c.message = $message, c.author = $author, c.date = $date, c.committer_date = $committer_date, "
+            "c.parents = $parents, "
             "c.dmm_unit_size = $dmm_unit_size, c.dmm_unit_complexity = $dmm_unit_complexity, "
             "c.dmm_unit_interfacing = $dmm_unit_interfacing, c.is_merge = $merge",
             {
@@ -104,11 +122,14 @@ class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
                 "email": commit.author.email,
                 "message": commit.msg,
                 "author": commit.author.name,
-                "date": commit.author_date.strftime("%Y-%m-%d %H:%M:%S"),
+                # Written as `datetime` values with the offset of the author and committer.
+                "date": commit.author_date,
+                "committer_date": commit.committer_date,
                 "dmm_unit_size": commit.dmm_unit_size,
                 "dmm_unit_complexity": commit.dmm_unit_complexity,
                 "dmm_unit_interfacing": commit.dmm_unit_interfacing,
                 "merge": commit.merge,
+                "parents": commit.parents,
             },
         )
 
@@ -140,23 +161,28 @@ class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
         self, commit: Commit, file: ModifiedFile, repository_name: str, index_diff=False
     ):
         """Stores a file modification and links it to the commit.
-        If the file change is a RENAME, creates a `RENAMED_TO` relation from the old file node.
+        Files are identified by their path in the repository, so files with the same name in different
+        directories are different `File` nodes.
+        If the file change is a RENAME, creates a `RENAMED_TO` relation from the file at the old path.
 
         Args:
             commit: Pydriller Commit which the file was modified in.
             file: PyDriller ModifiedFile instance to store.
-            repository_name: Used in filename hash.
+            repository_name: Used in file hash.
             index_diff: Whether to index the file git diff. Increases drilling time.
         """
 
         logger.debug(f"Storing file {file.filename} in commit {commit.hash}")
 
+        # Deleted files only have an old path.
+        path = file.new_path or file.old_path
+
         # Creates or Updates a FIle instance and links it to the commit with a `MODIFIED` relationship
         # Relationship holds all the modification information
         query_str = """MATCH (c:Commit {hash: $commit_hash}) 
             MERGE (f:File {hash: $file_hash})
             MERGE (c)-[r:MODIFIED]->(f)
-            SET f.name = $filename,
+            SET f.name = $filename, f.path = $path, f.repository = $repository_name,
             r.old_path = $old_path, r.new_path = $new_path,
             r.filename = $filename, r.change_type = $change_type,
             r.added_lines = $added_lines, r.deleted_lines = $deleted_lines,
@@ -164,10 +190,9 @@ class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
 
         values = {
             "commit_hash": commit.hash,
-            "file_hash": hashlib.sha224(
-                str(f"{file.filename}:{repository_name}").encode("utf-8")
-            ).hexdigest(),
-            "filename": file.filename,
+            "file_hash": hash_file(path, repository_name),
+            "path": path,
+            "repository_name": repository_name,
             "old_path": file.old_path,
             "new_path": file.new_path,
             "filename": file.filename,
@@ -191,16 +216,98 @@ class RepositoryNeo4jStorage(Neo4jStorage, RepositoryDataStorage):
 
         # If the file change is a RENAME, create a `RENAMED_TO` relation from the old file node.
         if file.change_type.name == "RENAME":
-            old_name = file.old_path.split("/")[-1]
-            old_file_hash = hashlib.sha224(
-                str(f"{old_name}:{repository_name}").encode("utf-8")
-            ).hexdigest()
-            new_file_hash = hashlib.sha224(
-                str(f"{file.filename}:{repository_name}").encode("utf-8")
-            ).hexdigest()
             self._add_to_batch(
-                "MATCH  (old:File {hash : $old_hash})"
-                "MATCH (new:File {hash: $new_hash})"
+                "MERGE (old:File {hash: $old_hash}) "
+                "ON CREATE SET old.name = $old_name, old.path = $old_path, old.repository = $repository_name "
+                "WITH old "
+                "MATCH (new:File {hash: $new_hash}) "
                 "MERGE (old)-[:RENAMED_TO]->(new)",
-                {"old_hash": old_file_hash, "new_hash": new_file_hash},
+                {
+                    "old_hash": hash_file(file.old_path, repository_name),
+                    "old_name": file.old_path.split("/")[-1],
+                    "old_path": file.old_path,
+                    "new_hash": hash_file(path, repository_name),
+                    "repository_name": repository_name,
+                },
+            )
+
+    def stitch_repository(self, repo_name):
+        """Creates the `PARENT` relationships between commits that were drilled in different shards.
+        When a repository is drilled in shards, a commit's parent may not exist yet when the commit is stored,
+        so the relationship is recreated from the parent hashes stored on each commit.
+
+        Args:
+            repo_name: Name of the repository to stitch.
+        """
+        self.flush()
+        with self.driver.session() as session:
+            session.run(
+                "MATCH (:Repository {name: $repo_name})<-[:PART_OF]-(:Branch)<-[:IN_BRANCH]-(c:Commit) "
+                "WITH DISTINCT c "
+                "CALL { "
+                "  WITH c "
+                "  UNWIND c.parents AS parent_hash "
+                "  MATCH (p:Commit {hash: parent_hash}) "
+                "  MERGE (c)-[:PARENT]->(p) "
+                "} IN TRANSACTIONS OF 1000 ROWS",
+                {"repo_name": repo_name},
             )
+
+    def aggregate_repository(self, repo_name):
+        """Adds the commits of the repository that haven't been aggregated yet to its aggregates:
+        - An `Activity` node for each developer and month with the number of commits and lines changed,
+          linked to the repository with `IN_REPOSITORY`.
+        - The number of commits and lines changed on each `File`, and its churn.
+        - A `CONTRIBUTED_TO` relationship from each developer to the repository with their totals and the
+          dates of their first and last commits.
+        - The totals of the repository.
+
+        The name of the repository is added to `aggregated_for` of each commit in the same transaction as its
+        aggregates, so each drill only adds the new commits and commits shared by forks count for each.
+
+        Args:
+            repo_name: Name of the repository to aggregate.
+        """
+        self.flush()
+        with self.driver.session() as session:
+            session.run(
+                "MATCH (:Repository {name: $repo_name})<-[:PART_OF]-(:Branch)<-[:IN_BRANCH]-(c:Commit) "
+                "WITH DISTINCT c "
+                "WHERE NOT $repo_name IN coalesce(c.aggregated_for, []) "
+                "CALL { "
+                "  WITH c "
+                "  MATCH (r:Repository {name: $repo_name}) "
+                "  MATCH (c)-[:AUTHOR]->(d:Developer) "
+                "  OPTIONAL MATCH (c)-[m:MODIFIED]->(f:File) "
+                "  WITH c, r, d, collect(CASE WHEN f IS NOT NULL THEN "
+                "    {file: f, added: coalesce(m.added_lines, 0), deleted: coalesce(m.deleted_lines, 0)} "
+                "  END) AS changes "
+                "  WITH c, r, d, changes, "
+                "    reduce(total = 0, change IN changes | total + change.added) AS added, "
+                "    reduce(total = 0, change IN changes | total + change.deleted) AS deleted "
+                "  MERGE (a:Activity {repository: $repo_name, email: d.email, month: left(toString(c.date), 7)}) "
+                "  ON CREATE SET a.commits = 0, a.added_lines = 0, a.deleted_lines = 0 "
+                "  SET a.commits = a.commits + 1, a.added_lines = a.added_lines + added, "
+                "    a.deleted_lines = a.deleted_lines + deleted "
+                "  MERGE (a)-[:IN_REPOSITORY]->(r) "
+                "  MERGE (d)-[t:CONTRIBUTED_TO]->(r) "
+                "  ON CREATE SET t.commits = 0, t.added_lines = 0, t.deleted_lines = 0, "
+                "    t.first_commit = c.date, t.last_commit = c.date "
+                "  SET t.commits = t.commits + 1, t.added_lines = t.added_lines + added, "
+                "    t.deleted_lines = t.deleted_lines + deleted, "
+                "    t.first_commit = CASE WHEN c.date < t.first_commit THEN c.date ELSE t.first_commit END, "
+                "    t.last_commit = CASE WHEN c.date > t.last_commit THEN c.date ELSE t.last_commit END "
+                "  SET r.total_commits = coalesce(r.total_commits, 0) + 1, "
+                "    r.total_added_lines = coalesce(r.total_added_lines, 0) + added, "
+                "    r.total_deleted_lines = coalesce(r.total_deleted_lines, 0) + deleted "
+                "  SET c.aggregated_for = coalesce(c.aggregated_for, []) + $repo_name "
+                "  WITH changes "
+                "  UNWIND changes AS change "
+                "  WITH change.file AS f, change "
+                "  SET f.commits = coalesce(f.commits, 0) + 1, "
+                "    f.added_lines = coalesce(f.added_lines, 0) + change.added, "
+                "    f.deleted_lines = coalesce(f.deleted_lines, 0) + change.deleted, "
+                "    f.churn = coalesce(f.churn, 0) + change.added + change.deleted "
+                "} IN TRANSACTIONS OF 1000 ROWS",
+                {"repo_name": repo_name},
+            ).consume()
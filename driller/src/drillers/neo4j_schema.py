@@ -0,0 +1,201 @@
+import argparse
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+
+from neo4j import Driver, GraphDatabase
+from neo4j.exceptions import ClientError
+
+from src.settings.default import NEO4J_HOST, NEO4J_PASSWORD, NEO4J_PORT, NEO4J_USER
+
+logger = logging.getLogger(__name__)
+
+""" Declares the constraints and indexes of the repository graph and keeps the database in line with them.
+
+Every property that drilling `MATCH`es or `MERGE`s nodes on needs an index, otherwise each write scans all
+nodes of the label and gets slower as the graph grows. Properties that are commonly filtered on by queries
+are indexed as well.
+
+**Reporting the state of the schema:**
+
+```
+docker compose run driller-worker poetry run python3 -m src.drillers.neo4j_schema --apply
+```
+"""
+
+
+class IndexKind(str, Enum):
+    UNIQUE = "unique"
+    RANGE = "range"
+    TEXT = "text"
+
+
+@dataclass(frozen=True)
+class SchemaItem:
+    """A uniqueness constraint or index on a single node property."""
+
+    name: str
+    label: str
+    property: str
+    kind: IndexKind
+
+    @property
+    def create_statement(self) -> str:
+        if self.kind == IndexKind.UNIQUE:
+            return (
+                f"CREATE CONSTRAINT {self.name} IF NOT EXISTS "
+                f"FOR (n:{self.label}) REQUIRE n.{self.property} IS UNIQUE"
+            )
+        return (
+            f"CREATE {self.kind.value.upper()} INDEX {self.name} IF NOT EXISTS "
+            f"FOR (n:{self.label}) ON (n.{self.property})"
+        )
+
+    def matches(self, index: dict) -> bool:
+        """Whether a row of `SHOW INDEXES` is the index of this item. Indexes created by hand or before the
+        items were named match as long as they index the same property the same way."""
+        if index["entityType"] != "NODE":
+            return False
+        if index["labelsOrTypes"] != [self.label] or index["properties"] != [self.property]:
+            return False
+        if self.kind == IndexKind.TEXT:
+            return index["type"] == "TEXT"
+        if self.kind == IndexKind.UNIQUE and index["owningConstraint"] is None:
+            return False
+        return index["type"] == "RANGE"
+
+
+REPOSITORY_SCHEMA = [
+    SchemaItem("repository_name", "Repository", "name", IndexKind.UNIQUE),
+    SchemaItem("developer_email", "Developer", "email", IndexKind.UNIQUE),
+    SchemaItem("commit_hash", "Commit", "hash", IndexKind.UNIQUE),
+    SchemaItem("file_hash", "File", "hash", IndexKind.UNIQUE),
+    # Not unique: the shards of a repository merge their branches together with the `PART_OF` relationship
+    # concurrently, and the MERGE of the pattern would fail on a constraint instead of matching.
+    SchemaItem("branch_hash", "Branch", "hash", IndexKind.RANGE),
+    # Commit dates are `datetime` values, so time windows are range scans of these indexes.
+    SchemaItem("commit_date", "Commit", "date", IndexKind.RANGE),
+    SchemaItem("commit_committer_date", "Commit", "committer_date", IndexKind.RANGE),
+    # Supports `CONTAINS` and `ENDS WITH`, e.g. to find files by extension.
+    SchemaItem("file_name", "File", "name", IndexKind.TEXT),
+    # Finds the files of a directory and the ends of rename chains by path.
+    SchemaItem("file_path", "File", "path", IndexKind.RANGE),
+    SchemaItem("activity_repository", "Activity", "repository", IndexKind.RANGE),
+]
+
+
+@dataclass
+class SchemaStatus:
+    online: list[SchemaItem] = field(default_factory=list)
+    populating: list[SchemaItem] = field(default_factory=list)
+    failed: list[SchemaItem] = field(default_factory=list)
+    missing: list[SchemaItem] = field(default_factory=list)
+
+    @property
+    def ready(self) -> bool:
+        return not (self.populating or self.failed or self.missing)
+
+
+class Neo4jSchemaManager:
+    """Creates the constraints and indexes of a schema and checks that they are online."""
+
+    def __init__(self, driver: Driver, schema: list[SchemaItem] = REPOSITORY_SCHEMA):
+        self.driver = driver
+        self.schema = schema
+
+    def get_indexes(self) -> list[dict]:
+        with self.driver.session() as session:
+            return session.run(
+                "SHOW INDEXES YIELD name, state, type, entityType, labelsOrTypes, properties, owningConstraint"
+            ).data()
+
+    def status(self) -> SchemaStatus:
+        """Finds the index of each item and groups the items by the state of their index."""
+        indexes = self.get_indexes()
+        status = SchemaStatus()
+        for item in self.schema:
+            states = [index["state"] for index in indexes if item.matches(index)]
+            if "ONLINE" in states:
+                status.online.append(item)
+            elif "POPULATING" in states:
+                status.populating.append(item)
+            elif states:
+                status.failed.append(item)
+            else:
+                status.missing.append(item)
+        return status
+
+    def create(self, items: list[SchemaItem]) -> list[SchemaItem]:
+        """Creates the constraints and indexes of the items. Failures are logged, e.g. a uniqueness
+        constraint can't be created while there are duplicate nodes.
+
+        Returns:
+            list[SchemaItem]: The items that couldn't be created.
+        """
+        not_created = []
+        with self.driver.session() as session:
+            for item in items:
+                try:
+                    session.run(item.create_statement).consume()
+                except ClientError as e:
+                    logger.error(f"Could not create {item.kind.value} index {item.name}: {e}")
+                    not_created.append(item)
+        return not_created
+
+    def wait_until_online(self, timeout: float, interval: float = 1) -> SchemaStatus:
+        """Waits for the indexes that are being populated, at most `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        status = self.status()
+        while status.populating and time.monotonic() < deadline:
+            time.sleep(interval)
+            status = self.status()
+        return status
+
+    def ensure(self, timeout: float = 60) -> SchemaStatus:
+        """Creates what is missing from the schema and waits for it to be online. Items that still aren't
+        online are logged, drilling works without them but writes get slower as the graph grows."""
+        status = self.status()
+        if status.missing:
+            logger.info(f"Creating indexes {', '.join(item.name for item in status.missing)}.")
+            self.create(status.missing)
+            status = self.wait_until_online(timeout)
+        elif status.populating:
+            status = self.wait_until_online(timeout)
+
+        for state in ("populating", "failed", "missing"):
+            for item in getattr(status, state):
+                logger.warning(
+                    f"Index {item.name} on {item.label}.{item.property} is {state}, "
+                    f"queries on it will scan all {item.label} nodes."
+                )
+        return status
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Reports the state of the constraints and indexes of the Neo4j database."
+    )
+    parser.add_argument("--apply", action="store_true", help="Create the missing ones.")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    driver = GraphDatabase.driver(
+        f"bolt://{NEO4J_HOST}:{NEO4J_PORT or 7687}", auth=(NEO4J_USER, NEO4J_PASSWORD)
+    )
+    try:
+        manager = Neo4jSchemaManager(driver)
+        status = manager.ensure(args.timeout) if args.apply else manager.status()
+        for state in ("online", "populating", "failed", "missing"):
+            for item in getattr(status, state):
+                print(f"{item.name:<20} {item.kind.value:<7} {item.label}.{item.property:<12} {state}")
+        sys.exit(0 if status.ready else 1)
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
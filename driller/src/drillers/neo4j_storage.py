@@ -1,4 +1,5 @@
 import logging
+import time
 
 from neo4j import GraphDatabase
 from neo4j.exceptions import TransientError, ClientError
@@ -21,6 +22,8 @@ class Neo4jStorage:
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
         self.batch_size = batch_size
         self.batch = []
+        # Seconds taken to write the last batch. Reported in the drill progress.
+        self.last_flush_seconds: float | None = None
 
     def close(self):
         """
@@ -30,6 +33,23 @@ class Neo4jStorage:
         self._process_batch()
         self.driver.close()
 
+    def bump_graph_version(self):
+        """Increments the version on the `GraphVersion` node. Caches of query results, like the backend's,
+        can't tell that properties of existing nodes or relationships changed from the number of nodes and
+        relationships, so anything that changes them outside of a drill calls this once it's done."""
+        with self.driver.session() as session:
+            session.run(
+                "MERGE (v:GraphVersion {name: 'graph'}) SET v.version = coalesce(v.version, 0) + 1"
+            ).consume()
+
+    def flush(self):
+        """Writes any queries waiting in the batch to the database."""
+        self._process_batch()
+
+    def discard(self):
+        """Drops the queries waiting in the batch without running them."""
+        self.batch = []
+
     def _add_to_batch(self, query, parameters):
         """Adds a query to the batch of queries.
 
@@ -59,11 +79,13 @@ class Neo4jStorage:
             logger.debug("Processing Batch")
             try:
                 if self.batch:
+                    started = time.monotonic()
                     with self.driver.session() as session:
                         with session.begin_transaction() as tx:
                             for operation in self.batch:
                                 tx.run(*operation)
                     self.batch = []
+                    self.last_flush_seconds = time.monotonic() - started
                 return
             except TransientError as e:
                 logger.exception("Encountered a TransientError", e)
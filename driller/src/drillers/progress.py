@@ -0,0 +1,63 @@
+import logging
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class DrillProgress:
+    """Tracks how far through a drill the driller is and reports it at most once every `interval` seconds.
+
+    The report passed to `on_progress` is a dict containing:
+    - `commits`: Commits traversed so far.
+    - `total`: Estimated number of commits that will be traversed, if known.
+    - `rate`: Commits traversed per second since the drill started.
+    - `flush_seconds`: Time the storage took to write its last batch, if the storage records it.
+    """
+
+    def __init__(
+        self,
+        on_progress: Callable[[dict], None],
+        total: int | None = None,
+        interval: float = 5.0,
+        storage=None,
+    ):
+        """
+        Args:
+            on_progress (Callable): Called with the progress report.
+            total (int, optional): Estimated number of commits in the drill.
+            interval (float, optional): Minimum seconds between reports.
+            storage (RepositoryDataStorage, optional): Storage that the latest flush latency is read from.
+        """
+        self.on_progress = on_progress
+        self.total = total
+        self.interval = interval
+        self.storage = storage
+
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.commits = 0
+
+    def update(self, commits: int):
+        """Records the number of commits traversed. Reports if `interval` has passed since the last report."""
+        self.commits = commits
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def create_report(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "commits": self.commits,
+            "total": self.total,
+            "rate": self.commits / elapsed if elapsed > 0 else None,
+            "flush_seconds": getattr(self.storage, "last_flush_seconds", None),
+        }
+
+    def report(self):
+        try:
+            self.on_progress(self.create_report())
+        except Exception as e:
+            # Progress is informational, it mustn't stop the drill.
+            logger.exception(f"Failed to report progress: {e}")
@@ -30,6 +30,38 @@ class RepositoryDataStorage(ABC):
     ):
         pass
 
+    def stitch_repository(self, repo_name: str):
+        """Creates the relationships that span the shards of a repository that was drilled in parallel.
+        Storages that don't support sharded drills can ignore this."""
+        pass
+
+    def aggregate_repository(self, repo_name: str):
+        """Adds the commits of the repository that haven't been aggregated yet to its precomputed aggregates.
+        Storages without aggregates can ignore this."""
+        pass
+
+    def get_fingerprint(self, repo_name: str) -> tuple[str, int | None] | None:
+        """Gets the fingerprint of the last complete drill of the repository and the number of commits it
+        traversed. Storages that don't cache drills can ignore this."""
+        return None
+
+    def store_fingerprint(self, repo_name: str, fingerprint: str, commit_count: int):
+        """Records the fingerprint of a complete drill of the repository. Storages that don't cache drills
+        can ignore this."""
+        pass
+
+    def flush(self):
+        """Writes any buffered data to the storage. Storages that don't buffer can ignore this."""
+        pass
+
+    def discard(self):
+        """Drops any buffered data without writing it. Storages that don't buffer can ignore this."""
+        pass
+
+    def close(self):
+        """Releases any resources held by the storage."""
+        pass
+
 
 class LogRepositoryStorage(RepositoryDataStorage):
     """An example Repository storage which logs the data to the console.
@@ -46,7 +78,8 @@ class LogRepositoryStorage(RepositoryDataStorage):
                 "hash": commit.hash,
                 "message": commit.msg,
                 "author": commit.author.name,
-                "date": commit.author_date.strftime("%Y-%m-%d %H:%M:%S"),
+                "date": commit.author_date.isoformat(),
+                "committer_date": commit.committer_date.isoformat(),
                 "parents": commit.parents,
                 "dmm_unit_size": commit.dmm_unit_size,
                 "dmm_unit_complexity": commit.dmm_unit_complexity,
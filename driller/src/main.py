@@ -17,6 +17,9 @@ from src.settings.default import (
     RABBITMQ_USER,
     RABBITMQ_PASSWORD,
     RABBITMQ_QUEUE,
+    RABBITMQ_QUEUE_SIZE_CLASSES,
+    WORKER_HEARTBEAT_INTERVAL,
+    WORKER_ID,
     NEO4J_LOG_LEVEL,
     NEO4J_HOST,
     NEO4J_PORT,
@@ -26,6 +29,8 @@ from src.settings.default import (
 )
 from src.workers.queue_worker import QueueWorker, Worker
 
+from common.models.driller_config import SizeClass
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(format=LOG_FORMAT, level=LOG_LEVEL)
 std_out_handler = logging.StreamHandler(sys.stdout)
@@ -66,6 +71,9 @@ async def main():
             "password": NEO4J_PASSWORD,
             "batch_size": NEO4J_DEFAULT_BATCH_SIZE,
         },
+        size_classes=[SizeClass(c) for c in RABBITMQ_QUEUE_SIZE_CLASSES],
+        heartbeat_interval=WORKER_HEARTBEAT_INTERVAL,
+        worker_id=WORKER_ID,
     )
     loop = asyncio.get_running_loop()
 
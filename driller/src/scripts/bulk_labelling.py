@@ -0,0 +1,233 @@
+import argparse
+import logging
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+from src.drillers.neo4j_storage import Neo4jStorage
+from src.scripts.dataset_loader import chunked, read_json_records, read_records
+from src.settings.default import NEO4J_HOST, NEO4J_PASSWORD, NEO4J_PORT, NEO4J_USER
+
+""" Adds the labels of a labelled commit dataset to the Neo4j Database.
+
+Each commit in the dataset is linked to a `Code` node for each of its labels with a `MEMBER_OF`
+relationship, like the `cost_awareness_labelling` script does for the Cloud Cost Awareness study.
+
+The dataset can be:
+- CSV with a column for the commit hash and a column with the labels separated by `--label-separator`.
+- JSON, either an array of objects or one object per line (NDJSON), with the commit hash and a list of labels.
+  Records with a GitHub commit `url` instead of a hash are also accepted.
+
+The dataset is read and validated one record at a time and written in chunks of `--chunk-size` records, each
+in a single `UNWIND` transaction, so memory use doesn't grow with the size of the dataset. Invalid records
+are skipped and counted. Commits that aren't in the database are skipped.
+
+Labels are only linked to codes that already exist, either from `--codes` or from an earlier run, so a typo in
+the dataset doesn't create a new code. Labels without a code are skipped and listed at the end.
+
+**Executing the script:**
+
+```
+docker compose run driller-worker poetry run python3 -m src.scripts.bulk_labelling dataset.csv --codes codes.json
+```
+"""
+
+logger = logging.getLogger(__name__)
+
+COMMIT_HASH_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+
+@dataclass
+class LabellingStats:
+    records: int = 0
+    invalid: int = 0
+    # Commits in the dataset that were found in the database.
+    commits: int = 0
+    relationships: int = 0
+    # Labels in the dataset that don't have a `Code` node.
+    unknown_labels: set[str] = field(default_factory=set)
+
+
+def get_commit_hash_from_url(url: str) -> str | None:
+    """Extracts the commit hash from a GitHub commit url, None if it isn't a commit url."""
+    url_split = url.rstrip("/").split("/")
+    if len(url_split) < 2 or url_split[-2] != "commit":
+        return None
+    return url_split[-1]
+
+
+def parse_labelled_commit(
+    record: dict,
+    hash_field: str = "hash",
+    labels_field: str = "labels",
+    label_separator: str = ";",
+) -> dict | None:
+    """Validates a record and converts it to a `{"hash": ..., "labels": [...]}` row.
+
+    Returns:
+        dict | None: The row, None if the record isn't a valid labelled commit.
+    """
+    if not isinstance(record, dict):
+        return None
+
+    commit_hash = record.get(hash_field)
+    if commit_hash is None and isinstance(record.get("url"), str):
+        commit_hash = get_commit_hash_from_url(record["url"])
+    if not isinstance(commit_hash, str):
+        return None
+    commit_hash = commit_hash.strip().lower()
+    if not COMMIT_HASH_PATTERN.match(commit_hash):
+        return None
+
+    labels = record.get(labels_field)
+    if isinstance(labels, str):
+        labels = labels.split(label_separator)
+    if not isinstance(labels, list):
+        return None
+    labels = [label.strip() for label in labels if isinstance(label, str) and label.strip()]
+    if not labels:
+        return None
+
+    return {"hash": commit_hash, "labels": sorted(set(labels))}
+
+
+class BulkLabellingStorage(Neo4jStorage):
+    """Writes commit labels to Neo4j in chunks, each chunk as a single transaction."""
+
+    def create_constraints(self):
+        """Codes are matched by name for every chunk, the constraint makes that a lookup."""
+        with self.driver.session() as session:
+            session.run(
+                "CREATE CONSTRAINT IF NOT EXISTS FOR (code:Code) REQUIRE code.name IS UNIQUE"
+            )
+
+    def store_codes(self, codes: list[dict]):
+        """Stores `Code` nodes with a name and description."""
+        with self.driver.session() as session:
+            session.execute_write(
+                lambda tx: tx.run(
+                    "UNWIND $codes AS code "
+                    "MERGE (c:Code {name: code.name}) SET c.description = code.description",
+                    {"codes": codes},
+                ).consume()
+            )
+
+    @staticmethod
+    def _store_labels(tx, rows: list[dict]) -> tuple[int, int, list[str]]:
+        labels = sorted({label for row in rows for label in row["labels"]})
+        unknown = tx.run(
+            "UNWIND $labels AS name "
+            "OPTIONAL MATCH (code:Code {name: name}) "
+            "WITH name WHERE code IS NULL "
+            "RETURN collect(name) AS unknown",
+            {"labels": labels},
+        ).single()["unknown"]
+        record = tx.run(
+            "UNWIND $rows AS row "
+            "MATCH (commit:Commit {hash: row.hash}) "
+            "UNWIND row.labels AS label "
+            "MATCH (code:Code {name: label}) "
+            "MERGE (commit)-[:MEMBER_OF]->(code) "
+            "RETURN count(DISTINCT commit) AS commits, count(*) AS relationships",
+            {"rows": rows},
+        ).single()
+        return record["commits"], record["relationships"], unknown
+
+    def store_labels(self, rows: list[dict]) -> tuple[int, int, list[str]]:
+        """Links the commits to the `Code` of each of their labels with `MEMBER_OF` relationships.
+        Codes aren't created, labels without a `Code` are skipped.
+
+        Args:
+            rows (list[dict]): `{"hash": ..., "labels": [...]}` of each commit.
+
+        Returns:
+            tuple[int, int, list[str]]: Number of commits found in the database, of relationships merged and
+                                        the labels that don't have a `Code`.
+        """
+        with self.driver.session() as session:
+            return session.execute_write(self._store_labels, rows)
+
+    def label_commits(
+        self, records: Iterable[dict], chunk_size: int = 5000, **parse_args
+    ) -> LabellingStats:
+        """Validates the records and stores the labels of the valid ones.
+
+        Args:
+            records (Iterable[dict]): Records of the dataset. Read lazily.
+            chunk_size (int, optional): Records written in each transaction.
+            **parse_args: Passed on to `parse_labelled_commit`.
+        """
+        stats = LabellingStats()
+
+        def parse():
+            for record in records:
+                stats.records += 1
+                row = parse_labelled_commit(record, **parse_args)
+                if row is None:
+                    stats.invalid += 1
+                    logger.debug(f"Skipping invalid record: {record}")
+                    continue
+                yield row
+
+        for chunk in chunked(parse(), chunk_size):
+            commits, relationships, unknown = self.store_labels(chunk)
+            stats.commits += commits
+            stats.relationships += relationships
+            stats.unknown_labels.update(unknown)
+            logger.info(
+                f"{stats.records} records read, {stats.commits} commits labelled."
+            )
+        self.bump_graph_version()
+        return stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Adds the labels of a labelled commit dataset to the Neo4j database."
+    )
+    parser.add_argument("dataset", help="CSV, JSON or NDJSON file of labelled commits.")
+    parser.add_argument(
+        "--codes", help="JSON file with the `name` and `description` of each code."
+    )
+    parser.add_argument("--hash-field", default="hash")
+    parser.add_argument("--labels-field", default="labels")
+    parser.add_argument(
+        "--label-separator", default=";", help="Separates the labels in a CSV column."
+    )
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    storage = BulkLabellingStorage(
+        user=NEO4J_USER, password=NEO4J_PASSWORD, host=NEO4J_HOST, port=NEO4J_PORT or 7687
+    )
+    try:
+        storage.create_constraints()
+        if args.codes:
+            with open(args.codes, "r") as file:
+                storage.store_codes(list(read_json_records(file)))
+
+        stats = storage.label_commits(
+            read_records(args.dataset),
+            chunk_size=args.chunk_size,
+            hash_field=args.hash_field,
+            labels_field=args.labels_field,
+            label_separator=args.label_separator,
+        )
+        logger.info(
+            f"Complete. {stats.records} records, {stats.invalid} invalid, "
+            f"{stats.commits} commits labelled with {stats.relationships} relationships."
+        )
+        if stats.unknown_labels:
+            logger.warning(
+                f"Skipped {len(stats.unknown_labels)} labels without a code: "
+                f"{', '.join(sorted(stats.unknown_labels))}"
+            )
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
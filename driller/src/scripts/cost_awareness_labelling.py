@@ -1,10 +1,11 @@
-import json
 import logging
+import os
 import sys
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 from pydantic import BaseModel
-from src.drillers.neo4j_storage import Neo4jStorage
+from src.scripts.bulk_labelling import BulkLabellingStorage, get_commit_hash_from_url
+from src.scripts.dataset_loader import LoadStats, chunked, stream_dataset
 
 """ For case study of reproducing data from `Cloud Cost Awareness` study.
 Replication package that this replication is based on: https://github.com/feitosa-daniel/cloud-cost-awareness
@@ -17,20 +18,25 @@ In this replication of their data we will focus on the commit messages, so issue
 **Note**: This script assumes that the repositories from the study have been mined and the commits are in the database.
 
 This does the following:
-1. Loads the dataset which contains the commit and the codes that were assigned to it
-2. Load the codes (this contains the name of the code and it's description)
-3. Filter out the issues from the dataset (since we aren't using them in this replication)
-4. Extract the commit hashes from the GitHub commit URLs
-5. For each code, a node is created on the database of type `Code` which contains the name and description
+1. Load the codes (this contains the name of the code and it's description)
+2. For each code, a node is created on the database of type `Code` which contains the name and description
+3. Streams the dataset which contains the commit and the codes that were assigned to it
+4. Filter out the issues from the dataset (since we aren't using them in this replication)
+5. Extract the commit hashes from the GitHub commit URLs
 6. For each commit, it is linked to the relevant with a `Member_OF` relationship.
     - If a given commit hash is not present in the database, it will just be skipped. Won't fail.
+    - The relationships are written in chunks of `LABEL_CHUNK_SIZE` commits, each in a single transaction.
+
+Steps 3 to 6 are a generator pipeline, the dataset is never held in memory as a whole.
+
+For other labelled datasets use the generic `bulk_labelling` script.
 
 **Executing the script:**
 
 Best to run it inside docker since all Env variables will be set already.
 
 ```
-docker compose run driller-worker poetry run python3 -m driller.scripts.cost_awareness_labelling
+docker compose run driller-worker poetry run python3 -m src.scripts.cost_awareness_labelling
 ```
 """
 
@@ -41,6 +47,12 @@ neo4j_logger = logging.getLogger("neo4j")
 neo4j_logger.setLevel(logging.INFO)
 neo4j_logger.addHandler(logging.StreamHandler(sys.stdout))
 
+# Commits labelled in each transaction.
+LABEL_CHUNK_SIZE = 5000
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), "cost_awareness_dataset.json")
+CODES_PATH = os.path.join(os.path.dirname(__file__), "cost_awareness_codes.json")
+
 """Pydantic models used for holding data loaded from datasets."""
 
 
@@ -57,108 +69,72 @@ class Code(BaseModel):
     description: str
 
 
-class LabellingStorage(Neo4jStorage):
-    """Uses `Neo4jStorage` to easily access the Neo4j database."""
+class LabellingStorage(BulkLabellingStorage):
+    """Uses `BulkLabellingStorage` to write the labels to the Neo4j database."""
 
-    def load_codes(self):
+    def load_codes(self) -> list[Code]:
         """Loads the codes dataset into pydantic models."""
-        with open("./driller/scripts/cost_awareness_codes.json", "r") as file:
-            codes = json.load(file)
-        self.codes = list(map(lambda c: Code.model_validate(c), codes))
-        # for code in codes:
-        #     self.codes.append(Code.model_validate(code))
-
-    def load_dataset(self):
-        """Loads the commit and issue data with the codes into `self.dataset` in LabelledCommit objects."""
-        with open("./driller/scripts/cost_awareness_dataset.json", "r") as file:
-            data = json.load(file)
-
-        self.dataset: list[LabelledCommit] = []
-        for item in data:
-            obj = LabelledCommit.model_validate(item)
-            self.dataset.append(obj)
-
-    def get_commit_hash_from_url(self, url: str):
-        """Extracts the commit hash from the GitHub commit url.
-        Assumes that hash is the part of the URL.
-
-        Raises:
-            ValueError: If url is in the wrong format.
-        """
-        url_split = url.split("/")
-
-        if url_split[-2] != "commit":
-            raise ValueError(f"URL in the wrong format:  {url}")
-
-        return url_split[-1]
-
-    def filter_remove_issues(self):
-        """In this case I am only using commit data, but dataset contains labelled issues."""
-
-        self.dataset = list(filter(lambda o: o.type == "commit", self.dataset))
-
-    def add_commit_hashes(self):
-        """For each LabelledCommit, extracts and adds the commit hash"""
-        for obj in self.dataset:
-            obj.hash = self.get_commit_hash_from_url(obj.url)
+        return list(stream_dataset(CODES_PATH, Code))
 
-    def store_code(self, code: Code):
-        """Stores a code as a `Code` node with name and description."""
-        logger.debug(f"Storing code {code.name}")
-        self._run_query(
-            "MERGE (code:Code {name: $name}) SET code.description = $description",
-            {"name": code.name, "description": code.description},
+    def load_dataset(self, stats: LoadStats | None = None) -> Iterator[LabelledCommit]:
+        """Streams the labelled commits of the dataset, issues are filtered out."""
+        return stream_dataset(
+            DATASET_PATH, LabelledCommit, where=[self.is_commit], stats=stats
         )
 
-    def store_codes(self):
-        for code in self.codes:
-            self.store_code(code)
+    def is_commit(self, obj: LabelledCommit) -> bool:
+        """In this case I am only using commit data, but dataset contains labelled issues."""
+        return obj.type == "commit"
 
-    def store_code_commit_relationship(self, code: str, commit_hash: str):
-        """Creates the `MEMBER_OF` relationship between the commit and the code"""
-        logger.debug(
-            f"Creating relationship `MEMBER_OF` between commit {commit_hash} and code {code}."
-        )
-        self._run_query(
-            "MATCH (commit:Commit {hash: $commit_hash}) "
-            "MATCH (code:Code {name: $code_name})"
-            "MERGE (commit)-[:MEMBER_OF]->(code)",
-            {"commit_hash": commit_hash, "code_name": code},
-        )
+    def add_commit_hashes(
+        self, dataset: Iterable[LabelledCommit]
+    ) -> Iterator[LabelledCommit]:
+        """For each LabelledCommit, extracts and adds the commit hash
 
-    def store_code_commit_relationships(self):
-        """Creates all the code-commit relationships"""
-        for obj in self.dataset:
+        Raises:
+            ValueError: If url is in the wrong format.
+        """
+        for obj in dataset:
+            obj.hash = get_commit_hash_from_url(obj.url)
             if obj.hash is None:
-                raise ValueError("Expected a string commit hash, not None.")
+                raise ValueError(f"URL in the wrong format:  {obj.url}")
+            yield obj
+
+    def store_code_commit_relationships(self, dataset: Iterable[LabelledCommit]) -> int:
+        """Creates all the code-commit relationships
 
-            for code in obj.codes:
-                self.store_code_commit_relationship(code, obj.hash)
+        Returns:
+            int: Number of commits found in the database.
+        """
+        rows = ({"hash": obj.hash, "labels": obj.codes} for obj in dataset)
+        commit_count = 0
+        for chunk in chunked(rows, LABEL_CHUNK_SIZE):
+            commits, _ = self.store_labels(chunk)
+            commit_count += commits
+        return commit_count
 
     def execute(self):
         """Executes all of the steps of the insertion of the labels."""
 
-        # Loading Datasets
-        self.load_dataset()
-        self.load_codes()
-
-        logger.info("Dataset & Codes Loaded.")
-
-        # Filtering out issue and extracting commit hashes.
-        self.filter_remove_issues()
-        self.add_commit_hashes()
-
-        logger.info("Setup Complete. Adding to DB.")
-
         # Storing each code as a node on DB
-        self.store_codes()
+        codes = self.load_codes()
+        self.create_constraints()
+        self.store_codes([code.model_dump() for code in codes])
 
         logger.info("Codes stored.")
 
+        # Streaming the dataset, filtering out issues and extracting commit hashes.
+        stats = LoadStats()
+        dataset = self.add_commit_hashes(self.load_dataset(stats))
+
         # Creates the relationships between the commits and the codes.
-        self.store_code_commit_relationships()
+        commit_count = self.store_code_commit_relationships(dataset)
+        self.bump_graph_version()
 
-        logger.info("Complete.")
+        logger.info(
+            f"Complete. {stats.records} records read, {stats.invalid} invalid, {stats.filtered} issues "
+            f"skipped, {commit_count} commits labelled."
+        )
 
 
 def run():
@@ -0,0 +1,175 @@
+import csv
+import json
+import logging
+import re
+from dataclasses import dataclass
+from itertools import islice
+from typing import IO, Callable, Iterable, Iterator, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+""" Streaming loader for the datasets of replication scripts.
+
+Datasets are read one record at a time and passed through a generator pipeline of validation and filters,
+so memory use stays the same however large the dataset is. Supports CSV, JSON arrays and NDJSON.
+
+```
+stats = LoadStats()
+for commit in stream_dataset("dataset.json", LabelledCommit, where=[lambda c: c.type == "commit"], stats=stats):
+    ...
+```
+"""
+
+logger = logging.getLogger(__name__)
+
+# Characters read from a JSON dataset at a time.
+READ_SIZE = 1 << 16
+
+# Whitespace and commas between the values of a JSON array.
+ARRAY_SEPARATOR_PATTERN = re.compile(r"[\s,]*")
+
+T = TypeVar("T")
+
+
+@dataclass
+class LoadStats:
+    """Counts of the records that went through a pipeline. Updated as the records are consumed."""
+
+    records: int = 0
+    invalid: int = 0
+    filtered: int = 0
+
+
+def read_csv_records(file: IO[str]) -> Iterator[dict]:
+    """Yields each row of a CSV file with a header as a dict."""
+    yield from csv.DictReader(file)
+
+
+def read_json_records(file: IO[str], read_size: int = READ_SIZE) -> Iterator[dict]:
+    """Yields each object of a JSON array or of an NDJSON file without reading the whole file.
+
+    Raises:
+        json.JSONDecodeError: If the file isn't valid JSON.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    # Leading whitespace can be longer than a read.
+    while not buffer and (more := file.read(read_size)):
+        buffer = more.lstrip()
+
+    if not buffer.startswith("["):
+        # One object per line.
+        while True:
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+            more = file.read(read_size)
+            if not more:
+                break
+            buffer += more
+        if buffer.strip():
+            yield json.loads(buffer)
+        return
+
+    # The records are decoded from an offset into the buffer so they aren't copied out one at a time.
+    buffer = buffer[1:]
+    position = 0
+    exhausted = False
+    while True:
+        position = ARRAY_SEPARATOR_PATTERN.match(buffer, position).end()
+        if buffer.startswith("]", position):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            record, end = None, len(buffer)
+        if end == len(buffer) and not exhausted:
+            # The record may continue in the next part of the file. Even a record that decoded may be a
+            # number that was cut off.
+            more = file.read(read_size)
+            exhausted = not more
+            buffer = buffer[position:] + more
+            position = 0
+            continue
+        yield record
+        position = end
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """Yields the records of a CSV or JSON dataset one at a time, based on the file extension."""
+    with open(path, "r", newline="") as file:
+        if path.lower().endswith(".csv"):
+            yield from read_csv_records(file)
+        else:
+            yield from read_json_records(file)
+
+
+def validate_records(
+    records: Iterable[dict], model: type[BaseModel], stats: LoadStats | None = None
+) -> Iterator[BaseModel]:
+    """Validates each record into `model`. Invalid records are logged and skipped."""
+    for record in records:
+        if stats is not None:
+            stats.records += 1
+        try:
+            yield model.model_validate(record)
+        except ValidationError as e:
+            if stats is not None:
+                stats.invalid += 1
+            logger.debug(f"Skipping invalid record {record}: {e}")
+
+
+def filter_records(
+    records: Iterable[T],
+    where: list[Callable[[T], bool]],
+    stats: LoadStats | None = None,
+) -> Iterator[T]:
+    """Yields the records that match every predicate."""
+    for record in records:
+        if all(predicate(record) for predicate in where):
+            yield record
+        elif stats is not None:
+            stats.filtered += 1
+
+
+def stream_dataset(
+    path: str,
+    model: type[BaseModel] | None = None,
+    where: list[Callable] | None = None,
+    stats: LoadStats | None = None,
+) -> Iterator:
+    """Reads, validates and filters a dataset lazily.
+
+    Args:
+        path (str): CSV, JSON or NDJSON file.
+        model (type[BaseModel], optional): Model each record is validated into. Raw dicts when not given.
+        where (list[Callable], optional): Predicates the records must match.
+        stats (LoadStats, optional): Updated with the number of records read, invalid and filtered.
+
+    Returns:
+        Iterator: Records that are valid and match the filters.
+    """
+    records = read_records(path)
+    if model is not None:
+        records = validate_records(records, model, stats)
+    elif stats is not None:
+        records = _count_records(records, stats)
+    if where:
+        records = filter_records(records, where, stats)
+    return records
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Splits an iterable into lists of at most `size` items without reading it all."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _count_records(records: Iterable[T], stats: LoadStats) -> Iterator[T]:
+    for record in records:
+        stats.records += 1
+        yield record
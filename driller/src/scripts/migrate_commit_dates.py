@@ -0,0 +1,97 @@
+import argparse
+import logging
+import sys
+
+from src.drillers.neo4j_schema import Neo4jSchemaManager
+from src.drillers.neo4j_storage import Neo4jStorage
+from src.settings.default import NEO4J_HOST, NEO4J_PASSWORD, NEO4J_PORT, NEO4J_USER
+
+""" Converts the commit dates of a database drilled before dates were stored as Neo4j `datetime` values.
+
+Commits used to have their author date stored as a `"%Y-%m-%d %H:%M:%S"` string without the timezone. Those
+strings are converted to `datetime` values in place, in transactions of `--batch-size` commits, along with the
+first and last commit dates of the `CONTRIBUTED_TO` aggregates. Dates that are already `datetime` values are
+left as they are, so the script can be run again if it's interrupted.
+
+The timezone of the old dates wasn't stored, so they are converted with a UTC offset. Drilling the repository
+again writes the exact author and committer dates with their offsets.
+
+**Executing the script:**
+
+```
+docker compose run driller-worker poetry run python3 -m src.scripts.migrate_commit_dates
+```
+"""
+
+logger = logging.getLogger(__name__)
+
+# `datetime()` needs a `T` between the date and the time of the old strings.
+STRING_DATETIME = "datetime(replace({value}, ' ', 'T'))"
+
+
+class CommitDateMigration(Neo4jStorage):
+
+    def convert_commit_dates(self, batch_size: int) -> int:
+        """Converts the string `date` of each commit to a `datetime`.
+
+        Returns:
+            int: Number of commits converted.
+        """
+        with self.driver.session() as session:
+            summary = session.run(
+                "MATCH (c:Commit) WHERE c.date IS :: STRING "
+                "CALL { "
+                "  WITH c "
+                f"  SET c.date = {STRING_DATETIME.format(value='c.date')} "
+                "} IN TRANSACTIONS OF $batch_size ROWS",
+                {"batch_size": batch_size},
+            ).consume()
+        return summary.counters.properties_set
+
+    def convert_contribution_dates(self, batch_size: int) -> int:
+        """Converts the first and last commit dates of the `CONTRIBUTED_TO` aggregates.
+
+        Returns:
+            int: Number of dates converted.
+        """
+        with self.driver.session() as session:
+            summary = session.run(
+                "MATCH ()-[t:CONTRIBUTED_TO]->() "
+                "WHERE t.first_commit IS :: STRING OR t.last_commit IS :: STRING "
+                "CALL { "
+                "  WITH t "
+                f"  SET t.first_commit = {STRING_DATETIME.format(value='t.first_commit')}, "
+                f"    t.last_commit = {STRING_DATETIME.format(value='t.last_commit')} "
+                "} IN TRANSACTIONS OF $batch_size ROWS",
+                {"batch_size": batch_size},
+            ).consume()
+        return summary.counters.properties_set
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Converts string commit dates in the Neo4j database to datetime values."
+    )
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    migration = CommitDateMigration(
+        user=NEO4J_USER, password=NEO4J_PASSWORD, host=NEO4J_HOST, port=NEO4J_PORT or 7687
+    )
+    try:
+        commits = migration.convert_commit_dates(args.batch_size)
+        logger.info(f"Converted the dates of {commits} commits.")
+        contributions = migration.convert_contribution_dates(args.batch_size)
+        logger.info(f"Converted {contributions} contribution dates.")
+        migration.bump_graph_version()
+
+        # Creates the range index on the committer date if no drill has yet.
+        Neo4jSchemaManager(migration.driver).ensure()
+    finally:
+        migration.close()
+
+
+if __name__ == "__main__":
+    main()
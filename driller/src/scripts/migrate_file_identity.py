@@ -0,0 +1,249 @@
+import argparse
+import logging
+import sys
+from dataclasses import dataclass, field
+
+from src.drillers.neo4j_pydriller_repository_storage import hash_file
+from src.drillers.neo4j_schema import Neo4jSchemaManager
+from src.drillers.neo4j_storage import Neo4jStorage
+from src.settings.default import NEO4J_HOST, NEO4J_PASSWORD, NEO4J_PORT, NEO4J_USER
+
+""" Splits the `File` nodes of a database drilled before files were identified by their path.
+
+Files used to be identified by their name and repository, so every `__init__.py` or `README.md` of a
+repository was a single `File` node. Those nodes are split into a node for each path, found from the
+`old_path` and `new_path` of their `MODIFIED` relationships, and the relationships are moved to them.
+
+- A node whose name and repository hashed to the old identity hashes to the same identity as the file of that
+  name at the root of the repository, so it becomes that file. It's deleted if nothing is left linked to it.
+- `RENAMED_TO` relationships between old nodes are replaced with ones between the files at the full old and
+  new paths of each rename.
+- The churn aggregates of the files are recomputed.
+
+Nodes are migrated `--batch-size` at a time, each batch in a single transaction. Migrated nodes have a `path`,
+so the script can be run again if it's interrupted.
+
+**Executing the script:**
+
+```
+docker compose run driller-worker poetry run python3 -m src.scripts.migrate_file_identity
+```
+"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileMove:
+    """Modifications of an old `File` node that belong to the file at `path`."""
+
+    hash: str
+    name: str
+    path: str
+    repository: str
+    modification_ids: list[str] = field(default_factory=list)
+
+
+@dataclass
+class FileMigrationPlan:
+    hash: str
+    name: str
+    repository: str
+    moves: list[FileMove] = field(default_factory=list)
+    renames: list[dict] = field(default_factory=list)
+
+
+def find_repository(file_hash: str, name: str, repositories: set[str]) -> str | None:
+    """Finds which of the repositories an old `File` node belongs to from its hash."""
+    for repository in sorted(repositories):
+        if hash_file(name, repository) == file_hash:
+            return repository
+    return None
+
+
+def plan_file_migration(legacy_file: dict) -> FileMigrationPlan | None:
+    """Groups the modifications of an old `File` node by the path of the file.
+
+    Args:
+        legacy_file (dict): `hash` and `name` of the node and its `modifications`, each with the `id`,
+            `old_path`, `new_path` and `change_type` of the relationship and the `repositories` of the commit.
+
+    Returns:
+        FileMigrationPlan | None: None when the repository of the node can't be found.
+    """
+    modifications = legacy_file["modifications"]
+    repositories = {repo for m in modifications for repo in m["repositories"] if repo}
+    repository = find_repository(legacy_file["hash"], legacy_file["name"], repositories)
+    if repository is None:
+        return None
+
+    plan = FileMigrationPlan(legacy_file["hash"], legacy_file["name"], repository)
+    moves: dict[str, FileMove] = {}
+    for modification in modifications:
+        path = modification["new_path"] or modification["old_path"] or legacy_file["name"]
+        file_hash = hash_file(path, repository)
+        if file_hash != plan.hash:
+            move = moves.setdefault(
+                file_hash, FileMove(file_hash, path.split("/")[-1], path, repository)
+            )
+            move.modification_ids.append(modification["id"])
+
+        if modification["change_type"] == "RENAME" and modification["old_path"]:
+            plan.renames.append(
+                {
+                    "old_hash": hash_file(modification["old_path"], repository),
+                    "old_name": modification["old_path"].split("/")[-1],
+                    "old_path": modification["old_path"],
+                    "new_hash": file_hash,
+                    "repository": repository,
+                }
+            )
+    plan.moves = list(moves.values())
+    return plan
+
+
+class FileIdentityMigration(Neo4jStorage):
+
+    def delete_legacy_renames(self, batch_size: int):
+        """Deletes the `RENAMED_TO` relationships between old nodes, they are recreated from the renames."""
+        with self.driver.session() as session:
+            session.run(
+                "MATCH (a:File)-[r:RENAMED_TO]->(b:File) WHERE a.path IS NULL AND b.path IS NULL "
+                "CALL { WITH r DELETE r } IN TRANSACTIONS OF $batch_size ROWS",
+                {"batch_size": batch_size},
+            ).consume()
+
+    @staticmethod
+    def _read_legacy_files(tx, batch_size: int, skipped: list[str]) -> list[dict]:
+        return tx.run(
+            "MATCH (f:File) WHERE f.path IS NULL AND NOT f.hash IN $skipped "
+            "WITH f LIMIT $batch_size "
+            "OPTIONAL MATCH (c:Commit)-[m:MODIFIED]->(f) "
+            "OPTIONAL MATCH (c)-[:IN_BRANCH]->(b:Branch) "
+            "WITH f, m, collect(DISTINCT b.repository) AS repositories "
+            "RETURN f.hash AS hash, f.name AS name, collect(CASE WHEN m IS NOT NULL THEN { "
+            "  id: elementId(m), old_path: m.old_path, new_path: m.new_path, "
+            "  change_type: m.change_type, repositories: repositories "
+            "} END) AS modifications",
+            {"batch_size": batch_size, "skipped": skipped},
+        ).data()
+
+    @staticmethod
+    def _write_plans(tx, plans: list[FileMigrationPlan]):
+        tx.run(
+            "UNWIND $files AS file "
+            "MATCH (f:File {hash: file.hash}) "
+            "SET f.path = file.name, f.repository = file.repository",
+            {"files": [{"hash": p.hash, "name": p.name, "repository": p.repository} for p in plans]},
+        )
+        tx.run(
+            "UNWIND $moves AS move "
+            "MERGE (n:File {hash: move.hash}) "
+            "SET n.name = move.name, n.path = move.path, n.repository = move.repository "
+            "WITH n, move "
+            "MATCH (c:Commit)-[m:MODIFIED]->(:File {hash: move.legacy_hash}) "
+            "WHERE elementId(m) IN move.modification_ids "
+            "MERGE (c)-[moved:MODIFIED]->(n) "
+            "SET moved += properties(m) "
+            "WITH m, moved WHERE m <> moved "
+            "DELETE m",
+            {
+                "moves": [
+                    {**move.__dict__, "legacy_hash": plan.hash}
+                    for plan in plans
+                    for move in plan.moves
+                ]
+            },
+        )
+        tx.run(
+            "UNWIND $renames AS rename "
+            "MERGE (old:File {hash: rename.old_hash}) "
+            "ON CREATE SET old.name = rename.old_name, old.path = rename.old_path, "
+            "  old.repository = rename.repository "
+            "WITH old, rename "
+            "MATCH (new:File {hash: rename.new_hash}) "
+            "MERGE (old)-[:RENAMED_TO]->(new)",
+            {"renames": [rename for plan in plans for rename in plan.renames]},
+        )
+        # Recomputed from the modifications of the commits that were aggregated for the repository.
+        tx.run(
+            "UNWIND $hashes AS hash "
+            "MATCH (f:File {hash: hash}) "
+            "OPTIONAL MATCH (c:Commit)-[m:MODIFIED]->(f) "
+            "WHERE f.repository IN coalesce(c.aggregated_for, []) "
+            "WITH f, count(m) AS commits, sum(coalesce(m.added_lines, 0)) AS added, "
+            "  sum(coalesce(m.deleted_lines, 0)) AS deleted "
+            "SET f.commits = commits, f.added_lines = added, f.deleted_lines = deleted, "
+            "  f.churn = added + deleted",
+            {
+                "hashes": list(
+                    {p.hash for p in plans} | {m.hash for p in plans for m in p.moves}
+                )
+            },
+        )
+        tx.run(
+            "UNWIND $hashes AS hash "
+            "MATCH (f:File {hash: hash}) WHERE NOT (f)--() "
+            "DELETE f",
+            {"hashes": [p.hash for p in plans]},
+        )
+
+    def migrate(self, batch_size: int) -> tuple[int, int]:
+        """Migrates the old `File` nodes in batches until none are left.
+
+        Returns:
+            tuple[int, int]: Number of nodes migrated and of nodes whose repository couldn't be found.
+        """
+        self.delete_legacy_renames(batch_size)
+
+        migrated = 0
+        skipped: list[str] = []
+        while True:
+            with self.driver.session() as session:
+                legacy_files = session.execute_read(
+                    self._read_legacy_files, batch_size, skipped
+                )
+                if not legacy_files:
+                    if migrated:
+                        self.bump_graph_version()
+                    return migrated, len(skipped)
+
+                plans = []
+                for legacy_file in legacy_files:
+                    plan = plan_file_migration(legacy_file)
+                    if plan is None:
+                        logger.warning(
+                            f"Could not find the repository of file {legacy_file['name']}, skipping."
+                        )
+                        skipped.append(legacy_file["hash"])
+                    else:
+                        plans.append(plan)
+
+                session.execute_write(self._write_plans, plans)
+            migrated += len(plans)
+            logger.info(f"{migrated} files migrated.")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Splits the File nodes of the Neo4j database by path."
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    migration = FileIdentityMigration(
+        user=NEO4J_USER, password=NEO4J_PASSWORD, host=NEO4J_HOST, port=NEO4J_PORT or 7687
+    )
+    try:
+        # The migration looks files up by hash and path.
+        Neo4jSchemaManager(migration.driver).ensure()
+        migrated, skipped = migration.migrate(args.batch_size)
+        logger.info(f"Complete. {migrated} files migrated, {skipped} skipped.")
+    finally:
+        migration.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import IO, Any
+
+from neo4j.time import Date, DateTime
+
+from src.drillers.neo4j_schema import Neo4jSchemaManager
+from src.drillers.neo4j_storage import Neo4jStorage
+from src.scripts.dataset_loader import chunked, read_json_records
+from src.settings.default import (
+    NEO4J_HOST,
+    NEO4J_PASSWORD,
+    NEO4J_PORT,
+    NEO4J_USER,
+    SNAPSHOT_LOCATION,
+)
+
+""" Exports the subgraph of a drilled repository to a snapshot file and imports snapshots into another database.
+
+A snapshot holds everything drilling, aggregating and labelling wrote for the repository: its branches,
+commits, authors, files, activity and contribution aggregates and the `Code` labels of its commits, with all
+of their properties and relationships. Importing it restores the repository without drilling it again, and a
+drill of the restored repository is skipped while it's unchanged since its fingerprint is in the snapshot.
+
+Snapshots are gzipped NDJSON. The first line describes the snapshot and each following line is a chunk of up
+to `--chunk-size` nodes of one label or relationships of one type, nodes first. Both the export and the import
+stream the file a chunk at a time, and each chunk is imported with a single `UNWIND` transaction that merges
+the nodes by the properties drilling identifies them by, so importing a snapshot again updates the nodes
+instead of duplicating them. Dates are written as tagged ISO strings so they are imported as `datetime` values.
+
+Snapshots are written to `SNAPSHOT_LOCATION`, which is in the Neo4j import volume so they are listed with the
+`db-exports` files of the backend. Relative snapshot paths are resolved against it.
+
+**Executing the script:**
+
+```
+docker compose run driller-worker poetry run python3 -m src.scripts.repository_snapshot export <repository>
+docker compose run driller-worker poetry run python3 -m src.scripts.repository_snapshot import <repository>.ndjson.gz
+```
+"""
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "neorepro-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".ndjson.gz"
+
+# Commits of the repository, for the nodes and relationships that are found from them.
+REPOSITORY_COMMITS = (
+    "MATCH (:Repository {name: $repository})<-[:PART_OF]-(:Branch)<-[:IN_BRANCH]-(c:Commit) "
+    "WITH DISTINCT c "
+)
+
+
+@dataclass(frozen=True)
+class SnapshotNodes:
+    """Nodes of a label in the subgraph of a repository.
+
+    `match` binds the nodes to `n` and `key` are the properties they are merged on when imported.
+    """
+
+    label: str
+    key: tuple[str, ...]
+    match: str
+
+    @property
+    def export_query(self) -> str:
+        return f"{self.match} RETURN properties(n) AS properties"
+
+    def merge_pattern(self, variable: str, value: str) -> str:
+        keys = ", ".join(f"{key}: {value}.{key}" for key in self.key)
+        return f"({variable}:{self.label} {{{keys}}})"
+
+    @property
+    def import_query(self) -> str:
+        return f"UNWIND $rows AS row MERGE {self.merge_pattern('n', 'row')} SET n += row"
+
+
+@dataclass(frozen=True)
+class SnapshotRelationships:
+    """Relationships of a type in the subgraph of a repository.
+
+    `match` binds the relationships to `r` and their start and end nodes to `source` and `target`.
+    """
+
+    type: str
+    source: SnapshotNodes
+    target: SnapshotNodes
+    match: str
+
+    @property
+    def export_query(self) -> str:
+        source = ", ".join(f".{key}" for key in self.source.key)
+        target = ", ".join(f".{key}" for key in self.target.key)
+        return (
+            f"{self.match} "
+            f"RETURN source {{{source}}} AS source, target {{{target}}} AS target, properties(r) AS properties"
+        )
+
+    @property
+    def import_query(self) -> str:
+        return (
+            "UNWIND $rows AS row "
+            f"MATCH {self.source.merge_pattern('source', 'row.source')} "
+            f"MATCH {self.target.merge_pattern('target', 'row.target')} "
+            f"MERGE (source)-[r:{self.type}]->(target) "
+            "SET r += row.properties"
+        )
+
+
+REPOSITORY = SnapshotNodes("Repository", ("name",), "MATCH (n:Repository {name: $repository})")
+BRANCH = SnapshotNodes(
+    "Branch", ("hash",), "MATCH (:Repository {name: $repository})<-[:PART_OF]-(n:Branch)"
+)
+COMMIT = SnapshotNodes("Commit", ("hash",), f"{REPOSITORY_COMMITS} WITH c AS n")
+DEVELOPER = SnapshotNodes(
+    "Developer", ("email",), f"{REPOSITORY_COMMITS} MATCH (c)-[:AUTHOR]->(d:Developer) WITH DISTINCT d AS n"
+)
+FILE = SnapshotNodes("File", ("hash",), "MATCH (n:File) WHERE n.repository = $repository")
+ACTIVITY = SnapshotNodes(
+    "Activity", ("repository", "email", "month"), "MATCH (n:Activity {repository: $repository})"
+)
+CODE = SnapshotNodes(
+    "Code", ("name",), f"{REPOSITORY_COMMITS} MATCH (c)-[:MEMBER_OF]->(code:Code) WITH DISTINCT code AS n"
+)
+
+SNAPSHOT_NODES = [REPOSITORY, BRANCH, COMMIT, DEVELOPER, FILE, ACTIVITY, CODE]
+
+SNAPSHOT_RELATIONSHIPS = [
+    SnapshotRelationships(
+        "PART_OF",
+        BRANCH,
+        REPOSITORY,
+        "MATCH (source:Branch)-[r:PART_OF]->(target:Repository {name: $repository})",
+    ),
+    SnapshotRelationships(
+        "IN_BRANCH",
+        COMMIT,
+        BRANCH,
+        "MATCH (source:Commit)-[r:IN_BRANCH]->(target:Branch)-[:PART_OF]->(:Repository {name: $repository})",
+    ),
+    SnapshotRelationships(
+        "AUTHOR",
+        COMMIT,
+        DEVELOPER,
+        f"{REPOSITORY_COMMITS} MATCH (c)-[r:AUTHOR]->(target:Developer) WITH c AS source, r, target",
+    ),
+    SnapshotRelationships(
+        "PARENT",
+        COMMIT,
+        COMMIT,
+        f"{REPOSITORY_COMMITS} MATCH (c)-[r:PARENT]->(target:Commit) WITH c AS source, r, target",
+    ),
+    SnapshotRelationships(
+        "MODIFIED",
+        COMMIT,
+        FILE,
+        f"{REPOSITORY_COMMITS} MATCH (c)-[r:MODIFIED]->(target:File) WITH c AS source, r, target",
+    ),
+    SnapshotRelationships(
+        "RENAMED_TO",
+        FILE,
+        FILE,
+        "MATCH (source:File)-[r:RENAMED_TO]->(target:File) WHERE source.repository = $repository",
+    ),
+    SnapshotRelationships(
+        "IN_REPOSITORY",
+        ACTIVITY,
+        REPOSITORY,
+        "MATCH (source:Activity)-[r:IN_REPOSITORY]->(target:Repository {name: $repository})",
+    ),
+    SnapshotRelationships(
+        "CONTRIBUTED_TO",
+        DEVELOPER,
+        REPOSITORY,
+        "MATCH (source:Developer)-[r:CONTRIBUTED_TO]->(target:Repository {name: $repository})",
+    ),
+    SnapshotRelationships(
+        "MEMBER_OF",
+        COMMIT,
+        CODE,
+        f"{REPOSITORY_COMMITS} MATCH (c)-[r:MEMBER_OF]->(target:Code) WITH c AS source, r, target",
+    ),
+]
+
+NODES_BY_LABEL = {nodes.label: nodes for nodes in SNAPSHOT_NODES}
+RELATIONSHIPS_BY_TYPE = {relationships.type: relationships for relationships in SNAPSHOT_RELATIONSHIPS}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def encode_value(value: Any) -> Any:
+    """Converts a property value read from Neo4j to a JSON value. Dates are tagged with their type."""
+    if isinstance(value, DateTime):
+        return {"$datetime": value.iso_format()}
+    if isinstance(value, Date):
+        return {"$date": value.iso_format()}
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [encode_value(item) for item in value]
+    return value
+
+
+def decode_value(value: Any) -> Any:
+    """Reverses `encode_value`."""
+    if isinstance(value, dict):
+        if value.keys() == {"$datetime"}:
+            return DateTime.from_iso_format(value["$datetime"])
+        if value.keys() == {"$date"}:
+            return Date.from_iso_format(value["$date"])
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+
+def get_snapshot_path(path: str) -> str:
+    return os.path.join(SNAPSHOT_LOCATION, path)
+
+
+def get_default_snapshot_name(repository: str) -> str:
+    return repository.replace("/", "_") + SNAPSHOT_EXTENSION
+
+
+class RepositorySnapshotStorage(Neo4jStorage):
+
+    def _export_rows(self, session, query: str, repository: str, columns: tuple[str, ...]):
+        for record in session.run(query, {"repository": repository}):
+            if len(columns) == 1:
+                yield encode_value(record[columns[0]])
+            else:
+                yield {column: encode_value(record[column]) for column in columns}
+
+    def export_repository(self, repository: str, file: IO[str], chunk_size: int = 1000) -> dict[str, int]:
+        """Writes the subgraph of a repository to a snapshot, streaming each label and relationship type.
+
+        Raises:
+            SnapshotError: If the repository isn't in the database.
+
+        Returns:
+            dict[str, int]: Number of nodes of each label and relationships of each type exported.
+        """
+        counts = {}
+        with self.driver.session() as session:
+            if session.run(REPOSITORY.export_query, {"repository": repository}).single() is None:
+                raise SnapshotError(f"Repository {repository} has not been drilled.")
+
+            header = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "repository": repository,
+                "exported_at": datetime.now(timezone.utc).isoformat(),
+            }
+            file.write(json.dumps(header) + "\n")
+
+            for nodes in SNAPSHOT_NODES:
+                rows = self._export_rows(session, nodes.export_query, repository, ("properties",))
+                for chunk in chunked(rows, chunk_size):
+                    file.write(json.dumps({"nodes": nodes.label, "rows": chunk}) + "\n")
+                    counts[nodes.label] = counts.get(nodes.label, 0) + len(chunk)
+                logger.info(f"Exported {counts.get(nodes.label, 0)} {nodes.label} nodes.")
+
+            for relationships in SNAPSHOT_RELATIONSHIPS:
+                rows = self._export_rows(
+                    session, relationships.export_query, repository, ("source", "target", "properties")
+                )
+                for chunk in chunked(rows, chunk_size):
+                    file.write(json.dumps({"relationships": relationships.type, "rows": chunk}) + "\n")
+                    counts[relationships.type] = counts.get(relationships.type, 0) + len(chunk)
+                logger.info(f"Exported {counts.get(relationships.type, 0)} {relationships.type} relationships.")
+        return counts
+
+    @staticmethod
+    def _import_chunk(tx, query: str, rows: list[dict]):
+        tx.run(query, {"rows": rows}).consume()
+
+    def import_snapshot(self, file: IO[str]) -> tuple[str, dict[str, int]]:
+        """Merges the nodes and relationships of a snapshot into the database, one chunk per transaction.
+
+        Raises:
+            SnapshotError: If the file isn't a snapshot or has a version or chunk this script doesn't know.
+
+        Returns:
+            tuple[str, dict[str, int]]: Name of the repository and the number of nodes of each label and
+                relationships of each type imported.
+        """
+        chunks = read_json_records(file)
+        header = next(chunks, None)
+        if not header or header.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError("The file is not a repository snapshot.")
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Snapshot version {header.get('version')} is not supported.")
+
+        counts = {}
+        with self.driver.session() as session:
+            for chunk in chunks:
+                if "nodes" in chunk and chunk["nodes"] in NODES_BY_LABEL:
+                    name, query = chunk["nodes"], NODES_BY_LABEL[chunk["nodes"]].import_query
+                elif "relationships" in chunk and chunk["relationships"] in RELATIONSHIPS_BY_TYPE:
+                    name = chunk["relationships"]
+                    query = RELATIONSHIPS_BY_TYPE[name].import_query
+                else:
+                    raise SnapshotError(f"Unknown snapshot chunk: {list(chunk)}")
+
+                session.execute_write(self._import_chunk, query, decode_value(chunk["rows"]))
+                counts[name] = counts.get(name, 0) + len(chunk["rows"])
+        # Merging into nodes that already exist only changes their properties.
+        self.bump_graph_version()
+        return header["repository"], counts
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Exports a drilled repository to a snapshot file or imports a snapshot."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Exports the subgraph of a repository.")
+    export_parser.add_argument("repository", help="Name of the drilled repository.")
+    export_parser.add_argument(
+        "--output", help=f"Snapshot file. Defaults to <repository>{SNAPSHOT_EXTENSION}."
+    )
+    export_parser.add_argument("--chunk-size", type=int, default=1000)
+    import_parser = commands.add_parser("import", help="Imports a snapshot.")
+    import_parser.add_argument("snapshot", help="Snapshot file.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    storage = RepositorySnapshotStorage(
+        user=NEO4J_USER, password=NEO4J_PASSWORD, host=NEO4J_HOST, port=NEO4J_PORT or 7687
+    )
+    try:
+        if args.command == "export":
+            path = get_snapshot_path(args.output or get_default_snapshot_name(args.repository))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(path, "wt", encoding="utf-8") as file:
+                storage.export_repository(args.repository, file, args.chunk_size)
+            logger.info(f"Exported {args.repository} to {path}.")
+        else:
+            # Nodes are merged on the indexed properties drilling uses.
+            Neo4jSchemaManager(storage.driver).ensure()
+            with gzip.open(get_snapshot_path(args.snapshot), "rt", encoding="utf-8") as file:
+                repository, counts = storage.import_snapshot(file)
+            logger.info(f"Imported {repository}: {counts}")
+    except SnapshotError as e:
+        logger.error(e)
+        sys.exit(1)
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
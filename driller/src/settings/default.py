@@ -15,6 +15,17 @@ RABBITMQ_PORT = os.environ.get("RABBITMQ_PORT")
 RABBITMQ_QUEUE = os.environ.get("RABBITMQ_QUEUE")
 RABBITMQ_USER = os.environ.get("RABBITMQ_USER")
 RABBITMQ_PASSWORD = os.environ.get("RABBITMQ_PASSWORD")
+# Comma seperated list of the repository size classes (small, medium, large) this worker drills.
+RABBITMQ_QUEUE_SIZE_CLASSES = [
+    c.strip()
+    for c in os.environ.get("RABBITMQ_QUEUE_SIZE_CLASSES", "small,medium,large").split(",")
+    if c.strip()
+]
+
+# Seconds between the heartbeats a worker sends to the backend.
+WORKER_HEARTBEAT_INTERVAL = int(os.environ.get("WORKER_HEARTBEAT_INTERVAL", 30))
+# Identifies the worker to the backend. Generated from the host name and process id when not set.
+WORKER_ID = os.environ.get("WORKER_ID")
 
 NEO4J_LOG_LEVEL = logging.getLevelName(os.environ.get("NEO4J_LOG_LEVEL", LOG_LEVEL))
 NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
@@ -28,10 +39,25 @@ try:
 except ValueError:
     raise ValueError("NEO4J_DEFAULT_BATCH_SIZE must be an integer.")
 
+# Seconds a worker waits for new indexes to come online before drilling without them.
+NEO4J_SCHEMA_TIMEOUT = float(os.environ.get("NEO4J_SCHEMA_TIMEOUT", 60))
+
 LOG_LEVEL = logging.getLevelName(LOG_LEVEL)
 
 REPO_CLONE_LOCATION = os.environ.get("REPO_CLONE_LOCATION", "/tmp/repos")
 
+# Where repository snapshots are exported to and imported from. In the Neo4j import volume when run with docker.
+SNAPSHOT_LOCATION = os.environ.get("SNAPSHOT_LOCATION", "/tmp/snapshots")
+
+# Minimum seconds between the progress updates sent for a drill job.
+DRILL_PROGRESS_INTERVAL = float(os.environ.get("DRILL_PROGRESS_INTERVAL", 5))
+
+# Skip drilling repositories whose branches, tags and config haven't changed since they were last drilled.
+DRILL_CACHE = os.environ.get("DRILL_CACHE", "true").lower() == "true"
+
+# Add the drilled commits to the precomputed activity, churn and contribution aggregates of the repository.
+DRILL_AGGREGATES = os.environ.get("DRILL_AGGREGATES", "true").lower() == "true"
+
 # To replace the storage class, driller class or worker class that is used, replace the following
 # strings with the location of the replacement class. This allows you to add custom functionality
 DEFAULT_CONFIGS = {
@@ -0,0 +1,161 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from src.cloner import estimate_repository_size
+from src.drillers.driller import DrillCancelled
+
+from common.models.driller_config import PROGRESS_STATUS, SingleDrillConfig
+
+logger = logging.getLogger(__name__)
+
+
+class BatchDrillScheduler:
+    """Drills a batch of repositories on a single worker.
+
+    Compared to processing every repository as a separate job this:
+    - Orders the jobs by the size of any existing clone so that the largest repositories start first.
+    - Clones the next repository in a background thread while the current one is being drilled.
+    - Reuses a single storage instance (and its connection) for every job in the batch.
+    - Skips the jobs whose fingerprint matches the last drill of the repository in the storage, without cloning them.
+
+    The status of each job is reported with `on_status(job_id, status, message, **data)` as it starts and finishes.
+    Jobs that are cancelled before they start are skipped and a running job stops when it's cancelled.
+    """
+
+    def __init__(
+        self,
+        worker,
+        jobs: list[SingleDrillConfig],
+        on_status: Callable[..., None],
+    ):
+        """
+        Args:
+            worker (QueueRepositoryNeo4jDrillerWorker): Worker that provides the clone, storage and drill steps.
+            jobs (list[SingleDrillConfig]): Drill jobs to complete.
+            on_status (Callable): Called with `(job_id, status, message, **data)` whenever a job's status changes.
+        """
+        self.worker = worker
+        self.jobs = jobs
+        self.on_status = on_status
+        # Used by the clone thread to look up cached drills, apart from the storage the drills are written to.
+        self.lookup_storage = None
+
+    def estimate_size(self, job: SingleDrillConfig) -> int:
+        """Estimates the size of the repository for a job. Repositories that aren't cloned yet are 0."""
+        return estimate_repository_size(self.worker.get_repository_path(job.repository))
+
+    def order_jobs(self) -> list[SingleDrillConfig]:
+        """Returns the jobs ordered from largest to smallest repository.
+        Jobs with the same size keep the order they were given in.
+        """
+        return sorted(self.jobs, key=self.estimate_size, reverse=True)
+
+    def prepare_job(self, job: SingleDrillConfig) -> tuple[str | None, object | None, str | None]:
+        """Fingerprints the job and checks for a cached drill before cloning, so cached jobs are never cloned.
+
+        Returns:
+            tuple: The fingerprint, the cached `DrillResult` or None, and the path of the repository clone,
+                   which is None when the drill is cached.
+        """
+        fingerprint = self.worker.get_fingerprint(job)
+        if fingerprint is not None:
+            if self.lookup_storage is None:
+                self.lookup_storage = self.worker.create_storage()
+            cached = self.worker.find_cached_drill(job, fingerprint, self.lookup_storage)
+            if cached is not None:
+                return fingerprint, cached, None
+        return fingerprint, None, self.worker.prepare_repository(job)
+
+    def run(self):
+        """Drills all of the jobs in the batch. Failure of one job doesn't stop the others."""
+        jobs = self.order_jobs()
+        if not jobs:
+            return
+
+        storage = None
+        with ThreadPoolExecutor(max_workers=1) as clone_executor:
+            next_clone: Future = clone_executor.submit(self.prepare_job, jobs[0])
+            for index, job in enumerate(jobs):
+                current_clone = next_clone
+                if index + 1 < len(jobs):
+                    # Start cloning the next repository while this one is drilled.
+                    next_clone = clone_executor.submit(
+                        self.prepare_job, jobs[index + 1]
+                    )
+
+                if self.worker.is_cancelled(job.job_id):
+                    self.on_status(job.job_id, "cancelled", "Drilling cancelled.")
+                    continue
+
+                self.on_status(job.job_id, "started", "Drilling started.")
+                try:
+                    fingerprint, cached, repo_path = current_clone.result()
+                    if cached is not None:
+                        self.on_status(
+                            job.job_id,
+                            "complete",
+                            "Drilling complete (cached).",
+                            commit_count=cached.commit_count,
+                            cached=True,
+                        )
+                        continue
+
+                    if storage is None:
+                        storage = self.worker.create_storage()
+
+                    commit_count = self.worker.drill(
+                        job.repository,
+                        repo_path,
+                        storage,
+                        on_progress=self.create_progress_callback(job),
+                        should_stop=lambda job_id=job.job_id: self.worker.is_cancelled(job_id),
+                    )
+                    self.worker.aggregate_repository(job, storage)
+                    if fingerprint is not None:
+                        storage.store_fingerprint(
+                            job.repository.name, fingerprint, commit_count
+                        )
+                    storage.flush()
+                    self.worker.cleanup_repository(job.repository, repo_path)
+
+                    self.on_status(
+                        job.job_id,
+                        "complete",
+                        "Drilling complete.",
+                        commit_count=commit_count,
+                    )
+                    logger.info(f"Drill Job Complete: {job.repository.name}")
+                except DrillCancelled:
+                    # Drop the queries of the cancelled job so they aren't written with the next job.
+                    storage.discard()
+                    self.on_status(job.job_id, "cancelled", "Drilling cancelled.")
+                    logger.info(f"Drill Job Cancelled: {job.repository.name}")
+                except LookupError:
+                    self.on_status(
+                        job.job_id, "failed", "Repository not found on remote host."
+                    )
+                except Exception as e:
+                    logger.exception(e)
+                    logger.error(f"Drill Job Failed: {job.repository.name}")
+                    self.on_status(job.job_id, "failed", f"Drilling failed: {str(e)}")
+
+                    # The storage may hold queries from the failed job, start the next job with a fresh one.
+                    storage = self._close_storage(storage)
+
+        self._close_storage(storage)
+        self.lookup_storage = self._close_storage(self.lookup_storage)
+
+    def create_progress_callback(self, job: SingleDrillConfig):
+        def on_progress(progress: dict):
+            self.on_status(job.job_id, PROGRESS_STATUS, "", progress=progress)
+
+        return on_progress
+
+    def _close_storage(self, storage):
+        if storage is not None:
+            try:
+                storage.close()
+            except Exception as e:
+                logger.exception(e)
+        return None
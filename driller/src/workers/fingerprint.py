@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import os
+
+from git import Git
+
+from common.models.driller_config import RepositoryConfig, SingleDrillConfig
+
+logger = logging.getLogger(__name__)
+
+# A fingerprint identifies the result of a drill: the repository config with the defaults applied and the
+# branches and tags of the repository at the time. When the storage already holds a drill with the same
+# fingerprint the job doesn't need to be drilled again.
+
+# Increment when the data written for a drill changes so that existing fingerprints no longer match.
+FINGERPRINT_VERSION = 3
+
+# Don't change what is drilled, so they are left out of the fingerprint.
+IGNORED_FIELDS = {"delete_clone", "size_class"}
+
+
+def get_repository_refs(source: str) -> list[str]:
+    """Lists the branches and tags of a repository with `git ls-remote`.
+
+    Args:
+        source (str): Url of the remote repository or path of a local clone.
+
+    Returns:
+        list[str]: Sorted `<sha> <ref>` lines.
+    """
+    output = Git().ls_remote("--heads", "--tags", source)
+    return sorted(" ".join(line.split()) for line in output.splitlines() if line.strip())
+
+
+def get_effective_repository(drill_config: SingleDrillConfig) -> RepositoryConfig:
+    """Copy of the repository config with the defaults applied. The job's config isn't changed."""
+    repository = drill_config.repository.model_copy(deep=True)
+    if drill_config.defaults:
+        repository.apply_defaults(drill_config.defaults)
+    return repository
+
+
+def compute_fingerprint(repository: RepositoryConfig, refs: list[str]) -> str:
+    """Hashes the repository config and refs into a fingerprint."""
+    data = {
+        "version": FINGERPRINT_VERSION,
+        "repository": repository.model_dump(mode="json", exclude=IGNORED_FIELDS),
+        "refs": refs,
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def fingerprint_drill(drill_config: SingleDrillConfig, repo_path: str) -> str | None:
+    """Computes the fingerprint of a drill job without cloning the repository.
+
+    The refs are always read from the remote when the repository has a url, whether or not there is a clone.
+    A clone only has a local branch for the branches that were checked out, so its refs wouldn't match the
+    fingerprint of the first drill. Repositories without a url are fingerprinted from `repo_path`.
+
+    Shards aren't fingerprinted. They only drill part of the repository while the fingerprint is stored on the
+    repository, so each shard would overwrite the fingerprint of the last.
+
+    Returns:
+        str | None: The fingerprint, or None when the job is a shard or the refs can't be read.
+    """
+    if not drill_config.aggregate:
+        return None
+    repository = get_effective_repository(drill_config)
+    source = repository.url
+    if source is None:
+        if not os.path.exists(repo_path):
+            return None
+        source = repo_path
+    try:
+        refs = get_repository_refs(source)
+    except Exception as e:
+        logger.warning(f"Could not list the refs of {repository.name}: {e}")
+        return None
+    if not refs:
+        return None
+    return compute_fingerprint(repository, refs)
@@ -1,23 +1,45 @@
 import json
 import logging
+from dataclasses import dataclass
 
 import aio_pika
 from pydantic import ValidationError
 
 from src.cloner import clone_repository, remove_repository_clone
 
-from src.drillers.driller import RepositoryDriller
+from src.drillers.driller import DrillCancelled, RepositoryDriller
 
+from src.drillers.progress import DrillProgress
 from src.settings.default import (
+    DRILL_AGGREGATES,
+    DRILL_CACHE,
+    DRILL_PROGRESS_INTERVAL,
     REPO_CLONE_LOCATION,
 )
+from .batch_scheduler import BatchDrillScheduler
+from .fingerprint import fingerprint_drill
 from .queue_worker import QueueWorker
-
-from common.models.driller_config import SingleDrillConfig, RepositoryConfig
+from .shard_planner import count_commits, plan_shards
+
+from common.models.driller_config import (
+    BATCH_DRILL_MESSAGE_TYPE,
+    PROGRESS_STATUS,
+    BatchDrillConfig,
+    SingleDrillConfig,
+    RepositoryConfig,
+    SizeClass,
+)
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class DrillResult:
+    commit_count: int | None
+    # True when the drill was skipped because the storage already held it.
+    cached: bool = False
+
+
 class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
 
     def __init__(
@@ -32,8 +54,31 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
         driller_args: dict = {},
         storage_args: dict = {},
         clone_location: str = REPO_CLONE_LOCATION,
+        size_classes: list[SizeClass] = list(SizeClass),
+        drill_cache: bool = DRILL_CACHE,
+        aggregate: bool = DRILL_AGGREGATES,
+        **kwargs,
     ):
-        super().__init__(host, port, user, password, queue_name)
+        """
+        Args:
+            size_classes (list[SizeClass], optional): Size classes of repository that this worker drills.
+                Jobs without a size class (sent directly to `queue_name`) are always consumed.
+            drill_cache (bool, optional): Whether to skip drills whose fingerprint matches the last complete
+                drill of the repository in the storage.
+            aggregate (bool, optional): Whether to add the drilled commits to the aggregates in the storage.
+            **kwargs: Passed on to `QueueWorker`. Eg. `heartbeat_interval` and `worker_id`.
+        """
+        super().__init__(
+            host,
+            port,
+            user,
+            password,
+            queue_name,
+            additional_queue_names=[
+                size_class.queue_name(queue_name) for size_class in size_classes
+            ],
+            **kwargs,
+        )
 
         self.driller_class = driller_class
         self.driller_args = driller_args
@@ -41,6 +86,8 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
         self.storage_args = storage_args
 
         self.clone_location = clone_location
+        self.drill_cache = drill_cache
+        self.aggregate = aggregate
 
     def apply_defaults(self, defaults: dict, repository: dict):
         for key, value in defaults.items():
@@ -48,59 +95,186 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
                 repository[key] = value
         return repository
 
-    def execute_drill_job(self, drill_config: SingleDrillConfig):
+    def get_repository_path(self, repository: RepositoryConfig) -> str:
+        """Path to clone or find repo based on location where repo clones are stored in container."""
+        return f"{self.clone_location}/{repository.name}"
+
+    def prepare_repository(self, drill_config: SingleDrillConfig) -> str:
+        """Applies the defaults to the repository config and clones the repository if needed.
+
+        Raises:
+            LookupError: When repository can't be cloned
+
+        Returns:
+            str: Path to the repository clone.
+        """
+        # Apply defaults to the repository config
+        repository: RepositoryConfig = drill_config.repository
+        if drill_config.defaults:
+            repository.apply_defaults(drill_config.defaults)
+
+        repo_path = self.get_repository_path(repository)
+
+        # Clone Repository if url exists. Throws `LookupError` if problem cloning repo.
+        if repository.url is not None:
+            clone_repository(
+                repository_url=repository.url, repository_location=repo_path
+            )
+            logger.debug(f"Cloned Repository {repository.name} to `{repo_path}`")
+
+        return repo_path
+
+    def create_storage(self):
+        """Instantiate the storage class where the drilled data will be written to."""
+        return self.storage_class(**self.storage_args)
+
+    def get_fingerprint(self, drill_config: SingleDrillConfig) -> str | None:
+        """Fingerprints the drill job from its config and the refs of the repository.
+
+        Returns:
+            str | None: The fingerprint, None when caching is disabled, the job is a shard or the refs can't be read.
+        """
+        if not self.drill_cache:
+            return None
+        return fingerprint_drill(
+            drill_config, self.get_repository_path(drill_config.repository)
+        )
+
+    def find_cached_drill(
+        self, drill_config: SingleDrillConfig, fingerprint: str | None, storage
+    ) -> DrillResult | None:
+        """Checks whether the storage already holds a drill with the same fingerprint."""
+        if fingerprint is None:
+            return None
+        cached = storage.get_fingerprint(drill_config.repository.name)
+        if cached is None or cached[0] != fingerprint:
+            return None
+        logger.info(f"Drill of {drill_config.repository.name} is cached, skipping.")
+        return DrillResult(commit_count=cached[1], cached=True)
+
+    def aggregate_repository(self, drill_config: SingleDrillConfig, storage):
+        """Adds the drilled commits to the aggregates of the repository, unless the job is a shard."""
+        if self.aggregate and drill_config.aggregate:
+            storage.aggregate_repository(drill_config.repository.name)
+
+    def create_progress(
+        self, repository: RepositoryConfig, repo_path: str, storage, on_progress
+    ) -> DrillProgress:
+        """Creates the progress tracker for a drill with the total estimated from the repository clone."""
+        try:
+            total = count_commits(repo_path, repository.pydriller)
+        except Exception as e:
+            logger.warning(f"Could not count the commits of {repository.name}: {e}")
+            total = None
+        return DrillProgress(
+            on_progress, total=total, interval=DRILL_PROGRESS_INTERVAL, storage=storage
+        )
+
+    def drill(
+        self,
+        repository: RepositoryConfig,
+        repo_path: str,
+        storage,
+        on_progress=None,
+        should_stop=None,
+    ) -> int:
+        """Drills the repository at `repo_path` and writes the data to the storage.
+
+        Args:
+            on_progress (Callable, optional): Called with a progress report every `DRILL_PROGRESS_INTERVAL` seconds.
+            should_stop (Callable, optional): Checked between commits, the drill stops when it returns True.
+
+        Raises:
+            DrillCancelled: When `should_stop` returned True.
+
+        Returns:
+            int: Number of commits traversed.
+        """
+        driller: RepositoryDriller = self.driller_class(
+            repository_path=repo_path,
+            storage=storage,
+            config=repository,
+            **self.driller_args,
+        )
+
+        progress = None
+        if on_progress is not None:
+            progress = self.create_progress(repository, repo_path, storage, on_progress)
+
+        driller.drill_repository()
+        return driller.drill_commits(
+            filters=repository.filters,
+            pydriller_filters=repository.pydriller,
+            progress=progress,
+            should_stop=should_stop,
+        )
+
+    def cleanup_repository(self, repository: RepositoryConfig, repo_path: str):
+        """Removes the repository clone if the config requests it."""
+        if repository.delete_clone:
+            remove_repository_clone(repo_path)
+
+    def execute_drill_job(self, drill_config: SingleDrillConfig, on_progress=None):
         """Uses the storage and repository driller passed as parameters to class to perform drilling.
         Clones repository if needed.
 
         Args:
             drill_config (SingleDrillConfig): COnfiguration that defines the drill job.
+            on_progress (Callable, optional): Called with progress reports during the drill.
 
         Raises:
             LookupError: When repository can't be cloned
+            DrillCancelled: When the job was cancelled during the drill.
             Exception:
+
+        Returns:
+            DrillResult: Number of commits traversed and whether the drill was skipped.
         """
         storage = None
         try:
-            # Apply defaults to the repository config
-            repository: RepositoryConfig = drill_config.repository
-            if drill_config.defaults:
-                repository.apply_defaults(drill_config.defaults)
-
-            # Set path to clone or find repo based on location where repo clones are stored in container.
-            repo_path = f"{self.clone_location}/{repository.name}"
-
-            # Clone Repository if url exists. Throws `LookupError` if problem cloning repo.
-            if repository.url is not None:
-                clone_repository(
-                    repository_url=repository.url, repository_location=repo_path
-                )
-                logger.debug(f"Cloned Repository {repository.name} to `{repo_path}`")
+            # Checked before cloning since that is often the slowest part of a drill.
+            fingerprint = self.get_fingerprint(drill_config)
 
-            # Instantiate the storage class where the drilled data will be written to.
-            storage = self.storage_class(**self.storage_args)
+            storage = self.create_storage()
 
-            # Instantiate the driller class. Drills the repository and writes the data to the storage class.
-            driller: RepositoryDriller = self.driller_class(
-                repository_path=repo_path,
-                storage=storage,
-                config=repository,
-                **self.driller_args,
-            )
+            cached = self.find_cached_drill(drill_config, fingerprint, storage)
+            if cached is not None:
+                storage.close()
+                return cached
+
+            repo_path = self.prepare_repository(drill_config)
 
             # Preform the drill job.
-            driller.drill_repository()
-            driller.drill_commits(
-                filters=repository.filters,
-                pydriller_filters=repository.pydriller,
+            commit_count = self.drill(
+                drill_config.repository,
+                repo_path,
+                storage,
+                on_progress,
+                should_stop=lambda: self.is_cancelled(drill_config.job_id),
             )
+            # Before the fingerprint so that a failed aggregation is retried by the next drill.
+            self.aggregate_repository(drill_config, storage)
+            if fingerprint is not None:
+                storage.store_fingerprint(
+                    drill_config.repository.name, fingerprint, commit_count
+                )
 
             # Cleanup
             storage.close()
 
-            if repository.delete_clone:
-                remove_repository_clone(repo_path)
+            self.cleanup_repository(drill_config.repository, repo_path)
+
+            return DrillResult(commit_count=commit_count)
 
         except LookupError as e:
+            if storage is not None:
+                storage.close()
+            raise e
+        except DrillCancelled as e:
+            # Nothing more is written for a cancelled job.
+            storage.discard()
+            storage.close()
+            self.cleanup_repository(drill_config.repository, repo_path)
             raise e
         except Exception as e:
             logger.exception(e)
@@ -108,6 +282,79 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
                 storage.close()
             raise e
 
+    def execute_shard_plan(
+        self, drill_config: SingleDrillConfig
+    ) -> list[SingleDrillConfig]:
+        """Clones the repository and splits the drill job into shards that can be drilled in parallel.
+
+        Raises:
+            LookupError: When repository can't be cloned
+
+        Returns:
+            list[SingleDrillConfig]: Drill config for each shard.
+        """
+        repo_path = self.prepare_repository(drill_config)
+        return plan_shards(drill_config, repo_path)
+
+    def execute_stitch_job(self, drill_config: SingleDrillConfig):
+        """Stitches together the shards of a repository once they have all been drilled."""
+        repository = drill_config.repository
+        if drill_config.defaults:
+            repository.apply_defaults(drill_config.defaults)
+
+        storage = self.create_storage()
+        try:
+            storage.stitch_repository(repository.name)
+            self.aggregate_repository(drill_config, storage)
+        finally:
+            storage.close()
+
+        self.cleanup_repository(repository, self.get_repository_path(repository))
+
+    def execute_batch_drill_job(
+        self, body: str, message: aio_pika.abc.AbstractIncomingMessage
+    ):
+        """Drills every job in a `BatchDrillConfig` with a `BatchDrillScheduler`.
+        The status of each job is sent as a response as soon as it changes.
+
+        Raises:
+            ValidationError: Thrown when the config received does not match the schema.
+        """
+        batch = BatchDrillConfig.model_validate_json(body)
+        logger.info(f"Starting Batch Drill Job of {len(batch.jobs)} repositories")
+
+        def on_status(job_id, status, status_message, **data):
+            self.send_response_threadsafe(
+                message,
+                json.dumps(
+                    self.create_response(job_id, status_message, status, **data)
+                ),
+            )
+            if status in ("complete", "failed", "cancelled"):
+                self.active_job_ids.discard(job_id)
+
+        self.active_job_ids.update(job.job_id for job in batch.jobs)
+        try:
+            BatchDrillScheduler(self, batch.jobs, on_status).run()
+        finally:
+            self.active_job_ids.difference_update(job.job_id for job in batch.jobs)
+
+    def create_progress_callback(
+        self, job_id, message: aio_pika.abc.AbstractIncomingMessage
+    ):
+        """Creates a callback that sends progress reports for the job as `progress` responses.
+        Called from the drilling thread."""
+
+        def on_progress(progress: dict):
+            self.send_response_threadsafe(
+                message,
+                json.dumps(
+                    self.create_response(job_id, "", PROGRESS_STATUS, progress=progress)
+                ),
+            )
+
+        return on_progress
+
     def parse_message(self, message: str) -> SingleDrillConfig:
         """Parses the incoming message string to a SingleDrillerConfig model.
 
@@ -124,6 +371,17 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
             logger.exception(e)
             raise e
 
+    def get_job_ids(
+        self, job_body, message: aio_pika.abc.AbstractIncomingMessage
+    ) -> list[int]:
+        """Ids of the jobs in a drill or batch message. Invalid configs have none, `on_request` reports them."""
+        try:
+            if message.type == BATCH_DRILL_MESSAGE_TYPE:
+                return [job.job_id for job in BatchDrillConfig.model_validate_json(job_body).jobs]
+            return [SingleDrillConfig.model_validate_json(job_body).job_id]
+        except ValidationError:
+            return []
+
     async def on_before_start_job(
         self, job_body, message: aio_pika.abc.AbstractIncomingMessage
     ):
@@ -136,37 +394,45 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
         if message.reply_to is None:
             raise ValueError("Message must contain a `reply_to` field.")
 
+        if message.type == BATCH_DRILL_MESSAGE_TYPE:
+            # Each job in a batch reports it's own start.
+            return
+
         drill_config = self.parse_message(job_body)
+        if self.is_cancelled(drill_config.job_id):
+            # `on_request` reports the cancellation instead.
+            return
 
         await self.exchange.publish(
             aio_pika.Message(
                 body=json.dumps(
-                    {
-                        "status": "started",
-                        "job_id": drill_config.job_id,
-                        "message": "Drilling started.",
-                    }
+                    self.create_response(
+                        drill_config.job_id, "Drilling started.", "started"
+                    )
                 ).encode(),
                 correlation_id=message.correlation_id,
             ),
             routing_key=message.reply_to,
         )
 
-    def create_response(self, job_id, message, status):
+    def create_response(self, job_id, message, status, **data):
         """Creates the standard response that is used for this driller.
 
         Args:
             job_id (int): Some id to identify the job
             message (str): Response message
-            status (str): Response status (complete, started, failed)
+            status (str): Response status (complete, started, failed, cancelled)
+            **data: Additional values to include in the response. Eg. `commit_count`
 
         Returns:
             dict: response dictionary
         """
         return {
+            **data,
             "status": status,
             "job_id": job_id,
             "message": message,
+            "worker_id": self.worker_id,
         }
 
     def create_error_response(self, job_id, message):
@@ -183,23 +449,68 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
             message (AbstractIncomingMessage): AIO Pika message used for sending responses.
 
         Returns:
-            str: json string to send as a response
+            str: json string to send as a response. Empty for batches since each job in the batch
+                 sends it's own responses.
         """
 
+        if message.type == BATCH_DRILL_MESSAGE_TYPE:
+            try:
+                self.execute_batch_drill_job(body, message)
+            except ValidationError:
+                return json.dumps(
+                    self.create_error_response(None, "Drill config invalid.")
+                )
+            return ""
+
         job_id = None
         drill_config: SingleDrillConfig | None = None
         response = {}
         try:
             drill_config = self.parse_message(body)
             job_id = drill_config.job_id
+            self.active_job_ids.add(job_id)
+
+            if self.is_cancelled(job_id):
+                logger.info(f"Skipping Cancelled Job: {drill_config.repository.name}")
+                response = self.create_response(job_id, "Drilling cancelled.", "cancelled")
+            elif drill_config.stitch:
+                logger.info(f"Starting Stitch Job: {drill_config.repository.name}")
+
+                self.execute_stitch_job(drill_config)
 
-            logger.info(f"Starting Drill Job: {drill_config.repository.name}")
+                response = self.create_response(job_id, "Shards stitched.", "complete")
+            elif drill_config.shards is not None and drill_config.shards > 1:
+                logger.info(f"Sharding Drill Job: {drill_config.repository.name}")
 
-            self.execute_drill_job(drill_config)
+                shard_configs = self.execute_shard_plan(drill_config)
 
-            response = self.create_response(job_id, "Drilling complete.", "complete")
-            logger.info(f"Drill Job Complete: {drill_config.repository.name}")
+                # The backend creates a job for each shard, the job stays started until they are done.
+                response = self.create_response(
+                    job_id,
+                    f"Split into {len(shard_configs)} shards.",
+                    "started",
+                    shards=[c.model_dump(mode="json") for c in shard_configs],
+                )
+            else:
+                logger.info(f"Starting Drill Job: {drill_config.repository.name}")
+
+                result = self.execute_drill_job(
+                    drill_config,
+                    on_progress=self.create_progress_callback(job_id, message),
+                )
+
+                response = self.create_response(
+                    job_id,
+                    "Drilling complete (cached)." if result.cached else "Drilling complete.",
+                    "complete",
+                    commit_count=result.commit_count,
+                    cached=result.cached,
+                )
+                logger.info(f"Drill Job Complete: {drill_config.repository.name}")
 
+        except DrillCancelled:
+            logger.info(f"Drill Job Cancelled: {drill_config.repository.name}")
+            response = self.create_response(job_id, "Drilling cancelled.", "cancelled")
         except LookupError:
             response = self.create_error_response(
                 job_id, "Repository not found on remote host."
@@ -213,4 +524,6 @@ class QueueRepositoryNeo4jDrillerWorker(QueueWorker):
             else:
                 logger.error(f"Drill Job Failed: {drill_config.repository.name}")
             response = self.create_error_response(job_id, f"Drilling failed: {str(e)}")
+        finally:
+            self.active_job_ids.discard(job_id)
         return json.dumps(response)
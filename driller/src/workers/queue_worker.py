@@ -1,8 +1,16 @@
 import asyncio
 import logging
+import os
+import socket
+import uuid
 from abc import ABC, abstractmethod
+from collections import deque
 
 import aio_pika
+from pydantic import ValidationError
+
+from common.models.driller_config import CANCEL_EXCHANGE, CancelMessage
+from common.models.workers import HEARTBEAT_QUEUE, WorkerHeartbeat, WorkerState
 
 logger = logging.getLogger(__name__)
 
@@ -20,39 +28,98 @@ class Worker(ABC):
 
 
 class QueueWorker(Worker):
+    """Takes jobs from RabbitMQ queues one at a time and processes them with `on_request` in a thread.
+
+    A job message is acknowledged as soon as the job has started, so long jobs aren't redelivered by
+    RabbitMQ's consumer timeout. Instead the worker sends heartbeats listing its jobs to the backend, which
+    requeues them if the worker stops sending heartbeats. The message is only acknowledged once the started
+    status and a heartbeat listing the job have been published, so a job is never left with neither.
+
+    Cancellations are received from a fanout exchange by every worker. Jobs check `is_cancelled` while they
+    run and stop themselves.
+    """
 
-    def __init__(self, host, port, user, password, queue_name, heartbeat_interval=30):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        queue_name,
+        heartbeat_interval=30,
+        additional_queue_names: list[str] = [],
+        worker_id: str | None = None,
+        poll_interval: float = 1.0,
+        max_cancelled: int = 10000,
+    ):
+        """
+        Args:
+            queue_name (str): Name of the queue that jobs are consumed from.
+            heartbeat_interval (int, optional): Seconds between the heartbeats sent to the backend.
+            additional_queue_names (list[str], optional): Other queues that jobs are consumed from.
+            worker_id (str, optional): Identifies the worker in heartbeats. Unique per process by default.
+            poll_interval (float, optional): Seconds to wait before checking the queues again when they're empty.
+            max_cancelled (int, optional): Cancelled job ids remembered. The oldest are forgotten first.
+        """
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.queue_name = queue_name
+        self.additional_queue_names = additional_queue_names
+        self.queues: list[aio_pika.abc.AbstractQueue] = []
+        self.closed = asyncio.Event()
 
         self.connection = None
         self.channel = None
+        self.loop: asyncio.AbstractEventLoop | None = None
 
         self.heartbeat_interval = heartbeat_interval
         self.heartbeat_task = None
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval
+        # Ids of the jobs this worker is responsible for. Reported in the heartbeats.
+        self.active_job_ids: set[int] = set()
+        # Cancelled jobs, including those this worker hasn't taken yet. The deque keeps the set bounded.
+        self.cancelled_job_ids: set[int] = set()
+        self.cancelled_order: deque[int] = deque()
+        self.max_cancelled = max_cancelled
 
     async def connect(self):
 
         try:
-            # Perform connection
-            self.connection = await aio_pika.connect(
-                f"amqp://{self.password}:{self.user}@{self.host}:{self.port}/"
+            # Perform connection. Reconnects by itself and restores the channel, queues and consumers.
+            self.connection = await aio_pika.connect_robust(
+                f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
             )
 
             # Creating a channel
             self.channel = await self.connection.channel()
 
             # Setting prefetch count to 1 ensures that work is distrubuted evenly.
-            await self.channel.set_qos(prefetch_count=1)
+            # Global so the limit is shared between the consumers of every queue on the channel.
+            await self.channel.set_qos(prefetch_count=1, global_=True)
             self.exchange = self.channel.default_exchange
+            await self.channel.declare_queue(HEARTBEAT_QUEUE)
 
-            # Declaring queue
+            # Declaring queues
             self.queue = await self.channel.declare_queue(
                 self.queue_name,
             )
+            self.queues = [self.queue]
+            for queue_name in self.additional_queue_names:
+                self.queues.append(await self.channel.declare_queue(queue_name))
+
+            # Each worker has it's own queue bound to the cancellations exchange, removed when it disconnects.
+            # Named after the worker so it can be declared again after a reconnect.
+            cancel_exchange = await self.channel.declare_exchange(
+                CANCEL_EXCHANGE, aio_pika.ExchangeType.FANOUT
+            )
+            cancel_queue = await self.channel.declare_queue(
+                f"{CANCEL_EXCHANGE}.{self.worker_id}", exclusive=True, auto_delete=True
+            )
+            await cancel_queue.bind(cancel_exchange)
+            await cancel_queue.consume(self.on_cancel, no_ack=True)
             logger.info("Connected to amqp...")
         except Exception as e:
             logger.exception("Could not connect to message queue.", e)
@@ -87,6 +154,23 @@ class QueueWorker(Worker):
             routing_key=message.reply_to,
         )
 
+    def send_response_threadsafe(
+        self, message: aio_pika.abc.AbstractIncomingMessage, response: str
+    ):
+        """Sends a response from the executor thread that `on_request` runs in.
+        Blocks until the response has been published on the worker's event loop.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.send_response(message, response), self.loop
+        )
+        return future.result()
+
+    def get_job_ids(
+        self, job_body, message: aio_pika.abc.AbstractIncomingMessage
+    ) -> list[int]:
+        """Ids of the jobs in a message, listed in the heartbeats from before the message is acknowledged."""
+        return []
+
     async def on_before_start_job(
         self, job_body, message: aio_pika.abc.AbstractIncomingMessage
     ):
@@ -99,6 +183,10 @@ class QueueWorker(Worker):
             raise ValueError("Message must contain a `reply_to` field.")
         logger.debug("Request complete")
 
+        if not job_response:
+            # Responses were already sent while the job was running.
+            return
+
         await self.exchange.publish(
             aio_pika.Message(
                 body=job_response.encode(),
@@ -112,51 +200,127 @@ class QueueWorker(Worker):
     ):
         logger.exception("Job failed: %s", exception)
 
-    async def consume_jobs(self):
+    async def on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        try:
+            assert message.reply_to is not None
+
+            body = message.body.decode()
+
+            await self.handle_request(body, message)
+        except Exception as e:
+            if not message.processed:
+                await message.reject(requeue=False)
+            await self.on_job_failed(e, message)
+
+    async def on_cancel(self, message: aio_pika.abc.AbstractIncomingMessage):
         try:
-            async with self.queue.iterator() as qiterator:
-                message: aio_pika.abc.AbstractIncomingMessage
-                async for message in qiterator:
-                    try:
-                        async with message.process(requeue=False):
-                            assert message.reply_to is not None
-
-                            body = message.body.decode()
-
-                            await self.handle_request(body, message)
-                    except Exception as e:
-                        await self.on_job_failed(e, message)
-        except aio_pika.exceptions.ChannelInvalidStateError:
-            # Thrown on graceful exit.
+            cancel = CancelMessage.model_validate_json(message.body)
+        except ValidationError as e:
+            logger.error(f"Invalid cancellation: {e}")
             return
+        logger.info(f"Cancelling jobs: {cancel.job_ids}")
+        self.add_cancelled(cancel.job_ids)
+
+    def add_cancelled(self, job_ids: list[int]):
+        for job_id in job_ids:
+            if job_id in self.cancelled_job_ids:
+                continue
+            self.cancelled_job_ids.add(job_id)
+            self.cancelled_order.append(job_id)
+            if len(self.cancelled_order) > self.max_cancelled:
+                self.cancelled_job_ids.discard(self.cancelled_order.popleft())
+
+    def is_cancelled(self, job_id: int | None) -> bool:
+        """Whether the job was cancelled. Safe to call from the executor thread."""
+        return job_id in self.cancelled_job_ids
+
+    async def get_next_message(self) -> aio_pika.abc.AbstractIncomingMessage | None:
+        """Takes a message from the first queue that has one, in the order the queues were declared."""
+        for queue in self.queues:
+            message = await queue.get(no_ack=False, fail=False)
+            if message is not None:
+                return message
+        return None
+
+    async def consume_jobs(self):
+        """Processes jobs one at a time until the worker is closed.
+        Messages are pulled rather than pushed so the worker never holds a message it isn't working on."""
+        while not self.closed.is_set():
+            try:
+                message = await self.get_next_message()
+            except (
+                aio_pika.exceptions.ChannelInvalidStateError,
+                aio_pika.exceptions.AMQPConnectionError,
+            ) as e:
+                if self.closed.is_set():
+                    # Thrown on graceful exit.
+                    return
+                # The connection is being restored, try again after waiting.
+                logger.warning(f"Could not get a message: {e!r}")
+                message = None
+            if message is None:
+                try:
+                    await asyncio.wait_for(self.closed.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.on_message(message)
 
     async def handle_request(self, body, message):
-        loop = asyncio.get_event_loop()
+        self.loop = asyncio.get_running_loop()
 
         await self.on_before_start_job(body, message)
 
-        response = await loop.run_in_executor(None, self.on_request, body, message)
+        job_ids = self.get_job_ids(body, message)
+        self.active_job_ids.update(job_ids)
+        try:
+            # The backend requeues the job if this worker stops sending heartbeats from here on. Publishes are
+            # confirmed by the broker, so the started status and the heartbeat can't be lost after the ack.
+            await self.send_heartbeat()
+            await message.ack()
+
+            response = await self.loop.run_in_executor(
+                None, self.on_request, body, message
+            )
+        finally:
+            self.active_job_ids.difference_update(job_ids)
 
         await self.on_after_finish_job(response, message)
 
         return response
 
-    async def send_heartbeat(self):
-        try:
-            while self.connection is not None:
-                await self.connection.ready()
-                logger.debug("Heartbeat sent")
-
-            await asyncio.sleep(self.heartbeat_interval)
+    def create_heartbeat(self, state: WorkerState = WorkerState.RUNNING) -> WorkerHeartbeat:
+        return WorkerHeartbeat(
+            worker_id=self.worker_id,
+            state=state,
+            queues=[queue.name for queue in self.queues],
+            # Copied first since jobs are added and removed from the executor thread.
+            job_ids=sorted(self.active_job_ids.copy()),
+        )
 
-        except Exception as e:
-            logger.exception("Heartbeat failed: %s", e)
+    async def send_heartbeat(self, state: WorkerState = WorkerState.RUNNING):
+        """Publishes a heartbeat to the backend. Heartbeats expire so they don't pile up while the backend is down."""
+        await self.exchange.publish(
+            aio_pika.Message(
+                body=self.create_heartbeat(state).model_dump_json().encode(),
+                expiration=self.heartbeat_interval,
+            ),
+            routing_key=HEARTBEAT_QUEUE,
+        )
+        logger.debug("Heartbeat sent")
 
     async def heartbeat(self):
-        await asyncio.sleep(self.heartbeat_interval)
-        while self.channel is not None:
-            await self.channel.heartbeat_tick()
-            await asyncio.sleep(self.heartbeat_interval)
+        """Sends a heartbeat every `heartbeat_interval` seconds. Runs on the event loop, which stays free while
+        jobs run in the executor."""
+        while not self.closed.is_set():
+            try:
+                await self.send_heartbeat()
+            except Exception as e:
+                logger.exception("Heartbeat failed: %s", e)
+            try:
+                await asyncio.wait_for(self.closed.wait(), self.heartbeat_interval)
+            except asyncio.TimeoutError:
+                pass
 
     async def start(self):
         await self.connect()
@@ -164,8 +328,14 @@ class QueueWorker(Worker):
         await self.consume_jobs()
 
     async def close(self):
+        self.closed.set()
         if self.heartbeat_task:
             self.heartbeat_task.cancel()
+        if self.channel and not self.channel.is_closed:
+            try:
+                await self.send_heartbeat(WorkerState.STOPPED)
+            except Exception as e:
+                logger.warning(f"Could not send the final heartbeat: {e}")
         if self.channel:
             await self.channel.close()
         if self.connection:
@@ -0,0 +1,156 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from git import Repo
+
+from common.models.driller_config import PydrillerConfig, SingleDrillConfig
+
+logger = logging.getLogger(__name__)
+
+# Splits the drill of a single large repository into date windows that can be drilled in parallel by
+# different workers. Windows contain roughly the same number of commits. Window boundaries are the start of
+# a day in UTC. Windows are half-open, `since <= date < to`, so a commit on a boundary is only in one shard.
+# Git treats `to` as inclusive, so the shard configs end a second before the boundary.
+
+
+def can_shard(pydriller_config: PydrillerConfig | None) -> bool:
+    """Pydriller doesn't allow combining `since`/`to` with commit or tag ranges, so those configs can't be split."""
+    if pydriller_config is None:
+        return True
+    return all(
+        getattr(pydriller_config, field) is None
+        for field in ("from_commit", "to_commit", "from_tag", "to_tag", "only_commits")
+    )
+
+
+def get_git_log_args(
+    pydriller_config: PydrillerConfig | None = None,
+) -> tuple[str, dict]:
+    """Gets the revision and options for `git log` / `git rev-list` that select the commits Pydriller would
+    traverse with the given config."""
+    rev = "HEAD"
+    kwargs = {}
+    if pydriller_config is not None:
+        if pydriller_config.only_in_branch is not None:
+            rev = pydriller_config.only_in_branch
+        if pydriller_config.only_no_merge:
+            kwargs["no_merges"] = True
+        if pydriller_config.since is not None:
+            kwargs["since"] = pydriller_config.since
+        if pydriller_config.to is not None:
+            kwargs["until"] = pydriller_config.to
+    return rev, kwargs
+
+
+def get_commit_timestamps(
+    repo_path: str, pydriller_config: PydrillerConfig | None = None
+) -> list[int]:
+    """Gets the committer timestamp of every commit that Pydriller would traverse with the given config."""
+    rev, kwargs = get_git_log_args(pydriller_config)
+    output = Repo(repo_path).git.log(rev, format="%ct", **kwargs)
+    return [int(line) for line in output.splitlines() if line.strip()]
+
+
+def count_commits(
+    repo_path: str, pydriller_config: PydrillerConfig | None = None
+) -> int:
+    """Counts the commits that Pydriller would traverse with `git rev-list --count`.
+    Commit and tag ranges are ignored, so it's an estimate for those configs."""
+    rev, kwargs = get_git_log_args(pydriller_config)
+    return int(Repo(repo_path).git.rev_list(rev, count=True, **kwargs))
+
+
+def split_into_windows(
+    timestamps: list[int],
+    shards: int,
+    since: datetime | None = None,
+    to: datetime | None = None,
+) -> list[tuple[datetime | None, datetime | None]]:
+    """Splits the time between `since` and `to` into windows that contain a similar number of commits.
+
+    Args:
+        timestamps (list[int]): Commit timestamps.
+        shards (int): Number of windows wanted. Fewer are returned if the commits span too few days.
+        since (datetime, optional): Start of the first window. Naive datetimes are taken as UTC.
+        to (datetime, optional): End of the last window. Naive datetimes are taken as UTC.
+
+    Returns:
+        list[tuple]: `(since, to)` for each window in UTC. The end of a window is the start of the next and
+                     isn't part of it.
+    """
+    timestamps = sorted(timestamps)
+    since = _as_utc(since)
+    to = _as_utc(to)
+    boundaries: list[datetime] = []
+    for shard in range(1, shards):
+        if not timestamps:
+            break
+        day = _start_of_day(timestamps[shard * len(timestamps) // shards])
+        # Skip boundaries that would create a window without any commits.
+        if day <= (boundaries[-1] if boundaries else _start_of_day(timestamps[0])):
+            continue
+        if (since is not None and day <= since) or (to is not None and day >= to):
+            continue
+        boundaries.append(day)
+
+    starts = [since] + boundaries
+    ends = boundaries + [to]
+    return list(zip(starts, ends))
+
+
+def _start_of_day(timestamp: int) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    """Pydriller takes naive datetimes as UTC."""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def plan_shards(
+    drill_config: SingleDrillConfig, repo_path: str
+) -> list[SingleDrillConfig]:
+    """Creates a drill config for each shard of the job. Each config drills one date window of the repository.
+    The repository config must already have the defaults applied.
+    """
+    repository = drill_config.repository
+    pydriller_config = repository.pydriller or PydrillerConfig()
+
+    if not can_shard(repository.pydriller):
+        logger.warning(
+            f"Can't shard {repository.name} because it's drilled by commit or tag range."
+        )
+        windows = [(pydriller_config.since, pydriller_config.to)]
+    else:
+        windows = split_into_windows(
+            get_commit_timestamps(repo_path, pydriller_config),
+            drill_config.shards or 1,
+            since=pydriller_config.since,
+            to=pydriller_config.to,
+        )
+        # The first and last windows keep the `since` and `to` of the job. The others end a second before the
+        # next window starts.
+        starts = [pydriller_config.since] + [since for since, _ in windows[1:]]
+        ends = [to - timedelta(seconds=1) for _, to in windows[:-1]] + [pydriller_config.to]
+        windows = list(zip(starts, ends))
+
+    shard_configs = []
+    for since, to in windows:
+        shard_repository = repository.model_copy(deep=True)
+        # Shards share the clone, it's deleted after the shards are stitched together.
+        shard_repository.delete_clone = False
+        shard_repository.pydriller = pydriller_config.model_copy(
+            update={"since": since, "to": to}
+        )
+        shard_configs.append(
+            SingleDrillConfig(
+                repository=shard_repository,
+                size_class=drill_config.size_class,
+                aggregate=False,
+            )
+        )
+    return shard_configs
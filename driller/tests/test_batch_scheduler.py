@@ -0,0 +1,115 @@
+from unittest.mock import MagicMock, patch
+
+from common.models.driller_config import RepositoryConfig, SingleDrillConfig
+
+from src.drillers.driller import DrillCancelled
+from src.workers.batch_scheduler import BatchDrillScheduler
+
+
+def make_job(job_id, name):
+    return SingleDrillConfig(job_id=job_id, repository=RepositoryConfig(name=name))
+
+
+def make_worker():
+    worker = MagicMock()
+    worker.get_repository_path.side_effect = lambda repository: repository.name
+    worker.prepare_repository.side_effect = lambda job: job.repository.name
+    worker.is_cancelled.return_value = False
+    worker.get_fingerprint.return_value = None
+    worker.find_cached_drill.return_value = None
+    return worker
+
+
+@patch("src.workers.batch_scheduler.estimate_repository_size")
+def test_largest_repositories_drilled_first(mock_size):
+    sizes = {"small": 10, "large": 1000, "medium": 100}
+    mock_size.side_effect = lambda path: sizes[path]
+
+    worker = make_worker()
+    jobs = [make_job(1, "small"), make_job(2, "large"), make_job(3, "medium")]
+
+    scheduler = BatchDrillScheduler(worker, jobs, MagicMock())
+    scheduler.run()
+
+    drilled = [c.args[1] for c in worker.drill.call_args_list]
+    assert drilled == ["large", "medium", "small"]
+
+
+@patch("src.workers.batch_scheduler.estimate_repository_size", return_value=0)
+def test_storage_reused_and_statuses_reported(mock_size):
+    worker = make_worker()
+    jobs = [make_job(1, "a"), make_job(2, "b")]
+    on_status = MagicMock()
+
+    BatchDrillScheduler(worker, jobs, on_status).run()
+
+    worker.create_storage.assert_called_once()
+    worker.create_storage.return_value.close.assert_called_once()
+    assert [c.args[:2] for c in on_status.call_args_list] == [
+        (1, "started"),
+        (1, "complete"),
+        (2, "started"),
+        (2, "complete"),
+    ]
+
+
+@patch("src.workers.batch_scheduler.estimate_repository_size", return_value=0)
+def test_failed_job_does_not_stop_batch(mock_size):
+    worker = make_worker()
+    worker.drill.side_effect = [Exception("Boom"), None]
+    worker.prepare_repository.side_effect = [LookupError(), "b", "c"]
+    jobs = [make_job(1, "a"), make_job(2, "b"), make_job(3, "c")]
+    on_status = MagicMock()
+
+    BatchDrillScheduler(worker, jobs, on_status).run()
+
+    final_statuses = [c.args[:2] for c in on_status.call_args_list if c.args[1] != "started"]
+    assert final_statuses == [(1, "failed"), (2, "failed"), (3, "complete")]
+    # Storage is replaced after the job that failed while drilling.
+    assert worker.create_storage.call_count == 2
+
+
+@patch("src.workers.batch_scheduler.estimate_repository_size", return_value=0)
+def test_cancelled_jobs_stopped_or_skipped(mock_size):
+    worker = make_worker()
+    worker.is_cancelled.side_effect = lambda job_id: job_id == 3
+    worker.drill.side_effect = [DrillCancelled(), None]
+    jobs = [make_job(1, "a"), make_job(2, "b"), make_job(3, "c")]
+    on_status = MagicMock()
+
+    BatchDrillScheduler(worker, jobs, on_status).run()
+
+    assert [c.args[:2] for c in on_status.call_args_list] == [
+        (1, "started"),
+        (1, "cancelled"),
+        (2, "started"),
+        (2, "complete"),
+        (3, "cancelled"),
+    ]
+    # The storage is kept for the next job without the queries of the cancelled one.
+    worker.create_storage.return_value.discard.assert_called_once()
+    worker.create_storage.assert_called_once()
+
+
+@patch("src.workers.batch_scheduler.estimate_repository_size", return_value=0)
+def test_cached_jobs_not_drilled(mock_size):
+    worker = make_worker()
+    worker.get_fingerprint.side_effect = lambda job: f"fingerprint-{job.job_id}"
+    worker.find_cached_drill.side_effect = lambda job, fingerprint, storage: (
+        MagicMock(commit_count=5) if job.job_id == 1 else None
+    )
+    jobs = [make_job(1, "a"), make_job(2, "b")]
+    on_status = MagicMock()
+
+    BatchDrillScheduler(worker, jobs, on_status).run()
+
+    assert [c.args[1] for c in worker.drill.call_args_list] == ["b"]
+    # The cache is checked before cloning.
+    assert [c.args[0].job_id for c in worker.prepare_repository.call_args_list] == [2]
+    assert on_status.call_args_list[1].args == (1, "complete", "Drilling complete (cached).")
+    assert on_status.call_args_list[1].kwargs == {"commit_count": 5, "cached": True}
+    worker.create_storage.return_value.store_fingerprint.assert_called_once_with(
+        "b", "fingerprint-2", worker.drill.return_value
+    )
+    # Cached drills were aggregated when they were drilled.
+    assert [c.args[0].job_id for c in worker.aggregate_repository.call_args_list] == [2]
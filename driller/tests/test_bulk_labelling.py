@@ -0,0 +1,52 @@
+import io
+from unittest.mock import MagicMock, patch
+
+from src.scripts.bulk_labelling import BulkLabellingStorage, parse_labelled_commit
+from src.scripts.dataset_loader import read_csv_records
+
+HASH_A = "a" * 40
+HASH_B = "b" * 40
+
+
+def test_records_validated():
+    assert parse_labelled_commit({"hash": HASH_A.upper(), "labels": "y;x; "}) == {
+        "hash": HASH_A,
+        "labels": ["x", "y"],
+    }
+    assert parse_labelled_commit(
+        {"url": f"https://github.com/o/r/commit/{HASH_B}", "codes": ["saving"]},
+        labels_field="codes",
+    ) == {"hash": HASH_B, "labels": ["saving"]}
+
+    assert parse_labelled_commit({"hash": "not a hash", "labels": ["x"]}) is None
+    assert parse_labelled_commit({"url": "https://github.com/o/r/issues/1", "labels": ["x"]}) is None
+    assert parse_labelled_commit({"hash": HASH_A, "labels": []}) is None
+
+
+@patch("src.drillers.neo4j_storage.GraphDatabase")
+def test_labels_written_in_chunks(mock_graph_database):
+    file = io.StringIO(f"hash,labels\n{HASH_A},x\ninvalid,x\n{HASH_B},y;z\n{HASH_A},z\n")
+    storage = BulkLabellingStorage()
+
+    with patch.object(
+        storage, "store_labels", side_effect=[(1, 2, ["y"]), (1, 2, ["y"])]
+    ) as store_labels:
+        stats = storage.label_commits(read_csv_records(file), chunk_size=2)
+
+    assert [len(c.args[0]) for c in store_labels.call_args_list] == [2, 1]
+    assert (stats.records, stats.invalid, stats.commits, stats.relationships) == (4, 1, 2, 4)
+    assert stats.unknown_labels == {"y"}
+
+
+def test_codes_matched_not_created():
+    tx = MagicMock()
+    tx.run.return_value.single.side_effect = [
+        {"unknown": ["typo"]},
+        {"commits": 1, "relationships": 1},
+    ]
+
+    result = BulkLabellingStorage._store_labels(tx, [{"hash": HASH_A, "labels": ["typo", "x"]}])
+
+    assert result == (1, 1, ["typo"])
+    queries = [c.args[0] for c in tx.run.call_args_list]
+    assert all("MERGE (:Code" not in query for query in queries)
@@ -0,0 +1,67 @@
+import io
+import json
+
+from pydantic import BaseModel
+
+from src.scripts.dataset_loader import (
+    LoadStats,
+    chunked,
+    read_json_records,
+    stream_dataset,
+)
+
+
+class Item(BaseModel):
+    type: str
+    value: int
+
+
+def test_json_array_read_in_parts():
+    records = [{"type": "a", "value": 1}, {"type": "b", "value": [1, 2]}]
+    file = io.StringIO(json.dumps(records, indent=2))
+
+    assert list(read_json_records(file, read_size=7)) == records
+
+
+def test_json_array_number_split_between_parts():
+    file = io.StringIO("[1, 23, 4]")
+
+    assert list(read_json_records(file, read_size=5)) == [1, 23, 4]
+
+
+def test_ndjson_read_in_parts():
+    records = [{"type": "a", "value": 1}, {"type": "b", "value": 2}]
+    file = io.StringIO("\n".join(json.dumps(r) for r in records) + "\n")
+
+    assert list(read_json_records(file, read_size=5)) == records
+
+
+def test_ndjson_read_at_once():
+    records = [{"type": "a", "value": 1}, {"type": "b", "value": 2}]
+    file = io.StringIO("\n".join(json.dumps(r) for r in records))
+
+    assert list(read_json_records(file)) == records
+
+
+def test_dataset_validated_and_filtered(tmp_path):
+    path = tmp_path / "dataset.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"type": "commit", "value": 1},
+                {"type": "issue", "value": 2},
+                {"type": "commit", "value": "not a number"},
+                {"type": "commit", "value": 3},
+            ]
+        )
+    )
+    stats = LoadStats()
+
+    items = stream_dataset(str(path), Item, where=[lambda i: i.type == "commit"], stats=stats)
+
+    assert [item.value for item in items] == [1, 3]
+    assert stats == LoadStats(records=4, invalid=1, filtered=1)
+
+
+def test_chunked():
+    assert list(chunked(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,29 @@
+from unittest.mock import MagicMock, patch
+
+from src.drillers.progress import DrillProgress
+
+
+@patch("src.drillers.progress.time.monotonic")
+def test_progress_reported_once_per_interval(mock_monotonic):
+    mock_monotonic.return_value = 0
+    on_progress = MagicMock()
+    storage = MagicMock(last_flush_seconds=0.5)
+    progress = DrillProgress(on_progress, total=100, interval=5, storage=storage)
+
+    for commits, now in [(1, 1), (2, 4), (3, 5), (4, 6), (5, 10)]:
+        mock_monotonic.return_value = now
+        progress.update(commits)
+
+    assert [c.args[0]["commits"] for c in on_progress.call_args_list] == [3, 5]
+    assert on_progress.call_args_list[0].args[0] == {
+        "commits": 3,
+        "total": 100,
+        "rate": 3 / 5,
+        "flush_seconds": 0.5,
+    }
+
+
+def test_failed_report_does_not_raise():
+    progress = DrillProgress(MagicMock(side_effect=Exception("Boom")), interval=0)
+
+    progress.update(1)
@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock, patch
+
+from src.drillers.neo4j_pydriller_repository_storage import (
+    RepositoryNeo4jStorage,
+    hash_file,
+)
+from src.scripts.migrate_file_identity import plan_file_migration
+
+
+def modification(id, new_path, old_path=None, change_type="MODIFY", repositories=("repo",)):
+    return {
+        "id": id,
+        "new_path": new_path,
+        "old_path": old_path if old_path is not None else new_path,
+        "change_type": change_type,
+        "repositories": list(repositories),
+    }
+
+
+def modified_file(filename, new_path, old_path=None, change_type="MODIFY"):
+    file = MagicMock(filename=filename, new_path=new_path, old_path=old_path or new_path)
+    file.change_type.name = change_type
+    return file
+
+
+@patch("src.drillers.neo4j_storage.GraphDatabase")
+def test_files_identified_by_path(mock_graph_database):
+    storage = RepositoryNeo4jStorage(batch_size=100)
+    commit = MagicMock(hash="abc")
+
+    storage.store_modified_file(commit, modified_file("__init__.py", "a/__init__.py"), "repo")
+    storage.store_modified_file(commit, modified_file("__init__.py", "b/__init__.py"), "repo")
+    storage.store_modified_file(
+        commit, modified_file("new.py", "src/new.py", "lib/old.py", "RENAME"), "repo"
+    )
+
+    files = [params for query, params in storage.batch if "MODIFIED" in query]
+    assert files[0]["file_hash"] != files[1]["file_hash"]
+    assert files[0]["file_hash"] == hash_file("a/__init__.py", "repo")
+    ((_, rename),) = [item for item in storage.batch if "RENAMED_TO" in item[0]]
+    assert rename["old_hash"] == hash_file("lib/old.py", "repo")
+    assert rename["new_hash"] == hash_file("src/new.py", "repo")
+
+
+def test_legacy_file_split_by_path():
+    legacy_file = {
+        "hash": hash_file("__init__.py", "repo"),
+        "name": "__init__.py",
+        "modifications": [
+            # The node of the old identity is the file at the root.
+            modification("1", "__init__.py", repositories=["fork", "repo"]),
+            modification("2", "a/__init__.py"),
+            modification("3", "a/__init__.py"),
+            modification("4", None, old_path="b/__init__.py", change_type="DELETE"),
+            modification("5", "c/__init__.py", old_path="b/__init__.py", change_type="RENAME"),
+        ],
+    }
+
+    plan = plan_file_migration(legacy_file)
+
+    assert plan.repository == "repo"
+    assert {move.path: move.modification_ids for move in plan.moves} == {
+        "a/__init__.py": ["2", "3"],
+        "b/__init__.py": ["4"],
+        "c/__init__.py": ["5"],
+    }
+    ((rename),) = plan.renames
+    assert rename["old_hash"] == hash_file("b/__init__.py", "repo")
+    assert rename["new_hash"] == hash_file("c/__init__.py", "repo")
+
+
+def test_legacy_file_of_unknown_repository_skipped():
+    legacy_file = {
+        "hash": hash_file("README.md", "other"),
+        "name": "README.md",
+        "modifications": [modification("1", "README.md")],
+    }
+
+    assert plan_file_migration(legacy_file) is None
@@ -0,0 +1,83 @@
+from git import Repo
+
+from common.models.driller_config import (
+    DefaultsConfig,
+    RepositoryConfig,
+    SingleDrillConfig,
+)
+
+from src.workers.fingerprint import compute_fingerprint, fingerprint_drill
+
+
+def make_repository(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "file.txt").write_text("one")
+    repo.index.add(["file.txt"])
+    repo.index.commit("First")
+    return repo
+
+
+def test_fingerprint_ignores_fields_that_dont_change_the_drill():
+    refs = ["abc refs/heads/main"]
+
+    fingerprint = compute_fingerprint(RepositoryConfig(name="repo"), refs)
+
+    assert fingerprint == compute_fingerprint(
+        RepositoryConfig(name="repo", delete_clone=True, size_class="large"), refs
+    )
+    assert fingerprint != compute_fingerprint(
+        RepositoryConfig(name="repo", index_file_modifications=True), refs
+    )
+    assert fingerprint != compute_fingerprint(
+        RepositoryConfig(name="repo"), ["def refs/heads/main"]
+    )
+
+
+def test_fingerprint_changes_with_new_commits(tmp_path):
+    repo = make_repository(tmp_path)
+    config = SingleDrillConfig(
+        defaults=DefaultsConfig(), repository=RepositoryConfig(name="repo")
+    )
+
+    fingerprint = fingerprint_drill(config, str(tmp_path))
+    assert fingerprint == fingerprint_drill(config, str(tmp_path))
+
+    (tmp_path / "file.txt").write_text("two")
+    repo.index.add(["file.txt"])
+    repo.index.commit("Second")
+
+    assert fingerprint_drill(config, str(tmp_path)) != fingerprint
+
+
+def test_no_fingerprint_without_refs(tmp_path):
+    config = SingleDrillConfig(repository=RepositoryConfig(name="repo"))
+
+    assert fingerprint_drill(config, str(tmp_path / "missing")) is None
+
+
+def test_clone_and_remote_fingerprinted_the_same(tmp_path):
+    remote = make_repository(tmp_path / "remote")
+    remote.create_head("feature")
+    remote.create_tag("v1")
+    config = SingleDrillConfig(
+        repository=RepositoryConfig(name="repo", url=str(tmp_path / "remote"))
+    )
+
+    fingerprint = fingerprint_drill(config, str(tmp_path / "missing"))
+    # The clone only has a local branch for the default branch.
+    Repo.clone_from(str(tmp_path / "remote"), str(tmp_path / "clone"))
+
+    assert fingerprint is not None
+    assert fingerprint_drill(config, str(tmp_path / "clone")) == fingerprint
+
+
+def test_shards_not_fingerprinted(tmp_path):
+    make_repository(tmp_path)
+    drill_config = SingleDrillConfig(
+        repository=RepositoryConfig(name="repo"), aggregate=False
+    )
+
+    assert fingerprint_drill(drill_config, str(tmp_path)) is None
@@ -0,0 +1,103 @@
+from neo4j.exceptions import ClientError
+
+from src.drillers.neo4j_schema import (
+    REPOSITORY_SCHEMA,
+    IndexKind,
+    Neo4jSchemaManager,
+    SchemaItem,
+)
+
+
+def index(label, prop, type="RANGE", state="ONLINE", constraint=None):
+    return {
+        "name": f"index_{label}_{prop}",
+        "state": state,
+        "type": type,
+        "entityType": "NODE",
+        "labelsOrTypes": [label],
+        "properties": [prop],
+        "owningConstraint": constraint,
+    }
+
+
+class FakeResult:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+
+    def data(self):
+        return self.rows
+
+    def consume(self):
+        pass
+
+
+class FakeSchemaDriver:
+    """Holds the indexes of a database. Created indexes are online straight away unless they fail."""
+
+    def __init__(self, indexes, failing=()):
+        self.indexes = indexes
+        self.failing = failing
+        self.created = []
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def run(self, query):
+        if query.startswith("SHOW INDEXES"):
+            return FakeResult(self.indexes)
+        item = next(item for item in REPOSITORY_SCHEMA if item.create_statement == query)
+        if item.name in self.failing:
+            raise ClientError("Duplicate nodes")
+        self.created.append(item.name)
+        if item.kind == IndexKind.UNIQUE:
+            self.indexes.append(index(item.label, item.property, constraint=item.name))
+        else:
+            self.indexes.append(index(item.label, item.property, item.kind.value.upper()))
+        return FakeResult()
+
+
+def test_index_matched_by_kind():
+    unique = SchemaItem("commit_hash", "Commit", "hash", IndexKind.UNIQUE)
+    text = SchemaItem("file_name", "File", "name", IndexKind.TEXT)
+
+    assert unique.matches(index("Commit", "hash", constraint="constraint_1"))
+    # A range index doesn't make the property unique.
+    assert not unique.matches(index("Commit", "hash"))
+    assert not text.matches(index("File", "name"))
+    assert text.matches(index("File", "name", type="TEXT"))
+
+
+def test_status():
+    driver = FakeSchemaDriver(
+        [
+            index("Repository", "name", constraint="constraint_1"),
+            index("Commit", "date", state="POPULATING"),
+            index("Branch", "hash", state="FAILED"),
+        ]
+    )
+
+    status = Neo4jSchemaManager(driver).status()
+
+    assert [item.name for item in status.online] == ["repository_name"]
+    assert [item.name for item in status.populating] == ["commit_date"]
+    assert [item.name for item in status.failed] == ["branch_hash"]
+    assert len(status.missing) == len(REPOSITORY_SCHEMA) - 3
+    assert not status.ready
+
+
+def test_ensure_creates_missing():
+    driver = FakeSchemaDriver(
+        [index("Repository", "name", constraint="constraint_1")], failing={"file_hash"}
+    )
+
+    status = Neo4jSchemaManager(driver).ensure(timeout=0)
+
+    assert "repository_name" not in driver.created
+    assert [item.name for item in status.missing] == ["file_hash"]
+    assert len(status.online) == len(REPOSITORY_SCHEMA) - 1
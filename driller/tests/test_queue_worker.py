@@ -0,0 +1,68 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from common.models.workers import WorkerState
+from src.workers.queue_worker import QueueWorker
+
+
+class EchoWorker(QueueWorker):
+    def on_request(self, body, message):
+        return body
+
+
+def create_worker():
+    return EchoWorker("host", 5672, "user", "password", "queue", worker_id="worker-1")
+
+
+def test_message_acked_after_start_and_heartbeat_before_job_runs():
+    worker = create_worker()
+    worker.exchange = AsyncMock()
+    message = MagicMock(reply_to="reply", body=b"job")
+    message.ack = AsyncMock()
+    calls = []
+    worker.get_job_ids = lambda body, message: [7]
+    worker.on_before_start_job = AsyncMock(side_effect=lambda body, message: calls.append("started"))
+    worker.send_heartbeat = AsyncMock(
+        side_effect=lambda: calls.append(("heartbeat", sorted(worker.active_job_ids)))
+    )
+    message.ack.side_effect = lambda: calls.append("ack")
+    worker.on_request = lambda body, message: calls.append("run") or body
+
+    asyncio.run(worker.on_message(message))
+
+    assert calls == ["started", ("heartbeat", [7]), "ack", "run"]
+    assert worker.active_job_ids == set()
+    worker.exchange.publish.assert_awaited_once()
+
+
+def test_next_message_taken_from_first_queue_with_one():
+    worker = create_worker()
+    message = MagicMock()
+    empty, full = MagicMock(), MagicMock()
+    empty.get = AsyncMock(return_value=None)
+    full.get = AsyncMock(return_value=message)
+    worker.queues = [empty, full]
+
+    assert asyncio.run(worker.get_next_message()) is message
+
+
+def test_heartbeat_lists_active_jobs():
+    worker = create_worker()
+    worker.active_job_ids.update({3, 1})
+
+    heartbeat = worker.create_heartbeat(WorkerState.STOPPED)
+
+    assert heartbeat.worker_id == "worker-1"
+    assert heartbeat.job_ids == [1, 3]
+    assert heartbeat.state == WorkerState.STOPPED
+
+
+def test_cancelled_jobs_are_bounded():
+    worker = EchoWorker("host", 5672, "user", "password", "queue", max_cancelled=2)
+    message = MagicMock(body=b'{"job_ids": [1, 2]}')
+
+    asyncio.run(worker.on_cancel(message))
+    worker.add_cancelled([3])
+
+    assert not worker.is_cancelled(1)
+    assert worker.is_cancelled(2) and worker.is_cancelled(3)
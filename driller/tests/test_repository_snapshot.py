@@ -0,0 +1,111 @@
+import io
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from neo4j.time import DateTime
+
+from src.scripts.repository_snapshot import (
+    COMMIT,
+    REPOSITORY,
+    SNAPSHOT_RELATIONSHIPS,
+    RepositorySnapshotStorage,
+    SnapshotError,
+)
+
+COMMIT_DATE = DateTime.from_native(datetime(2024, 2, 3, 4, 5, 6, tzinfo=timezone(timedelta(hours=2))))
+MODIFIED = next(item for item in SNAPSHOT_RELATIONSHIPS if item.type == "MODIFIED")
+
+
+class FakeResult(list):
+    def single(self):
+        return self[0] if self else None
+
+    def consume(self):
+        pass
+
+
+class FakeSnapshotDriver:
+    """Returns `records` for the export query they are keyed by and records the queries written."""
+
+    def __init__(self, records=None):
+        self.records = records or {}
+        self.written = []
+        self.queries = []
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def run(self, query, parameters=None):
+        self.queries.append(query)
+        if query.startswith("UNWIND"):
+            self.written.append((query, parameters["rows"]))
+        return FakeResult(self.records.get(query, []))
+
+    def execute_write(self, transaction_function, *args):
+        return transaction_function(self, *args)
+
+    def close(self):
+        pass
+
+
+def storage(driver):
+    with patch("src.drillers.neo4j_storage.GraphDatabase") as graph_database:
+        graph_database.driver.return_value = driver
+        return RepositorySnapshotStorage()
+
+
+def test_export_then_import_restores_subgraph():
+    exported = FakeSnapshotDriver(
+        {
+            REPOSITORY.export_query: [{"properties": {"name": "repo"}}],
+            COMMIT.export_query: [
+                {"properties": {"hash": "a", "date": COMMIT_DATE}},
+                {"properties": {"hash": "b", "date": COMMIT_DATE}},
+                {"properties": {"hash": "c", "date": COMMIT_DATE}},
+            ],
+            MODIFIED.export_query: [
+                {"source": {"hash": "a"}, "target": {"hash": "f"}, "properties": {"added_lines": 1}}
+            ],
+        }
+    )
+    file = io.StringIO()
+
+    counts = storage(exported).export_repository("repo", file, chunk_size=2)
+
+    assert counts == {"Repository": 1, "Commit": 3, "MODIFIED": 1}
+    # The header and a line for each chunk.
+    assert len(file.getvalue().splitlines()) == 5
+
+    imported = FakeSnapshotDriver()
+    file.seek(0)
+    repository, counts = storage(imported).import_snapshot(file)
+
+    assert repository == "repo"
+    assert counts == {"Repository": 1, "Commit": 3, "MODIFIED": 1}
+    assert [query for query, _ in imported.written] == [
+        REPOSITORY.import_query,
+        COMMIT.import_query,
+        COMMIT.import_query,
+        MODIFIED.import_query,
+    ]
+    # Dates are imported as datetime values with their offset.
+    assert imported.written[1][1][0] == {"hash": "a", "date": COMMIT_DATE}
+    # Cached query results are invalidated even if only properties changed.
+    assert "GraphVersion" in imported.queries[-1]
+
+
+def test_export_of_unknown_repository():
+    with pytest.raises(SnapshotError):
+        storage(FakeSnapshotDriver()).export_repository("repo", io.StringIO())
+
+
+def test_import_rejects_other_files():
+    with pytest.raises(SnapshotError):
+        storage(FakeSnapshotDriver()).import_snapshot(io.StringIO('{"hash": "a"}\n'))
@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from git import Repo
+
+from common.models.driller_config import (
+    PydrillerConfig,
+    RepositoryConfig,
+    SingleDrillConfig,
+)
+
+from src.workers.shard_planner import (
+    can_shard,
+    get_commit_timestamps,
+    plan_shards,
+    split_into_windows,
+)
+
+
+def timestamp(year, month, day, hour=12):
+    return int(datetime(year, month, day, hour, tzinfo=timezone.utc).timestamp())
+
+
+def utc(year, month, day, *time):
+    return datetime(year, month, day, *time, tzinfo=timezone.utc)
+
+
+def test_windows_split_commits_evenly():
+    timestamps = [timestamp(2023, 1, d) for d in range(1, 21)]
+
+    windows = split_into_windows(timestamps, 4)
+
+    assert windows == [
+        (None, utc(2023, 1, 6)),
+        (utc(2023, 1, 6), utc(2023, 1, 11)),
+        (utc(2023, 1, 11), utc(2023, 1, 16)),
+        (utc(2023, 1, 16), None),
+    ]
+
+
+def test_windows_merged_when_commits_on_same_day():
+    timestamps = [timestamp(2023, 1, 1)] * 10 + [timestamp(2023, 1, 2)]
+
+    windows = split_into_windows(timestamps, 4)
+
+    assert windows == [(None, None)]
+
+
+def test_windows_stay_inside_since_and_to():
+    since = datetime(2023, 1, 5)
+    to = datetime(2023, 1, 10)
+    timestamps = [timestamp(2023, 1, d) for d in range(5, 10)]
+
+    windows = split_into_windows(timestamps, 2, since=since, to=to)
+
+    assert windows[0][0] == utc(2023, 1, 5)
+    assert windows[-1][1] == utc(2023, 1, 10)
+    assert len(windows) == 2
+
+
+def test_commit_ranges_cannot_be_sharded():
+    assert can_shard(None)
+    assert can_shard(PydrillerConfig(since=datetime(2023, 1, 1)))
+    assert not can_shard(PydrillerConfig(from_commit="abc"))
+
+
+@patch("src.workers.shard_planner.get_commit_timestamps")
+def test_plan_shards(mock_timestamps):
+    mock_timestamps.return_value = [timestamp(2023, 1, d) for d in range(1, 21)]
+    config = SingleDrillConfig(
+        job_id=1,
+        shards=2,
+        repository=RepositoryConfig(name="test", delete_clone=True),
+    )
+
+    shard_configs = plan_shards(config, "/path/to/repo")
+
+    assert len(shard_configs) == 2
+    assert all(c.job_id is None and c.shards is None for c in shard_configs)
+    assert all(not c.repository.delete_clone for c in shard_configs)
+    # Aggregated by the stitch job once all shards are drilled.
+    assert all(not c.aggregate for c in shard_configs)
+    assert shard_configs[0].repository.pydriller.since is None
+    assert shard_configs[0].repository.pydriller.to == utc(2023, 1, 10, 23, 59, 59)
+    assert shard_configs[1].repository.pydriller.since == utc(2023, 1, 11)
+    assert shard_configs[1].repository.pydriller.to is None
+    # The time of the windows is kept when the configs are sent to the backend.
+    shard = SingleDrillConfig.model_validate_json(shard_configs[0].model_dump_json())
+    assert shard.repository.pydriller.to == utc(2023, 1, 10, 23, 59, 59)
+
+
+def test_commit_on_boundary_drilled_by_one_shard(tmp_path):
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    timestamps = [
+        timestamp(2023, 1, 1),
+        timestamp(2023, 1, 2, 0),
+        timestamp(2023, 1, 2),
+        timestamp(2023, 1, 3),
+    ]
+    for index, commit_timestamp in enumerate(timestamps):
+        (tmp_path / "file.txt").write_text(str(index))
+        repo.index.add(["file.txt"])
+        date = f"{commit_timestamp} +0000"
+        repo.index.commit(str(index), author_date=date, commit_date=date)
+    config = SingleDrillConfig(shards=2, repository=RepositoryConfig(name="test"))
+
+    shard_configs = plan_shards(config, str(tmp_path))
+
+    # The second shard starts exactly when the second commit was made.
+    assert shard_configs[1].repository.pydriller.since == utc(2023, 1, 2)
+    drilled = [
+        get_commit_timestamps(str(tmp_path), c.repository.pydriller) for c in shard_configs
+    ]
+    assert sorted(t for shard in drilled for t in shard) == timestamps
@@ -8,7 +8,7 @@ import {
 } from './Repository'
 import type { Pagination } from './Pagination'
 
-type status = 'failed' | 'pending' | 'complete' | 'started'
+type status = 'failed' | 'pending' | 'complete' | 'started' | 'cancelled'
 
 export interface JobStatus {
   job_id: number
@@ -16,11 +16,21 @@ export interface JobStatus {
   timestamp: string
 }
 
+export interface JobProgress {
+  job_id: number
+  commits: number
+  total: number | null
+  rate: number | null
+  flush_seconds: number | null
+  updated_at: string
+}
+
 export interface Job {
   id: number
   name: string
   data: Object
   statuses: JobStatus[]
+  progress?: JobProgress
 }
 
 
@@ -59,6 +69,10 @@ export class JobsRepository
     return this.http.post(``, data);
   }
 
+  async cancel(id: string | number): Promise<AxiosResponse<{ job_ids: number[] }>> {
+    return this.http.post(`${id}/cancel`)
+  }
+
   async delete(id: string | number): Promise<AxiosResponse<void>> {
     return this.http.delete(`${id}`)
   }
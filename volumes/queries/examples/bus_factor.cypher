@@ -0,0 +1,6 @@
+// @param repository: string
+// Smallest number of developers that made half of the commits of the repository.
+MATCH (d:Developer)-[t:CONTRIBUTED_TO]->(:Repository {name: $repository})
+WITH t.commits AS commits ORDER BY commits DESC
+WITH collect(commits) AS counts, sum(commits) AS total
+RETURN size([i IN range(0, size(counts) - 1) WHERE reduce(s = 0, c IN counts[0..i] | s + c) < total / 2.0]) AS bus_factor
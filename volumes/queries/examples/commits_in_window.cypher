@@ -0,0 +1,6 @@
+// @param since: datetime
+// @param to: datetime
+MATCH (c:Commit)
+WHERE c.committer_date >= $since AND c.committer_date < $to
+RETURN c
+ORDER BY c.committer_date
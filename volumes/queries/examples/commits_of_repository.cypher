@@ -0,0 +1,6 @@
+// @param repository: string
+// @param limit: integer = 100
+MATCH (:Repository {name: $repository})<-[:PART_OF]-(:Branch)<-[:IN_BRANCH]-(c:Commit)
+RETURN DISTINCT c
+ORDER BY c.date DESC
+LIMIT $limit
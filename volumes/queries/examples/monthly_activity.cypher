@@ -0,0 +1,4 @@
+// @param repository: string
+MATCH (a:Activity {repository: $repository})
+RETURN a.month AS month, a.email AS developer, a.commits AS commits, a.added_lines AS added_lines, a.deleted_lines AS deleted_lines
+ORDER BY month, commits DESC